@@ -0,0 +1,160 @@
+"""
+Offline benchmark: extract, transform and load a synthetic site served locally
+
+Results (pages/sec, wall time and peak memory per stage, time per step) are printed and saved as json,
+compare them with the results of another commit with --baseline:
+
+    python -m benchmarks.run --articles 500 --latency 0.05 --output bench.json
+    python -m benchmarks.run --articles 500 --latency 0.05 --baseline bench.json
+"""
+import sys
+import json
+import shutil
+import asyncio
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+
+from dataclasses import asdict
+from typing import Any, Dict, List, Optional
+
+from benchmarks.server import FixtureServer, SiteOptions
+from news_scraping.common import Site, get_parser
+from news_scraping.extract.backends import get_backend
+from news_scraping.metrics import metrics
+
+QUERIES: Dict[str, str] = dict(homepage_article_links='.title', news_title='.title',
+                               news_summary='.sum', news_body='.note-text')
+
+
+def run_once(options: SiteOptions, extract_options: Dict[str, Any], file_format: Optional[str],
+             port: int, folder: str) -> Dict[str, Any]:
+    """Run the whole pipeline against a fresh fixture server, return stage results"""
+    import news_scraping.extract.main as extract
+    import news_scraping.transform.main as transform
+    import news_scraping.load.main as load
+    metrics.reset()
+    with FixtureServer(options, port=port) as server:
+        site = Site('bench', server.url, QUERIES, get_parser('ElUniversalParser'),
+                    get_backend(extract_options.pop('backend', 'bs4')))
+        with metrics.stage('extract'):
+            asyncio.run(extract.run({'bench': site}, folder, file_format=file_format, **extract_options))
+    with metrics.stage('transform'):
+        transform.run(folder, file_format=file_format)
+    with metrics.stage('load'):
+        load.run(folder, file_format=file_format)
+    report: Dict[str, Any] = metrics.report()
+    stages: Dict[str, Dict[str, Any]] = {name: dict(seconds=stage['seconds'], peak_rss_bytes=stage['peak_memory_bytes'])
+                                         for name, stage in report['stages'].items()}
+    pages: int = int(report['counters'].get('extract.rows', 0))
+    return dict(pages=pages,
+                pages_per_second=pages / stages['extract']['seconds'],
+                load_rows_per_second=report['counters'].get('load.rows', 0) / stages['load']['seconds'],
+                stages=stages,
+                steps={name: timing['total'] for name, timing in report['timings'].items()},
+                requests=sum(host['requests'] for host in report['hosts'].values()))
+
+
+def best_of(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Fastest wall time (and lowest peak memory) of every stage, less noisy than the mean"""
+    stages: Dict[str, Dict[str, Any]] = {stage: dict(seconds=min(r['stages'][stage]['seconds'] for r in runs),
+                                                     peak_rss_bytes=min(r['stages'][stage]['peak_rss_bytes'] or 0
+                                                                        for r in runs))
+                                         for stage in runs[0]['stages']}
+    return dict(pages=runs[0]['pages'],
+                pages_per_second=max(r['pages_per_second'] for r in runs),
+                load_rows_per_second=max(r['load_rows_per_second'] for r in runs),
+                stages=stages,
+                steps={step: min(r['steps'].get(step, 0) for r in runs) for step in runs[0]['steps']},
+                requests=runs[0]['requests'],
+                runs=runs)
+
+
+def git_commit() -> Optional[str]:
+    """Commit of the working directory, None if not available"""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(options: SiteOptions, extract_options: Dict[str, Any], file_format: Optional[str] = None,
+        repeat: int = 3, port: int = 8765) -> Dict[str, Any]:
+    """Run the benchmark repeat times, every time in a new folder, and return the best results"""
+    runs: List[Dict[str, Any]] = list()
+    for _ in range(repeat):
+        folder: str = tempfile.mkdtemp(prefix='news_benchmark_')
+        try:
+            runs.append(run_once(options, dict(extract_options), file_format, port, folder))
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+    return dict(commit=git_commit(), python=platform.python_version(), platform=platform.platform(),
+                site=asdict(options), extract=extract_options, file_format=file_format, **best_of(runs))
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    """Stages slower (or using more memory) than baseline by more than tolerance (share)"""
+    regressions: List[str] = list()
+    for stage, current in results['stages'].items():
+        previous: Optional[Dict[str, Any]] = baseline['stages'].get(stage)
+        if previous is None:
+            continue
+        for key in ('seconds', 'peak_rss_bytes'):
+            if previous[key] and current[key] > previous[key] * (1 + tolerance):
+                regressions.append(f'{stage} {key}: {previous[key]:.4g} -> {current[key]:.4g} '
+                                   f'(+{current[key] / previous[key] - 1:.0%})')
+    return regressions
+
+
+def print_results(results: Dict[str, Any]) -> None:
+    print(f'commit {results["commit"]}: {results["pages"]} pages, {results["requests"]} requests')
+    print(f'  extract: {results["pages_per_second"]:.1f} pages/s, load: {results["load_rows_per_second"]:.1f} rows/s')
+    for stage, result in results['stages'].items():
+        print(f'  {stage:<10} {result["seconds"]:8.3f} s {(result["peak_rss_bytes"] or 0) / 2 ** 20:8.1f} MiB')
+    for step, seconds in results['steps'].items():
+        print(f'    {step:<28} {seconds:8.3f} s')
+
+
+if __name__ == '__main__':
+    args_parser = argparse.ArgumentParser(description='Benchmark the pipeline against a local synthetic site')
+    args_parser.add_argument('--articles', help='articles in homepage', type=int, default=200)
+    args_parser.add_argument('--latency', help='seconds before every answer', type=float, default=0.05)
+    args_parser.add_argument('--jitter', help='latency +- jitter seconds', type=float, default=0.0)
+    args_parser.add_argument('--error_rate', help='share of articles failing their first request', type=float, default=0.0)
+    args_parser.add_argument('--paragraphs', help='paragraphs per article', type=int, default=10)
+    args_parser.add_argument('--words', help='words per paragraph', type=int, default=80)
+    args_parser.add_argument('--backend', help='html parsing backend', default='bs4')
+    args_parser.add_argument('--parse_workers', help='processes parsing pages', type=int, default=0)
+    args_parser.add_argument('--max_per_host', help='requests in flight for the site', type=int, default=20)
+    args_parser.add_argument('--format', help='files between stages (see formats)', required=False)
+    args_parser.add_argument('--repeat', help='runs, the best one is reported', type=int, default=3)
+    args_parser.add_argument('--port', help='fixture server port', type=int, default=8765)
+    args_parser.add_argument('--output', help='save results as json', required=False)
+    args_parser.add_argument('--baseline', help='results of a previous run to compare with', required=False)
+    args_parser.add_argument('--tolerance', help='allowed slowdown against baseline (share)', type=float, default=0.2)
+    args = args_parser.parse_args()
+    # retries and failures are expected, only results are shown
+    logging.disable(logging.WARNING)
+
+    site_options = SiteOptions(n_articles=args.articles, latency=args.latency, jitter=args.jitter,
+                               error_rate=args.error_rate, paragraphs=args.paragraphs, words_per_paragraph=args.words)
+    benchmark_extract: Dict[str, Any] = dict(backend=args.backend, parse_workers=args.parse_workers,
+                                             max_concurrency=args.max_per_host, max_per_host=args.max_per_host,
+                                             http=dict(backoff=0.01, limit_per_host=args.max_per_host))
+    benchmark: Dict[str, Any] = run(site_options, benchmark_extract, args.format, args.repeat, args.port)
+    print_results(benchmark)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as output_file:
+            json.dump(benchmark, output_file, indent=1)
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as baseline_file:
+            previous_benchmark: Dict[str, Any] = json.load(baseline_file)
+        if (previous_benchmark['site'], previous_benchmark['extract']) != (benchmark['site'], benchmark['extract']):
+            print('Baseline was run with other options, results are not comparable')
+        found: List[str] = compare(benchmark, previous_benchmark, args.tolerance)
+        for regression in found:
+            print(f'REGRESSION {regression}')
+        sys.exit(1 if found else 0)
@@ -0,0 +1,134 @@
+"""
+Local news site serving synthetic pages, so the pipeline can be measured without network
+
+The homepage links n_articles articles, every article has the elements the default queries look for
+(.title, .sum and .note-text paragraphs). Pages are generated from a seed, so every run serves the same content
+"""
+import asyncio
+import random
+import multiprocessing
+
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional, Set
+
+from aiohttp import web
+
+WORDS: List[str] = ('el la de que y en un los se del las por una con para su al lo como más pero sus le ya o '
+                    'gobierno país presidente año millones ciudad según mercado política economía crisis '
+                    'ministro banco nacional precio petróleo elecciones informe trabajo salud educación').split()
+
+
+@dataclass
+class SiteOptions:
+    """
+    Shape and behaviour of the synthetic site
+
+    latency, jitter: seconds before answering every request (latency +- jitter)
+    error_rate: share of articles answering 503 to their first request (they succeed when tried again)
+    paragraphs, words_per_paragraph: article body size
+    """
+    n_articles: int = 200
+    latency: float = 0.05
+    jitter: float = 0.0
+    error_rate: float = 0.0
+    paragraphs: int = 10
+    words_per_paragraph: int = 80
+    seed: int = 1
+
+
+def _sentence(rng: random.Random, n_words: int) -> str:
+    return ' '.join(rng.choice(WORDS) for _ in range(n_words)).capitalize() + '.'
+
+
+def article_page(options: SiteOptions, index: int) -> str:
+    """Html of article index, always the same for the same options"""
+    rng = random.Random(options.seed * 1_000_003 + index)
+    paragraphs: str = ''.join(f'<p class="note-text">{_sentence(rng, options.words_per_paragraph)}</p>'
+                              for _ in range(options.paragraphs))
+    return (f'<html><head><meta charset="utf-8"><title>Noticia {index}</title></head><body>'
+            f'<nav><a href="/">Inicio</a></nav>'
+            f'<h1 class="title">Noticia {index}: {_sentence(rng, 8)}</h1>'
+            f'<div class="sum">{_sentence(rng, 25)}</div>'
+            f'<article>{paragraphs}</article></body></html>')
+
+
+def home_page(options: SiteOptions, base_url: str) -> str:
+    """Html of homepage, linking every article"""
+    links: str = ''.join(f'<h2><a class="title" href="{base_url}/news/{i}">Noticia {i}</a></h2>'
+                         for i in range(options.n_articles))
+    return f'<html><head><meta charset="utf-8"></head><body>{links}</body></html>'
+
+
+def create_app(options: SiteOptions, base_url: str) -> web.Application:
+    """aiohttp application serving homepage (/) and articles (/news/[index])"""
+    rng = random.Random(options.seed)
+    failing: Set[int] = {i for i in range(options.n_articles) if rng.random() < options.error_rate}
+    home: str = home_page(options, base_url)
+
+    async def wait() -> None:
+        await asyncio.sleep(max(options.latency + random.uniform(-options.jitter, options.jitter), 0))
+
+    async def homepage(request: web.Request) -> web.Response:
+        await wait()
+        return web.Response(text=home, content_type='text/html')
+
+    async def article(request: web.Request) -> web.Response:
+        await wait()
+        index: int = int(request.match_info['index'])
+        if index >= options.n_articles:
+            raise web.HTTPNotFound()
+        if index in failing:
+            failing.discard(index)
+            raise web.HTTPServiceUnavailable()
+        return web.Response(text=article_page(options, index), content_type='text/html')
+
+    app = web.Application()
+    app.router.add_get('/', homepage)
+    app.router.add_get('/news/{index}', article)
+    return app
+
+
+def serve(options: Dict[str, Any], host: str, port: int, ready: Any) -> None:
+    """Run the site until the process is terminated, ready is set once it accepts connections"""
+    async def main() -> None:
+        runner = web.AppRunner(create_app(SiteOptions(**options), f'http://{host}:{port}'), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        ready.set()
+        await asyncio.Event().wait()
+    asyncio.run(main())
+
+
+class FixtureServer:
+    """Synthetic site running in its own process (so it does not compete with the pipeline event loop)"""
+    def __init__(self, options: SiteOptions, host: str = '127.0.0.1', port: int = 8765):
+        self.options: SiteOptions = options
+        self.host: str = host
+        self.port: int = port
+        self._process: Optional[multiprocessing.Process] = None
+
+    @property
+    def url(self) -> str:
+        return f'http://{self.host}:{self.port}/'
+
+    def start(self) -> None:
+        ready = multiprocessing.Event()
+        self._process = multiprocessing.Process(target=serve, args=(asdict(self.options), self.host, self.port, ready),
+                                                daemon=True)
+        self._process.start()
+        if not ready.wait(timeout=30):
+            self.stop()
+            raise RuntimeError(f'Fixture server did not start on {self.url}')
+
+    def stop(self) -> None:
+        if self._process is not None:
+            self._process.terminate()
+            self._process.join()
+            self._process = None
+
+    def __enter__(self) -> 'FixtureServer':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
@@ -1,27 +1,28 @@
 """Add useful common functions for different parts of the code"""
 from __future__ import annotations      # resolve circular dependency with hints
 import yaml
-from typing import Dict, Union
+from typing import Dict, List, Union, Any, Sequence, Optional
 from typing_extensions import TypedDict
-from dataclasses import dataclass
-import bs4
+from dataclasses import dataclass, field
 import os
 
 from news_scraping.extract import news_parser as par
+from news_scraping.extract.backends import Document, ParserBackend, SoupBackend, get_backend
 from news_scraping.output import create_output_folder
 
 
-class SiteHint(TypedDict):
+class SiteHint(TypedDict, total=False):
     """Hinting for config sites"""
     parser: str
     url: str
     queries: Dict[str, str]
+    backend: str
 
 
 Sites = Dict[str, Union[str, Dict[str, SiteHint]]]
 
 
-async def select_query(query: str, target: bs4.BeautifulSoup) -> bs4.ResultSet:
+async def select_query(query: str, target: Document) -> Sequence[Any]:
     """Apply query to target site and return matches"""
     return target.select(query)
 
@@ -40,12 +41,18 @@ class Site:
     url: str
     queries: Dict[str, str]
     parser: par.NewsParser
+    backend: ParserBackend = field(default_factory=SoupBackend)
 
     @property
     def homepage_links_query(self) -> str:
         """Get news links from homepage"""
         return self.queries['homepage_article_links']
 
+    @property
+    def article_queries(self) -> List[str]:
+        """Get the queries applied to every news page"""
+        return [self.queries[q] for q in ('news_title', 'news_summary', 'news_body')]
+
 
 class Config:
     def __init__(self, config_path: str = 'config.yaml'):
@@ -57,6 +64,13 @@ class Config:
         # get a list of configs
         self._sites: Dict[str, Site] = self._get_sites()
         self._output_path: str = self._get_output_path()
+        self._extract_options: Dict[str, Any] = self._get_section('extract')
+        self._stream_options: Dict[str, Any] = self._get_section('stream')
+        self._transform_options: Dict[str, Any] = self._get_section('transform')
+        self._load_options: Dict[str, Any] = self._get_section('load')
+        self._metrics_options: Dict[str, Any] = self._get_section('metrics')
+        self._distributed_options: Dict[str, Any] = self._get_section('distributed')
+        self._file_format: Optional[str] = self.config.get('file_format')    # type: ignore
 
     def _get_output_path(self) -> str:
         """Get output path from config"""
@@ -65,6 +79,13 @@ class Config:
         # Ensure path is available
         return create_output_folder(output_path)
 
+    def _get_section(self, name: str) -> Dict[str, Any]:
+        """Get optional section from config, empty if not provided"""
+        section = self.config.get(name) or dict()
+        if not isinstance(section, dict):
+            raise TypeError(f'Invalid type for {name}: {section}')
+        return dict(section)
+
     def _get_sites(self) -> Dict[str, Site]:
         """Get sites from config yaml"""
         sites: Union[str, Dict[str, SiteHint]] = self.config['news_sites']
@@ -73,7 +94,8 @@ class Config:
         return {name: Site(name,
                            attrs['url'],
                            attrs['queries'],
-                           get_parser(attrs['parser']))
+                           get_parser(attrs['parser']),
+                           get_backend(attrs.get('backend', 'bs4')))
                 for name, attrs in sites.items()}
 
     @property
@@ -85,3 +107,38 @@ class Config:
     def output_folder(self) -> str:
         """Get output folder from config"""
         return self._output_path
+
+    @property
+    def file_format(self) -> Optional[str]:
+        """Get format of the files between stages, None for the default ones"""
+        return self._file_format
+
+    @property
+    def extract_options(self) -> Dict[str, Any]:
+        """Get options for extract stage (concurrency limits)"""
+        return self._extract_options
+
+    @property
+    def stream_options(self) -> Dict[str, Any]:
+        """Get options for streaming pipeline (queues and load batches)"""
+        return self._stream_options
+
+    @property
+    def transform_options(self) -> Dict[str, Any]:
+        """Get options for transform stage (tokenization workers)"""
+        return self._transform_options
+
+    @property
+    def load_options(self) -> Dict[str, Any]:
+        """Get options for load stage (insert batches)"""
+        return self._load_options
+
+    @property
+    def metrics_options(self) -> Dict[str, Any]:
+        """Get options for run report (folder and prometheus file)"""
+        return self._metrics_options
+
+    @property
+    def distributed_options(self) -> Dict[str, Any]:
+        """Get options for distributed extract (work queue, leases and workers)"""
+        return self._distributed_options
@@ -0,0 +1,262 @@
+"""
+Html parsing backends
+
+Every backend turns a page into a Document supporting css queries (select), the elements
+found have the small part of the beautiful soup api used by the parsers: text, has_attr and [attr]
+"""
+import re
+import codecs
+import logging
+
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Dict, List, Iterable, Sequence, Union, Optional, Any
+
+import bs4
+from typing_extensions import Protocol
+
+logger = logging.getLogger(__name__)
+
+Markup = Union[str, bytes]
+
+# simple selector: optional tag followed by .class and #id parts, e.g. 'a.title', '.sum', '#main'
+SIMPLE_SELECTOR = re.compile(r'^(?P<tag>[a-zA-Z][\w-]*)?(?P<parts>(?:[.#][\w-]+)*)$')
+# <meta charset="..."> or <meta http-equiv="Content-Type" content="text/html; charset=...">
+META_CHARSET = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([\w.:-]+)', re.IGNORECASE)
+
+
+def to_text(markup: Markup) -> str:
+    """Decode markup using the encoding declared in the page (or guessed), as beautiful soup does"""
+    if isinstance(markup, str):
+        return markup
+    return str(bs4.UnicodeDammit(markup, is_html=True).unicode_markup)
+
+
+def valid_charset(charset: Optional[str]) -> Optional[str]:
+    """Python codec name of charset, None if unknown. latin-1 is read as windows-1252, as browsers do"""
+    if not charset:
+        return None
+    try:
+        name: str = codecs.lookup(charset.strip()).name
+    except LookupError:
+        return None
+    return 'cp1252' if name in ('latin-1', 'iso8859-1') else name
+
+
+def sniff_charset(head: bytes) -> Optional[str]:
+    """Charset declared by a meta tag at the beginning of a page, None if there is none"""
+    match = META_CHARSET.search(head)
+    return valid_charset(match.group(1).decode('ascii', 'ignore')) if match else None
+
+
+def decode(markup: bytes, charset: Optional[str] = None) -> str:
+    """Decode page with charset (utf-8 if unknown), guess the encoding if it does not match"""
+    try:
+        return markup.decode(charset or 'utf-8')
+    except (UnicodeDecodeError, LookupError):
+        logger.debug(f'Page is not {charset or "utf-8"}, guessing its encoding')
+        return to_text(markup)
+
+
+class Element(Protocol):
+    """Element found by a query"""
+    @property
+    def text(self) -> str: ...
+
+    def has_attr(self, key: str) -> bool: ...
+
+    def __getitem__(self, key: str) -> Any: ...
+
+
+class Document(Protocol):
+    """Parsed page"""
+    def select(self, selector: str) -> Sequence[Any]: ...
+
+
+class Feeder(Protocol):
+    """Parser receiving a page in pieces, while it is downloaded"""
+    def feed(self, text: str) -> None: ...
+
+    def close(self) -> Document: ...
+
+
+class ParserBackend(ABC):
+    """Parse html pages"""
+    name: str
+
+    @abstractmethod
+    def parse(self, markup: Markup, queries: Iterable[str] = ()) -> Document:
+        """Parse markup, queries are the css queries that will be applied to the document"""
+
+    def feeder(self, queries: Iterable[str] = ()) -> Optional[Feeder]:
+        """Incremental parser with the same results as parse, None if the backend needs the whole page"""
+        return None
+
+
+class SoupBackend(ParserBackend):
+    """Beautiful soup using python html.parser (default)"""
+    name = 'bs4'
+
+    def parse(self, markup: Markup, queries: Iterable[str] = ()) -> Document:
+        return bs4.BeautifulSoup(markup, 'html.parser')
+
+
+class StrainerBackend(ParserBackend):
+    """
+    Beautiful soup that only builds the elements matching the queries (and their children)
+
+    Only works with simple queries (tag, .class, #id) that can be filtered by the same kind of
+    attribute, any other query builds the whole tree
+    """
+    name = 'strainer'
+
+    def parse(self, markup: Markup, queries: Iterable[str] = ()) -> Document:
+        strainer: Optional[bs4.SoupStrainer] = self._strainer(tuple(queries))
+        return bs4.BeautifulSoup(markup, 'html.parser', parse_only=strainer)
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def _strainer(queries: Sequence[str]) -> Optional[bs4.SoupStrainer]:
+        """SoupStrainer matching (a superset of) the queries, None if it is not possible"""
+        tags: List[Optional[str]] = list()
+        classes: List[Optional[str]] = list()
+        ids: List[Optional[str]] = list()
+        for query in queries:
+            for selector in query.split(','):
+                match = SIMPLE_SELECTOR.match(selector.strip())
+                if not match or not selector.strip():
+                    logger.debug(f'Query not supported by strainer, parsing whole page: {query}')
+                    return None
+                parts: str = match.group('parts')
+                tags.append(match.group('tag'))
+                classes.append(next(iter(re.findall(r'\.([\w-]+)', parts)), None))
+                ids.append(next(iter(re.findall(r'#([\w-]+)', parts)), None))
+        # filter by a single kind of attribute, any of the values
+        if classes and None not in classes:
+            wanted = frozenset(classes)
+            # class value could be checked as a whole ('title big') or class by class
+            return bs4.SoupStrainer(attrs={'class': lambda value: bool(value and wanted.intersection(value.split()))})
+        if ids and None not in ids:
+            return bs4.SoupStrainer(attrs={'id': [i for i in ids if i is not None]})
+        if tags and None not in tags:
+            return bs4.SoupStrainer([t.lower() for t in tags if t is not None])
+        return None
+
+
+class _LxmlElement:
+    """Adapt lxml element to Element"""
+    __slots__ = ('_element',)
+
+    def __init__(self, element: Any):
+        self._element = element
+
+    @property
+    def text(self) -> str:
+        return str(self._element.text_content())
+
+    def has_attr(self, key: str) -> bool:
+        return key in self._element.attrib
+
+    def __getitem__(self, key: str) -> str:
+        return str(self._element.attrib[key])
+
+
+class _LxmlDocument:
+    """Adapt lxml tree to Document"""
+    def __init__(self, root: Any):
+        self._root = root
+
+    def select(self, selector: str) -> List[_LxmlElement]:
+        return [_LxmlElement(e) for e in LxmlBackend.compile(selector)(self._root)]
+
+
+def _lxml_empty() -> _LxmlDocument:
+    """Document without elements, for pages with nothing to parse (lxml refuses them)"""
+    import lxml.html
+    return _LxmlDocument(lxml.html.document_fromstring('<html></html>'))
+
+
+class _LxmlFeeder:
+    """Feed lxml html parser, the tree is built while the page arrives"""
+    def __init__(self) -> None:
+        import lxml.html
+        self._parser = lxml.html.HTMLParser()
+
+    def feed(self, text: str) -> None:
+        self._parser.feed(text)
+
+    def close(self) -> Document:
+        import lxml.etree
+        try:
+            root: Any = self._parser.close()
+        except lxml.etree.XMLSyntaxError:
+            root = None
+        # nothing fed, or nothing but comments and declarations
+        return _LxmlDocument(root) if root is not None else _lxml_empty()
+
+
+class LxmlBackend(ParserBackend):
+    """lxml (libxml2) html parser with css queries compiled once. Needs lxml and cssselect"""
+    name = 'lxml'
+
+    def parse(self, markup: Markup, queries: Iterable[str] = ()) -> Document:
+        import lxml.etree
+        import lxml.html
+        try:
+            return _LxmlDocument(lxml.html.document_fromstring(to_text(markup)))
+        except lxml.etree.ParserError:
+            # empty page, or nothing but comments and declarations
+            return _lxml_empty()
+
+    def feeder(self, queries: Iterable[str] = ()) -> Optional[Feeder]:
+        return _LxmlFeeder()
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def compile(query: str) -> Any:
+        """Compile css query to xpath"""
+        from lxml.cssselect import CSSSelector
+        return CSSSelector(query)
+
+
+class _LexborElement:
+    """Adapt selectolax node to Element"""
+    __slots__ = ('_node',)
+
+    def __init__(self, node: Any):
+        self._node = node
+
+    @property
+    def text(self) -> str:
+        return str(self._node.text(deep=True))
+
+    def has_attr(self, key: str) -> bool:
+        return key in self._node.attributes
+
+    def __getitem__(self, key: str) -> str:
+        return str(self._node.attributes[key])
+
+
+class _LexborDocument:
+    """Adapt selectolax tree to Document"""
+    def __init__(self, tree: Any):
+        self._tree = tree
+
+    def select(self, selector: str) -> List[_LexborElement]:
+        return [_LexborElement(node) for node in self._tree.css(selector)]
+
+
+class LexborBackend(ParserBackend):
+    """selectolax binding of lexbor html engine. Needs selectolax"""
+    name = 'selectolax'
+
+    def parse(self, markup: Markup, queries: Iterable[str] = ()) -> Document:
+        from selectolax.lexbor import LexborHTMLParser
+        return _LexborDocument(LexborHTMLParser(to_text(markup)))
+
+
+def get_backend(backend_name: str = 'bs4') -> ParserBackend:
+    """map backend name to ParserBackend"""
+    backend_map: Dict[str, ParserBackend] = {backend.name: backend() for backend in    # type: ignore
+                                             (SoupBackend, StrainerBackend, LxmlBackend, LexborBackend)}
+    return backend_map[backend_name.lower()]
@@ -0,0 +1,101 @@
+"""Persistent http cache, used to send conditional requests for pages already downloaded"""
+import os
+import json
+import time
+import hashlib
+import logging
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from news_scraping.output import create_output_folder
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheEntry:
+    """Cached response for a single url"""
+    url: str
+    body: bytes
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    charset: Optional[str] = None
+
+    @property
+    def validators(self) -> Dict[str, str]:
+        """Headers needed to ask the server whether the page changed"""
+        headers: Dict[str, str] = dict()
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+
+class HttpCache:
+    """
+    Store response bodies and their validators (ETag, Last-Modified) on disk
+
+    Each url is stored as two files named after the url md5: [md5].body and [md5].json
+    Entries older than max_age_days or beyond max_size_mb (least recently used first) are evicted
+    """
+    def __init__(self, folder: str, max_size_mb: float = 500, max_age_days: float = 7):
+        """Create cache folder if needed"""
+        self.folder: str = create_output_folder(folder)
+        self.max_size: int = int(max_size_mb * 1024 * 1024)
+        self.max_age: float = max_age_days * 24 * 60 * 60
+
+    def _paths(self, url: str) -> Tuple[str, str]:
+        """Get body and metadata paths for url"""
+        key: str = hashlib.md5(url.encode()).hexdigest()
+        return os.path.join(self.folder, f'{key}.body'), os.path.join(self.folder, f'{key}.json')
+
+    def get(self, url: str) -> Optional[CacheEntry]:
+        """Get cached entry for url, None if not available"""
+        body_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta: Dict[str, Optional[str]] = json.load(f)
+            with open(body_path, 'rb') as f:
+                body: bytes = f.read()
+        except (OSError, ValueError):
+            return None
+        # mark as recently used
+        os.utime(body_path)
+        return CacheEntry(url, body, meta.get('etag'), meta.get('last_modified'), meta.get('charset'))
+
+    def put(self, entry: CacheEntry) -> None:
+        """Store entry, only if it has validators (otherwise it can not be revalidated)"""
+        if not entry.validators:
+            return
+        body_path, meta_path = self._paths(entry.url)
+        meta = dict(url=entry.url, etag=entry.etag, last_modified=entry.last_modified, charset=entry.charset)
+        # write to temporary files first so readers never see half written entries
+        for path, data in ((body_path, entry.body), (meta_path, json.dumps(meta).encode('utf-8'))):
+            with open(f'{path}.tmp', 'wb') as f:
+                f.write(data)
+            os.replace(f'{path}.tmp', path)
+
+    def evict(self) -> int:
+        """Remove old entries and the least recently used ones beyond max size. Return removed entries"""
+        now: float = time.time()
+        entries: List[Tuple[float, int, str]] = list()     # (last use, size, body path)
+        for file in os.listdir(self.folder):
+            if file.endswith('.body'):
+                path: str = os.path.join(self.folder, file)
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort(reverse=True)      # most recently used first
+        removed: int = 0
+        total_size: int = 0
+        for last_use, size, path in entries:
+            if now - last_use <= self.max_age and total_size + size <= self.max_size:
+                total_size += size
+                continue
+            for p in (path, path[:-len('.body')] + '.json'):
+                if os.path.exists(p):
+                    os.remove(p)
+            removed += 1
+        logger.info(f'Evicted {removed} entries from http cache: {self.folder}')
+        return removed
@@ -0,0 +1,296 @@
+"""
+---
+Distributed extract
+---
+
+The coordinator parses the homepage of every site and queues the article urls in a shared WorkQueue,
+workers lease the urls, fetch and parse them and send the news back. Once every url is done the coordinator
+saves the news of every site, as extract does, for a single transform and load.
+The queue is a sqlite file of the coordinator: workers on its machine open the file, workers on other
+machines use the queue served by the coordinator over http (listen option, see queue_server)
+
+    python -m news_scraping.extract.distributed --worker         # as many as needed, on any machine
+    python run_pipeline.py --distributed                         # coordinator, then transform and load
+"""
+import os
+import socket
+import asyncio
+import argparse
+import functools
+import contextlib
+import logging
+import time
+
+from collections import defaultdict
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, List, Optional, Set, TypeVar
+
+from news_scraping.common import Config, Site
+from news_scraping.news import News, NewsList
+from news_scraping.output import create_output_folder_from_site, save_news
+from news_scraping.extract.frontier import SeenIndex
+from news_scraping.extract.http import HttpClient, Page
+from news_scraping.extract.scheduler import CrawlScheduler
+from news_scraping.extract.work_queue import Lease, WorkQueue, WorkerQueue
+from news_scraping.extract.queue_server import RemoteWorkQueue, serve_queue
+from news_scraping.extract.workers import create_parse_pool, parse_news_page
+from news_scraping.metrics import metrics
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# extract options used by workers
+WORKER_OPTIONS = ('max_concurrency', 'max_per_host', 'http', 'parse_workers')
+# distributed options of the work queue
+QUEUE_OPTIONS = ('queue', 'lease_seconds', 'max_attempts')
+
+T = TypeVar('T')
+
+
+async def _call(function: Callable[..., T], *args: Any) -> T:
+    """Run a (blocking) work queue method in the default executor"""
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(function, *args))
+
+
+class _Batch:
+    """Leases a worker is processing, extended until they are completed (after a claim, so lease_seconds is known)"""
+    def __init__(self, queue: WorkerQueue, leases: List[Lease]):
+        self.queue: WorkerQueue = queue
+        self._leases: Dict[str, Lease] = {lease.url: lease for lease in leases}
+
+    def held(self, lease: Lease) -> bool:
+        """Whether lease is still ours (not lost nor expired)"""
+        current: Optional[Lease] = self._leases.get(lease.url)
+        return current is not None and time.time() < current.until
+
+    async def complete(self, lease: Lease, news: Optional[News], error: str = '') -> bool:
+        self._leases.pop(lease.url, None)
+        try:
+            completed: bool = await _call(self.queue.complete, lease, news, error)
+        except OSError as e:
+            # the lease expires and the url is leased again
+            logger.warning(f'Could not send the result of {lease.url} to the work queue: {e!r}')
+            return False
+        return completed
+
+    async def renew(self) -> None:
+        """Extend the leases not completed yet every third of lease_seconds, until cancelled"""
+        while True:
+            await asyncio.sleep(self.queue.lease_seconds / 3)
+            try:
+                renewed: Dict[str, Lease] = {lease.url: lease for lease in
+                                             await _call(self.queue.extend, list(self._leases.values()))}
+            except OSError as e:
+                logger.warning(f'Could not extend leases, trying again: {e!r}')
+                continue
+            lost: Set[str] = set()
+            for url in list(self._leases):
+                if url in renewed:
+                    self._leases[url] = renewed[url]
+                elif self._leases.pop(url, None) is not None:
+                    lost.add(url)
+            if lost:
+                logger.warning(f'{len(lost)} leases lost, their urls are not requested: {sorted(lost)}')
+
+
+async def _process(lease: Lease, batch: _Batch, sites: Dict[str, Site], scheduler: CrawlScheduler,
+                   client: HttpClient, executor: Optional[Executor]) -> bool:
+    """Fetch and parse a leased url, send the result to queue. Return whether a news was parsed"""
+    site: Optional[Site] = sites.get(lease.site)
+    if site is None:
+        await batch.complete(lease, None, f'unknown site {lease.site}')
+        return False
+    if not batch.held(lease):
+        # the url could be leased by another worker now
+        logger.warning(f'Lease lost before fetching: {lease.url}')
+        return False
+    page: Optional[Page] = await client.fetch(lease.url, scheduler)
+    if page is None:
+        await batch.complete(lease, None, 'fetch failed')
+        return False
+    try:
+        news: News
+        if executor is None:
+            news = parse_news_page(page.body, page.charset, lease.url, site.backend.name, site.queries)
+        else:
+            news = await asyncio.get_running_loop().run_in_executor(
+                executor, parse_news_page, page.body, page.charset, lease.url, site.backend.name, site.queries)
+    except Exception as e:
+        logger.exception(f'Failed to parse {lease.url}')
+        await batch.complete(lease, None, f'parse failed: {e!r}')
+        return False
+    metrics.add('extract.rows')
+    return await batch.complete(lease, news)
+
+
+async def run_worker(sites: Dict[str, Site], queue: WorkerQueue, worker_id: Optional[str] = None,
+                     batch_size: int = 20, poll_interval: float = 5.0, once: bool = False,
+                     max_concurrency: int = 20, max_per_host: int = 5, http: Optional[Dict[str, Any]] = None,
+                     parse_workers: int = 0) -> int:
+    """
+    Lease urls of the current cycle batch_size at a time, fetch and parse them. Return the news parsed
+
+    Waits poll_interval seconds when there is nothing to do (or the queue can not be reached), forever
+    or (once) until the current cycle finishes. Leases are extended while the batch is processed,
+    so a slow worker keeps its urls. A remote queue is served only during its cycle: once stops when
+    the queue can not be reached anymore after a cycle was seen
+    """
+    worker_id = worker_id or f'{socket.gethostname()}-{os.getpid()}'
+    logger.info(f'Starting worker {worker_id} on queue: {queue.path}')
+    parsed: int = 0
+    cycle: Optional[str] = None
+    scheduler = CrawlScheduler(max_concurrency, max_per_host)
+    executor: Optional[Executor] = create_parse_pool(parse_workers)
+    try:
+        async with HttpClient(**(http or dict())) as client:
+            while True:
+                try:
+                    cycle = await _call(queue.current_cycle)
+                    leases: List[Lease] = (await _call(queue.claim, cycle, worker_id, batch_size)
+                                           if cycle is not None else list())
+                    if not leases and once and (cycle is None or await _call(queue.finished, cycle)):
+                        break
+                except OSError as e:
+                    if once and cycle is not None:
+                        logger.info(f'Work queue not available anymore, cycle {cycle} is over: {e!r}')
+                        break
+                    logger.warning(f'Work queue not available: {e!r}')
+                    leases = list()
+                if not leases:
+                    await asyncio.sleep(poll_interval)
+                    continue
+                logger.info(f'Worker {worker_id} leased {len(leases)} urls of cycle {cycle}')
+                batch = _Batch(queue, leases)
+                renewing = asyncio.ensure_future(batch.renew())
+                try:
+                    results = await asyncio.gather(*(_process(lease, batch, sites, scheduler, client, executor)
+                                                     for lease in leases))
+                finally:
+                    renewing.cancel()
+                parsed += sum(results)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    logger.info(f'Worker {worker_id} finished, {parsed} news parsed')
+    return parsed
+
+
+def save_results(queue: WorkQueue, cycle: str, output_folder: str, file_format: str = 'csv') -> Dict[str, NewsList]:
+    """Save the news of cycle into the [today] folder of every site, as extract does"""
+    site_news: Dict[str, NewsList] = defaultdict(functools.partial(NewsList, columnar=True))
+    for site_name, news in queue.results(cycle):
+        site_news[site_name].append(news)
+    for site_name, news_list in site_news.items():
+        save_news(news_list, create_output_folder_from_site(output_folder, site_name), file_format)
+    failed = queue.failed(cycle)
+    metrics.add('distributed.failed', len(failed))
+    for url, error in failed:
+        logger.warning(f'Could not get {url}: {error}')
+    return dict(site_news)
+
+
+async def run_coordinator(sites: Dict[str, Site], output_folder: str, queue: WorkQueue,
+                          file_format: Optional[str] = None, skip_known: bool = False,
+                          site_timeout: Optional[float] = None, http: Optional[Dict[str, Any]] = None,
+                          poll_interval: float = 5.0, cycle_timeout: Optional[float] = None,
+                          local_worker: bool = False, worker_options: Optional[Dict[str, Any]] = None,
+                          listen: Optional[str] = None, token: Optional[str] = None) -> Dict[str, NewsList]:
+    """
+    Queue the article urls of every site in a new cycle, wait for the workers and save their news
+
+    skip_known: do not queue articles already loaded into the database of output folder
+    cycle_timeout: seconds waiting for the workers, the news done by then are saved
+    local_worker: also run a worker in this process (with worker_options), e.g. without remote workers
+    listen: host:port where the queue is served to workers on other machines (with token), None to not serve it
+    """
+    seen: SeenIndex = SeenIndex.from_database(output_folder) if skip_known else SeenIndex()
+    scheduler = CrawlScheduler(site_timeout=site_timeout, seen=seen)
+
+    cycle: str = await _call(queue.open_cycle)
+    async with contextlib.AsyncExitStack() as stack:
+        if listen is not None:
+            # after opening the cycle, so remote workers (once) do not stop before it starts
+            await stack.enter_async_context(serve_queue(queue, listen, token))
+        async with HttpClient(**(http or dict())) as client:
+            async def queue_site(site_name: str, site: Site) -> int:
+                await site.parser(site, scheduler, client)     # type: ignore
+                queued: int = await _call(queue.put, cycle, site_name, site.parser.news_home)
+                logger.info(f'Queued {queued} urls of {site_name}')
+                metrics.add('distributed.queued', queued)
+                return queued
+            await scheduler.run_sites(sites, queue_site)
+        await _call(queue.close_cycle, cycle)
+
+        async def wait() -> None:
+            while not await _call(queue.finished, cycle):
+                await asyncio.sleep(poll_interval)
+
+        waiting = asyncio.gather(wait(), run_worker(sites, queue, once=True, poll_interval=poll_interval,
+                                                    **(worker_options or dict()))) if local_worker else wait()
+        try:
+            await asyncio.wait_for(waiting, timeout=cycle_timeout)
+        except asyncio.TimeoutError:
+            logger.error(f'Cycle {cycle} not finished after {cycle_timeout} s: {await _call(queue.counts, cycle)}')
+    return save_results(queue, cycle, output_folder, file_format or 'csv')
+
+
+def is_remote(queue: str) -> bool:
+    """Whether queue is the url of a queue served by a coordinator"""
+    return queue.startswith(('http://', 'https://'))
+
+
+def open_queue(output_folder: str, queue: str = 'work_queue.db', lease_seconds: float = 300,
+               max_attempts: int = 3) -> WorkQueue:
+    """Work queue at [output_folder]/[queue] (or at queue if it is an absolute path)"""
+    return WorkQueue(os.path.join(output_folder, queue), lease_seconds, max_attempts)
+
+
+async def run(sites: Dict[str, Site], output_folder: str, extract_options: Dict[str, Any],
+              distributed_options: Dict[str, Any], file_format: Optional[str] = None, worker: bool = False,
+              once: bool = False, worker_id: Optional[str] = None):
+    """
+    Run as coordinator or (worker) as worker with the options of extract and distributed config sections
+
+    distributed_options: queue (path, or coordinator url for workers on other machines), lease_seconds and
+    max_attempts of the WorkQueue, batch_size and poll_interval of workers, cycle_timeout, local_worker
+    and listen of coordinator, token shared by coordinator and remote workers
+    """
+    options: Dict[str, Any] = dict(distributed_options)
+    queue_options: Dict[str, Any] = {key: options.pop(key) for key in QUEUE_OPTIONS if key in options}
+    worker_options: Dict[str, Any] = {key: extract_options[key] for key in WORKER_OPTIONS if key in extract_options}
+    if 'batch_size' in options:
+        worker_options['batch_size'] = options.pop('batch_size')
+    if is_remote(queue_options.get('queue', '')):
+        if not worker:
+            raise ValueError(f'The coordinator needs a queue file, not an url: {queue_options["queue"]}')
+        remote = RemoteWorkQueue(queue_options['queue'], options.get('token'))
+        await run_worker(sites, remote, worker_id, poll_interval=options.get('poll_interval', 5.0), once=once,
+                         **worker_options)
+        return
+    queue: WorkQueue = open_queue(output_folder, **queue_options)
+    try:
+        if worker:
+            await run_worker(sites, queue, worker_id, poll_interval=options.get('poll_interval', 5.0), once=once,
+                             **worker_options)
+        else:
+            await run_coordinator(sites, output_folder, queue, file_format, extract_options.get('skip_known', False),
+                                  extract_options.get('site_timeout'), extract_options.get('http'),
+                                  worker_options=worker_options, **options)
+    finally:
+        queue.close()
+
+
+if __name__ == '__main__':
+    args_parser = argparse.ArgumentParser(description='Distributed extract: coordinator (default) or worker')
+    args_parser.add_argument('--config_file', help='path to yaml config', default='config.yaml')
+    args_parser.add_argument('--worker', help='run as worker', action='store_true')
+    args_parser.add_argument('--once', help='worker stops when the current cycle finishes', action='store_true')
+    args_parser.add_argument('--worker_id', help='name of the worker, host and process id by default', required=False)
+    args_parser.add_argument('--queue', help='queue file, or coordinator url (http://host:port), instead of config',
+                             required=False)
+    args = args_parser.parse_args()
+
+    cfg = Config(args.config_file)
+    queue_config: Dict[str, Any] = dict(cfg.distributed_options, **({'queue': args.queue} if args.queue else {}))
+    asyncio.run(run(cfg.sites, cfg.output_folder, cfg.extract_options, queue_config, cfg.file_format,
+                    worker=args.worker, once=args.once, worker_id=args.worker_id))
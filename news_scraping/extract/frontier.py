@@ -0,0 +1,47 @@
+"""Index of the articles already known, used to avoid requesting them again"""
+import os
+import logging
+
+from typing import Iterable, List, Set
+
+from news_scraping.transform.cleaning import uid_from_url
+
+logger = logging.getLogger(__name__)
+
+
+class SeenIndex:
+    """Set of article uids (md5 of the url, same as transform hash_uid)"""
+    def __init__(self, uids: Iterable[str] = ()):
+        self._uids: Set[str] = set(uids)
+
+    @classmethod
+    def from_database(cls, folder: str, database_name: str = 'newspaper.db') -> 'SeenIndex':
+        """Load the uids of the articles table, empty index if database is not available yet"""
+        if not os.path.isfile(os.path.join(folder, database_name)):
+            return cls()
+        # database modules are only needed if there is a database
+        from sqlalchemy import inspect
+        from news_scraping.load.db.article import DataBaseConnection, Article
+        conn = DataBaseConnection(folder, database_name)
+        if not inspect(conn.engine).has_table(Article.__tablename__):
+            return cls()
+        with conn.engine.connect() as connection:
+            index = cls(uid for uid, in connection.execute(Article.__table__.select().with_only_columns([Article.uid])))
+        logger.info(f'Loaded {len(index)} known articles from: {conn.database_path}')
+        return index
+
+    def __len__(self) -> int:
+        return len(self._uids)
+
+    def __contains__(self, url: str) -> bool:
+        return uid_from_url(url) in self._uids
+
+    def unseen(self, urls: Iterable[str]) -> List[str]:
+        """Get urls not in index and add them, so they are only scheduled once"""
+        new_urls: List[str] = list()
+        for url in urls:
+            uid: str = uid_from_url(url)
+            if uid not in self._uids:
+                self._uids.add(uid)
+                new_urls.append(url)
+        return new_urls
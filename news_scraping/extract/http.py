@@ -0,0 +1,320 @@
+"""Http helpers shared by the different news parsers"""
+from __future__ import annotations      # aiohttp hints without importing it
+
+import ssl
+import codecs
+import random
+import asyncio
+import logging
+import datetime
+import email.utils
+
+from contextlib import asynccontextmanager
+from typing import Optional, Any, Dict, List, Callable, AsyncContextManager, AsyncIterator, NamedTuple, TYPE_CHECKING
+from typing_extensions import Protocol
+
+from news_scraping.extract.backends import Document, Feeder, decode, sniff_charset, valid_charset
+from news_scraping.extract.cache import HttpCache, CacheEntry
+from news_scraping.metrics import metrics, trace_config, RequestMetrics
+
+if TYPE_CHECKING:
+    import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Status codes worth trying again, the server could answer later
+RETRY_STATUS = frozenset({429, 500, 502, 503, 504})
+# bytes read at once from a response
+CHUNK_SIZE = 64 * 1024
+# meta charset must be declared in the first 1024 bytes of a page, a few more are read just in case
+SNIFF_SIZE = 4096
+
+
+class RequestLimiter(Protocol):
+    """Decide when a request can be sent and learn from its result (see CrawlScheduler)"""
+    def slot(self, url: str) -> AsyncContextManager[None]: ...
+
+    def deadline(self) -> Optional[float]: ...
+
+    def feedback(self, url: str, ok: bool) -> None: ...
+
+
+class Page(NamedTuple):
+    """Downloaded page"""
+    body: bytes
+    charset: Optional[str] = None           # declared in headers or meta tags, None if unknown
+    document: Optional[Document] = None     # parsed while downloading, if requested and possible
+
+    @property
+    def text(self) -> str:
+        return decode(self.body, self.charset)
+
+
+class BodyTooLarge(ValueError):
+    """Response bigger than allowed"""
+
+
+class BodyReader:
+    """
+    Collect a response body chunk by chunk, never more than max_size bytes
+
+    The charset (from headers, or from meta tags in the first SNIFF_SIZE bytes) is detected once.
+    With a feeder, the text is decoded and fed to it as it arrives, as long as the charset is known
+    (pages with an unknown charset are parsed at the end, guessing their encoding)
+    """
+    def __init__(self, max_size: int, charset: Optional[str] = None, feeder: Optional[Feeder] = None):
+        self.max_size: int = max_size
+        self.charset: Optional[str] = valid_charset(charset)
+        self.size: int = 0
+        self._chunks: List[bytes] = list()
+        self._feeder: Optional[Feeder] = feeder
+        self._decoder: Optional[codecs.IncrementalDecoder] = None
+
+    def feed(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.size > self.max_size:
+            raise BodyTooLarge(f'Response bigger than {self.max_size} bytes')
+        self._chunks.append(chunk)
+        if self._feeder is None:
+            return
+        if self._decoder is not None:
+            self._feed_text(self._decoder.decode(chunk))
+        elif self.charset is not None or self.size >= SNIFF_SIZE:
+            self._start_feeding(b''.join(self._chunks))
+
+    def _start_feeding(self, head: bytes) -> None:
+        if self.charset is None:
+            self.charset = sniff_charset(head[:SNIFF_SIZE])
+        if self.charset is None:
+            self._feeder = None
+            return
+        self._decoder = codecs.getincrementaldecoder(self.charset)(errors='replace')
+        self._feed_text(self._decoder.decode(head))
+
+    def _feed_text(self, text: str) -> None:
+        try:
+            if self._feeder is not None:
+                self._feeder.feed(text)
+        except Exception as e:
+            logger.debug(f'Could not parse page while downloading it: {e!r}')
+            self._feeder = None
+
+    def close(self) -> Page:
+        """Whole body, with the document if it was fed"""
+        body: bytes = b''.join(self._chunks)
+        if self._decoder is None:
+            if self._feeder is not None:
+                self._start_feeding(body)
+            elif self.charset is None:
+                self.charset = sniff_charset(body[:SNIFF_SIZE])
+        document: Optional[Document] = None
+        if self._feeder is not None and self._decoder is not None:
+            self._feed_text(self._decoder.decode(b'', final=True))
+        if self._feeder is not None:
+            try:
+                document = self._feeder.close()
+            except Exception as e:
+                logger.debug(f'Could not parse page while downloading it: {e!r}')
+        return Page(body, self.charset, document)
+
+
+class Attempt(NamedTuple):
+    """Result of a single request"""
+    page: Optional[Page]
+    retry: bool                         # failed, but it is worth trying again
+    retry_after: Optional[float] = None  # seconds requested by the server
+    error: str = ''
+
+
+@asynccontextmanager
+async def _no_limit(url: str) -> AsyncIterator[None]:
+    yield
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (seconds or http date), None if missing or invalid"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        date: datetime.datetime = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=datetime.timezone.utc)
+    return max((date - datetime.datetime.now(datetime.timezone.utc)).total_seconds(), 0.0)
+
+
+def backoff_delay(attempt: int, backoff: float, max_backoff: float, retry_after: Optional[float] = None) -> float:
+    """
+    Seconds to wait before trying again: random between 0 and backoff * 2 ** attempt (full jitter,
+    so failed requests do not come back all at the same time) up to max_backoff, at least retry_after
+    (even if it is longer than max_backoff)
+    """
+    delay: float = random.uniform(0, min(backoff * 2 ** attempt, max_backoff))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+async def _attempt(session: aiohttp.ClientSession, url: str, client_timeout: aiohttp.ClientTimeout,
+                   cached: Optional[CacheEntry], cache: Optional[HttpCache], attempt: int, max_size: int,
+                   feeder: Optional[Callable[[], Optional[Feeder]]]) -> Attempt:
+    """Request url once"""
+    import aiohttp
+    request = RequestMetrics(url, attempt=attempt)
+    headers: Dict[str, str] = cached.validators if cached is not None else dict()
+    try:
+        async with session.get(url, timeout=client_timeout, headers=headers, trace_request_ctx=request) as response:
+            if response.status == 304 and cached is not None:
+                logger.debug(f'Not modified, using cache for: {url}')
+                request.finish(response.status)
+                metrics.request(request)
+                reader = BodyReader(len(cached.body), cached.charset, feeder() if feeder is not None else None)
+                reader.feed(cached.body)
+                return Attempt(reader.close(), retry=False)
+            if response.status == 200:
+                if response.content_length is not None and response.content_length > max_size:
+                    raise BodyTooLarge(f'Response of {response.content_length} bytes, more than {max_size}')
+                reader = BodyReader(max_size, response.charset, feeder() if feeder is not None else None)
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    reader.feed(chunk)
+                page: Page = reader.close()
+                request.finish(response.status, reader.size)
+                metrics.request(request)
+                if cache is not None:
+                    cache.put(CacheEntry(url, page.body,
+                                         response.headers.get('ETag'),
+                                         response.headers.get('Last-Modified'),
+                                         page.charset))
+                return Attempt(page, retry=False)
+            request.finish(response.status)
+            metrics.request(request)
+            if response.status not in RETRY_STATUS:
+                logger.warning(f'Invalid response {response.status} from {url}')
+                return Attempt(None, retry=False, error=f'status {response.status}')
+            logger.warning(f'Response {response.status} from {url} (attempt {attempt + 1})')
+            return Attempt(None, retry=True, retry_after=parse_retry_after(response.headers.get('Retry-After')),
+                           error=f'status {response.status}')
+    except BodyTooLarge as e:
+        # the connection is closed without reading the rest
+        request.finish(None)
+        metrics.request(request)
+        logger.warning(f'{e} from {url}')
+        return Attempt(None, retry=False, error='too large')
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        request.finish(None)
+        metrics.request(request)
+        logger.warning(f'Error requesting {url} (attempt {attempt + 1}): {e!r}')
+        return Attempt(None, retry=True, error=repr(e))
+
+
+async def fetch(session: aiohttp.ClientSession, url: str, timeout: float = 30,
+                retries: int = 2, backoff: float = 1.0, cache: Optional[HttpCache] = None,
+                limiter: Optional[RequestLimiter] = None, max_backoff: float = 30,
+                connect_timeout: Optional[float] = None, read_timeout: Optional[float] = None,
+                max_size: int = 10 * 1024 * 1024, feeder: Optional[Callable[[], Optional[Feeder]]] = None) -> Optional[Page]:
+    """
+    Get url page, None if it was not possible
+
+    The body is read in chunks, pages bigger than max_size bytes are given up. If feeder returns
+    an incremental parser (see ParserBackend.feeder), the page is parsed while it is downloaded.
+
+    Timeouts, connection errors and RETRY_STATUS responses are tried again up to 'retries' times,
+    waiting as backoff_delay says (and the Retry-After header asks). Urls are given up instead when
+    the wait would pass the limiter deadline (the site timeout). timeout limits the whole request,
+    connect_timeout and read_timeout (between two reads) make hung connections fail earlier.
+    Every attempt waits for a limiter slot, released while waiting to try again, and the limiter
+    learns whether the host is answering well.
+    If a cache is provided, a conditional request is sent for cached urls and the
+    cached body is returned when the server answers 304 (not modified).
+    Every attempt is added to the run metrics, urls given up are added as dead letters
+    """
+    import aiohttp
+    client_timeout = aiohttp.ClientTimeout(total=timeout, sock_connect=connect_timeout, sock_read=read_timeout)
+    cached: Optional[CacheEntry] = cache.get(url) if cache is not None else None
+    result = Attempt(None, retry=False)
+    for attempt in range(retries + 1):
+        async with (limiter.slot(url) if limiter is not None else _no_limit(url)):
+            result = await _attempt(session, url, client_timeout, cached, cache, attempt, max_size, feeder)
+        if limiter is not None:
+            limiter.feedback(url, ok=not result.retry)
+        if not result.retry or attempt == retries:
+            break
+        delay: float = backoff_delay(attempt, backoff, max_backoff, result.retry_after)
+        deadline: Optional[float] = limiter.deadline() if limiter is not None else None
+        if deadline is not None and asyncio.get_running_loop().time() + delay > deadline:
+            logger.warning(f'{url} would be tried again after {delay:g} s, past the site timeout, giving up')
+            result = result._replace(error=f'{result.error}, retry after {delay:g} s')
+            break
+        metrics.add('http.retries')
+        # the limiter slot is released while waiting
+        await asyncio.sleep(delay)
+    if result.page is None:
+        metrics.dead_letter(url, result.error)
+    return result.page
+
+
+class HttpClient:
+    """
+    Http session shared by all the parsers during a run
+
+    A single connection pool (with dns cache and keep-alive) and a single ssl context
+    are used for every site, the session is created the first time it is needed.
+    Responses are revalidated against the cache, if any
+    """
+    def __init__(self, limit: int = 100, limit_per_host: int = 10, ttl_dns_cache: int = 300,
+                 keepalive_timeout: float = 30, timeout: float = 30, retries: int = 2, backoff: float = 1.0,
+                 cache: Optional[HttpCache] = None, max_backoff: float = 30,
+                 connect_timeout: Optional[float] = None, read_timeout: Optional[float] = None,
+                 max_size_mb: float = 10):
+        """Configure connection pool and request policy (see fetch)"""
+        self.limit: int = limit
+        self.limit_per_host: int = limit_per_host
+        self.ttl_dns_cache: int = ttl_dns_cache
+        self.keepalive_timeout: float = keepalive_timeout
+        self.timeout: float = timeout
+        self.retries: int = retries
+        self.backoff: float = backoff
+        self.max_backoff: float = max_backoff
+        self.connect_timeout: Optional[float] = connect_timeout
+        self.read_timeout: Optional[float] = read_timeout
+        self.max_size: int = int(max_size_mb * 1024 * 1024)
+        self.cache: Optional[HttpCache] = cache
+        import certifi
+        self._ssl_context: ssl.SSLContext = ssl.create_default_context(cafile=certifi.where())
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """Get the session, create it if not available. Needs a running event loop"""
+        if self._session is None or self._session.closed:
+            import aiohttp
+            conn = aiohttp.TCPConnector(ssl=self._ssl_context,
+                                        limit=self.limit,
+                                        limit_per_host=self.limit_per_host,
+                                        ttl_dns_cache=self.ttl_dns_cache,
+                                        keepalive_timeout=self.keepalive_timeout)
+            self._session = aiohttp.ClientSession(connector=conn, trust_env=True, trace_configs=[trace_config()])
+        return self._session
+
+    async def fetch(self, url: str, limiter: Optional[RequestLimiter] = None,
+                    feeder: Optional[Callable[[], Optional[Feeder]]] = None) -> Optional[Page]:
+        """Get url page using the shared session, None if it was not possible"""
+        return await fetch(self.session, url, self.timeout, self.retries, self.backoff, self.cache, limiter,
+                           self.max_backoff, self.connect_timeout, self.read_timeout, self.max_size, feeder)
+
+    async def close(self) -> None:
+        """Close the session and all its connections"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self) -> HttpClient:
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.close()
@@ -8,27 +8,88 @@ Get the news for today from different news sites and save them into [today] fold
 import argparse
 import logging
 import asyncio
+import functools
+import os
 
-from typing import List, Dict
+from concurrent.futures import Executor
+from typing import List, Dict, Optional, Any, Callable, Awaitable
 
-from news_scraping.output import create_output_folder_from_site, save_news_to_csv
-from news_scraping.news import News
+from news_scraping.output import create_output_folder_from_site, save_news
+from news_scraping.news import News, NewsList
 from news_scraping.common import Config, Site
+from news_scraping.extract.scheduler import CrawlScheduler
+from news_scraping.extract.http import HttpClient
+from news_scraping.extract.cache import HttpCache
+from news_scraping.extract.frontier import SeenIndex
+from news_scraping.extract.workers import create_parse_pool
+from news_scraping.extract.news_parser import NewsSink
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# receives site name and news
+SiteSink = Callable[[str, News], Awaitable[None]]
 
-async def run(sites: Dict[str, Site], output_folder: str):
-    """Get the news for today and save them into [today] folder as different txt files"""
-    # get news for all the different folders
-    for site_name, site in sites.items():
-        await site.parser(site)     # type: ignore
-        site_news: List[News] = await site.parser.parse_news()
+
+async def extract_site(site_name: str, site: Site, output_folder: str,
+                       scheduler: CrawlScheduler, client: HttpClient,
+                       executor: Optional[Executor] = None, sink: Optional[SiteSink] = None,
+                       file_format: str = 'csv') -> NewsList:
+    """
+    Get the news for a single site and save them into its [today] folder
+
+    If a sink is provided every news is sent to it as soon as it is parsed, nothing is saved.
+    Nothing is saved either without news (e.g. every article was known)
+    """
+    site_sink: Optional[NewsSink] = None
+    if sink is not None:
+        site_sink = functools.partial(sink, site_name)
+    await site.parser(site, scheduler, client, executor, site_sink)     # type: ignore
+    site_news: NewsList = await site.parser.parse_news()
+    if sink is None and len(site_news):
         # save news in specific folder
         valid_output_folder: str = create_output_folder_from_site(output_folder, site_name)
         # save_news_to_txt(site_news, output_folder)
-        save_news_to_csv(site_news, valid_output_folder)
+        save_news(site_news, valid_output_folder, file_format)
+    return site_news
+
+
+async def run(sites: Dict[str, Site], output_folder: str,
+              max_concurrency: int = 20, max_per_host: int = 5, site_timeout: Optional[float] = None,
+              http: Optional[Dict[str, Any]] = None, http_cache: Optional[Dict[str, Any]] = None,
+              skip_known: bool = False, parse_workers: int = 0, sink: Optional[SiteSink] = None,
+              file_format: Optional[str] = None):
+    """
+    Get the news for today and save them into [today] folder as different txt files
+
+    http: options for the HttpClient shared by all the sites (connection pool, timeouts, retries)
+    http_cache: options for the HttpCache (folder relative to output folder, max size and age)
+    skip_known: do not request articles already loaded into the database of output folder
+    parse_workers: processes used to parse news pages, 0 to parse them in the event loop
+    sink: coroutine receiving (site name, news) as soon as they are parsed, instead of saving them
+    file_format: format of the saved news (see formats), csv if not provided
+    """
+    seen: SeenIndex = SeenIndex.from_database(output_folder) if skip_known else SeenIndex()
+    cache: Optional[HttpCache] = None
+    if http_cache is not None:
+        cache_options: Dict[str, Any] = dict(http_cache)
+        cache_folder: str = os.path.join(output_folder, cache_options.pop('folder', '.http_cache'))
+        cache = HttpCache(cache_folder, **cache_options)
+        cache.evict()
+    # get news for all the different sites at the same time
+    scheduler = CrawlScheduler(max_concurrency, max_per_host, site_timeout, seen)
+    executor: Optional[Executor] = create_parse_pool(parse_workers)
+    try:
+        async with HttpClient(**(http or dict()), cache=cache) as client:
+            results: Dict[str, Optional[NewsList]] = await scheduler.run_sites(
+                sites, lambda site_name, site: extract_site(site_name, site, output_folder, scheduler, client,
+                                                            executor, sink, file_format or 'csv'))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    failed: List[str] = [site_name for site_name, site_news in results.items() if site_news is None]
+    if failed:
+        logger.warning(f'Could not get news from: {failed}')
 
 
 if __name__ == '__main__':
@@ -43,4 +104,4 @@ if __name__ == '__main__':
     o_folder: str = cfg.output_folder
     logger.info(f'Beginning scraper for: {sites_}')
     logger.info(f'Output folder: {o_folder}')
-    asyncio.run(run(sites_, o_folder))
+    asyncio.run(run(sites_, o_folder, file_format=cfg.file_format, **cfg.extract_options))
@@ -1,25 +1,27 @@
 """Contains different parsers like beautiful soup and xpath"""
 from __future__ import annotations      # resolve circular dependency with hints
 
-import requests
-import aiohttp
-import certifi
-import ssl
-
-import bs4
 import logging
 import asyncio
+import functools
 
 from asyncio import Task
 from abc import ABC, abstractmethod
-from typing import List, Set, Callable, Awaitable, Any
+from concurrent.futures import Executor
+from typing import List, Set, Callable, Awaitable, Any, Optional
 
 from news_scraping.news import News, NewsList
+from news_scraping.extract.scheduler import CrawlScheduler
+from news_scraping.extract.http import HttpClient, Page
+from news_scraping.extract.backends import Document
+from news_scraping.extract.workers import parse_news_page
 from news_scraping import common
+from news_scraping.metrics import metrics
 
 logger = logging.getLogger(__name__)
 
-SessionTask = List[Callable[[aiohttp.ClientSession, str, int], Awaitable[None]]]
+SessionTask = List[Callable[[str, int], Awaitable[None]]]
+NewsSink = Callable[[News], Awaitable[None]]
 
 
 class NewsParser(ABC):
@@ -28,7 +30,7 @@ class NewsParser(ABC):
         """Get list of news from home"""
 
     @abstractmethod
-    async def parse_news(self) -> List[News]:
+    async def parse_news(self) -> NewsList:
         """Get news"""
 
     @property
@@ -46,7 +48,27 @@ class NewsParser(ABC):
     def news_home(self) -> List[str]:
         """Get the Site object used"""
 
-    async def get_news_details(self, news_page: bs4.BeautifulSoup, news_url: str) -> News:
+    @property
+    @abstractmethod
+    def scheduler(self) -> CrawlScheduler:
+        """Get the scheduler that limits the concurrent requests"""
+
+    @property
+    @abstractmethod
+    def client(self) -> HttpClient:
+        """Get the http client used for requests"""
+
+    @property
+    @abstractmethod
+    def executor(self) -> Optional[Executor]:
+        """Get the pool used to parse news pages, None to parse them in the event loop"""
+
+    @property
+    @abstractmethod
+    def sink(self) -> Optional[NewsSink]:
+        """Get the coroutine receiving every parsed news, None to keep them in news"""
+
+    async def get_news_details(self, news_page: Document, news_url: str) -> News:
         """Get the details from news page and return a News object"""
         title, summary, body = await asyncio.gather(
             self._get_news_title(news_page),
@@ -55,45 +77,66 @@ class NewsParser(ABC):
         )
         return News(title, summary, body, news_url)
 
-    async def _get_news_title(self, news_page: bs4.BeautifulSoup) -> str:
+    async def _get_news_title(self, news_page: Document) -> str:
         """Get the news title from news page"""
         for result in await common.select_query(self.site.queries['news_title'], news_page):
             return str(result.text.strip())
         return 'No title found'
 
-    async def _get_news_summary(self, news_page: bs4.BeautifulSoup) -> str:
+    async def _get_news_summary(self, news_page: Document) -> str:
         """Get the news summary from news page"""
         for result in await common.select_query(self.site.queries['news_summary'], news_page):
             return str(result.text.strip())
         return 'No summary found'
 
-    async def _get_news_body(self, news_page: bs4.BeautifulSoup) -> str:
+    async def _get_news_body(self, news_page: Document) -> str:
         """Get the news body from news page"""
         body_text: List[str] = list()
         for result in await common.select_query(self.site.queries['news_body'], news_page):
             body_text.append(result.text.strip())
         return '\n'.join(body_text)
 
-    def _get_session_tasks(self, session: aiohttp.ClientSession) -> List[Task[Any]]:
+    def _get_session_tasks(self) -> List[Task[Any]]:
         """Get a list of http requests"""
         tasks: List[Task[Any]] = list()
         for i, news_url in enumerate(self.news_home):
-            tasks.append(asyncio.create_task(self._async_http_requests(session, news_url, i)))
+            tasks.append(asyncio.create_task(self._async_http_requests(news_url, i)))
         return tasks
 
-    async def _async_http_requests(self, session: aiohttp.ClientSession, news_url: str,
-                                   index: int) -> None:
+    async def _async_http_requests(self, news_url: str, index: int) -> None:
         """Parse data asynchronously """
         logger.info(f'(task {index} / {len(self.news_home) - 1}) - Parsing data from: {news_url} ...')
-        async with session.get(news_url, ssl=False) as response:
-            if not response.status == 200:
-                logger.warning(f'--- task: {index} Failed to parse!')
+        # pages are parsed while downloaded when the backend can, unless they are parsed by workers
+        feeder = functools.partial(self.site.backend.feeder, self.site.article_queries) if self.executor is None else None
+        page: Optional[Page] = await self.client.fetch(news_url, self.scheduler, feeder)
+        if page is None:
+            logger.warning(f'--- task: {index} Failed to parse!')
+            return
+        logger.info(f'--- task: {index}: SUCCESS!')
+        news_details: News
+        try:
+            if self.executor is None:
+                news_page: Optional[Document] = page.document
+                if news_page is None:
+                    with metrics.timer('extract.parse'):
+                        news_page = self.site.backend.parse(page.text, self.site.article_queries)
+                news_details = await self.get_news_details(news_page, news_url)
             else:
-                logger.info(f'--- task: {index}: SUCCESS!')
-                text = await response.read()
-                news_page = bs4.BeautifulSoup(text.decode('utf-8'), 'html.parser')
-                news_details: News = await self.get_news_details(news_page, news_url)
-                self.news.append(news_details)
+                # includes the time waiting for a free worker
+                with metrics.timer('extract.parse_pool'):
+                    news_details = await asyncio.get_running_loop().run_in_executor(
+                        self.executor, parse_news_page, page.body, page.charset, news_url,
+                        self.site.backend.name, self.site.queries)
+        except Exception as e:
+            # a broken page must not lose the rest of the site
+            logger.warning(f'--- task: {index} Failed to parse {news_url}: {e!r}')
+            metrics.dead_letter(news_url, f'parse failed: {e!r}')
+            return
+        metrics.add('extract.rows')
+        if self.sink is None:
+            self.news.append(news_details)
+        else:
+            await self.sink(news_details)
 
 
 class ElUniversalParser(NewsParser):
@@ -102,12 +145,27 @@ class ElUniversalParser(NewsParser):
         """get the universal site info initialization"""
         self._site: common.Site
         self._news_home: List[str]
-        self._news: NewsList = NewsList()
-
-    async def __call__(self, site: common.Site):
+        self._news: NewsList = NewsList(columnar=True)
+        self._scheduler: CrawlScheduler
+        self._client: HttpClient
+        self._owns_client: bool = False
+        self._executor: Optional[Executor] = None
+        self._sink: Optional[NewsSink] = None
+
+    async def __call__(self, site: common.Site, scheduler: Optional[CrawlScheduler] = None,
+                       client: Optional[HttpClient] = None, executor: Optional[Executor] = None,
+                       sink: Optional[NewsSink] = None):
         """Parse data. This is done to have __init__ without arguments"""
         self._site = site
-        self._news_home = await self.parse_home()
+        self._executor = executor
+        self._sink = sink
+        self._scheduler = scheduler if scheduler is not None else CrawlScheduler()
+        # without a shared client the parser uses (and closes) its own
+        self._owns_client = client is None
+        self._client = client if client is not None else HttpClient()
+        news_home: List[str] = await self.parse_home()
+        self._news_home = self._scheduler.unseen(news_home)
+        logger.info(f'{len(news_home) - len(self._news_home)} news already known, requesting {len(self._news_home)}')
 
     @property
     def news(self) -> NewsList:
@@ -121,7 +179,23 @@ class ElUniversalParser(NewsParser):
     def site(self) -> common.Site:
         return self._site
 
-    async def _get_news_from_home(self, home: bs4.BeautifulSoup) -> List[str]:
+    @property
+    def scheduler(self) -> CrawlScheduler:
+        return self._scheduler
+
+    @property
+    def client(self) -> HttpClient:
+        return self._client
+
+    @property
+    def executor(self) -> Optional[Executor]:
+        return self._executor
+
+    @property
+    def sink(self) -> Optional[NewsSink]:
+        return self._sink
+
+    async def _get_news_from_home(self, home: Document) -> List[str]:
         """Get list of news"""
         links_set: Set[str] = set()     # use a set to get unique values
         for link in await common.select_query(self._site.homepage_links_query, home):
@@ -132,20 +206,28 @@ class ElUniversalParser(NewsParser):
 
     async def parse_home(self) -> List[str]:
         """Parse news from home"""
-        response_home: requests.Response = requests.get(self._site.url)
-        if not response_home.status_code == 200:
+        queries: List[str] = [self._site.homepage_links_query]
+        response_home: Optional[Page] = await self._client.fetch(self._site.url, self._scheduler,
+                                                                 functools.partial(self._site.backend.feeder, queries))
+        if response_home is None:
             logger.warning(f'Could not parse data from {self._site.url}')
-            return list([f'Invalid response from {self._site.url}'])
-        home = bs4.BeautifulSoup(response_home.text, 'html.parser')
+            return list()
+        home: Document = (response_home.document if response_home.document is not None
+                          else self._site.backend.parse(response_home.text, queries))
         logger.info(f'Getting news from: {self._site.url}')
         return await self._get_news_from_home(home)
 
-    async def parse_news(self) -> List[News]:
-        """Get news from home return a list of News objects"""
-        ssl_context = ssl.create_default_context(cafile=certifi.where())
-        conn = aiohttp.TCPConnector(ssl=ssl_context)
-        async with aiohttp.ClientSession(connector=conn, trust_env=True) as session:
-            tasks = self._get_session_tasks(session)
+    async def parse_news(self) -> NewsList:
+        """Get news from home return them as a NewsList"""
+        tasks: List[Task[Any]] = list()
+        try:
+            tasks = self._get_session_tasks()
             await asyncio.gather(*tasks)
+        finally:
+            # e.g. the sink failed or the site timed out, do not leave requests behind
+            for task in tasks:
+                task.cancel()
+            if self._owns_client:
+                await self._client.close()
 
-        return self._news.get_news()
+        return self._news
@@ -0,0 +1,132 @@
+"""
+Work queue over http, for workers on other machines
+
+The coordinator keeps the sqlite WorkQueue and serves it (serve_queue), so only its process opens the
+file. Workers use RemoteWorkQueue, which has the WorkQueue methods a worker needs. If a token is
+configured every request must carry it (Authorization: Bearer [token])
+"""
+import json
+import time
+import socket
+import asyncio
+import logging
+import functools
+import contextlib
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, List, Optional
+
+import requests
+
+from news_scraping.news import News
+from news_scraping.extract.work_queue import Lease, WorkQueue
+
+logger = logging.getLogger(__name__)
+
+
+def _handlers(queue: WorkQueue) -> Dict[str, Callable[..., Any]]:
+    """WorkQueue methods used by workers, with json arguments and results"""
+    return dict(
+        settings=lambda: dict(lease_seconds=queue.lease_seconds),
+        current_cycle=queue.current_cycle,
+        claim=lambda cycle, worker, limit: [lease._asdict() for lease in queue.claim(cycle, worker, limit)],
+        extend=lambda leases: [lease._asdict() for lease in queue.extend(Lease(**lease) for lease in leases)],
+        complete=lambda lease, news, error: queue.complete(Lease(**lease), News(**news) if news is not None else None,
+                                                           error),
+        finished=queue.finished)
+
+
+@contextlib.asynccontextmanager
+async def serve_queue(queue: WorkQueue, listen: str, token: Optional[str] = None) -> AsyncIterator[str]:
+    """
+    Serve queue to remote workers while in the context, yield the url they have to use
+
+    listen: host:port ('0.0.0.0:8780' for every interface, port 0 for a free one)
+    """
+    from aiohttp import web
+    handlers: Dict[str, Callable[..., Any]] = _handlers(queue)
+    # queue calls are serialized anyway, a thread of its own keeps them apart from the default executor
+    executor = ThreadPoolExecutor(max_workers=1)
+
+    async def handle(request: web.Request) -> web.Response:
+        if token is not None and request.headers.get('Authorization') != f'Bearer {token}':
+            raise web.HTTPUnauthorized()
+        handler: Optional[Callable[..., Any]] = handlers.get(request.match_info['method'])
+        if handler is None:
+            raise web.HTTPNotFound()
+        try:
+            arguments: Dict[str, Any] = await request.json()
+            # sqlite calls block, keep the loop free for the other workers
+            result: Any = await asyncio.get_running_loop().run_in_executor(executor, functools.partial(handler, **arguments))
+        except (ValueError, TypeError) as e:
+            raise web.HTTPBadRequest(text=repr(e))
+        return web.json_response(result)
+
+    host, _, port = listen.rpartition(':')
+    app = web.Application()
+    app.router.add_post('/{method}', handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    try:
+        await web.TCPSite(runner, host or None, int(port)).start()
+        bound_port: int = runner.addresses[0][1]
+        url: str = f'http://{host if host not in ("", "0.0.0.0", "::") else socket.gethostname()}:{bound_port}'
+        logger.info(f'Serving work queue {queue.path} to workers at: {url}')
+        yield url
+    finally:
+        await runner.cleanup()
+        executor.shutdown()
+
+
+class RemoteWorkQueue:
+    """
+    WorkQueue served by a coordinator (see serve_queue), only the methods used by workers
+
+    Methods block until the coordinator answers (up to timeout seconds), call them from an executor in
+    async code. Connection errors and error answers raise OSError (requests.RequestException).
+    Leases expire at the time of this machine (clocks of workers and coordinator could differ)
+    """
+    def __init__(self, url: str, token: Optional[str] = None, timeout: float = 30):
+        self.path: str = url.rstrip('/')
+        self.timeout: float = timeout
+        self._headers: Dict[str, str] = {'Authorization': f'Bearer {token}'} if token is not None else dict()
+        self._lease_seconds: Optional[float] = None
+
+    def _post(self, method: str, **arguments: Any) -> Any:
+        response = requests.post(f'{self.path}/{method}', data=json.dumps(arguments), headers=self._headers,
+                                 timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def close(self) -> None:
+        pass
+
+    @property
+    def lease_seconds(self) -> float:
+        """Lease time of the coordinator queue, asked the first time it is needed"""
+        if self._lease_seconds is None:
+            self._lease_seconds = float(self._post('settings')['lease_seconds'])
+        return self._lease_seconds
+
+    def current_cycle(self) -> Optional[str]:
+        cycle: Optional[str] = self._post('current_cycle')
+        return cycle
+
+    def claim(self, cycle: str, worker: str, limit: int = 10) -> List[Lease]:
+        # lease_seconds after sending the request, never later than on the coordinator
+        until: float = time.time() + self.lease_seconds
+        return [Lease(**dict(lease, until=until)) for lease in
+                self._post('claim', cycle=cycle, worker=worker, limit=limit)]
+
+    def extend(self, leases: Iterable[Lease]) -> List[Lease]:
+        until: float = time.time() + self.lease_seconds
+        return [Lease(**dict(lease, until=until)) for lease in
+                self._post('extend', leases=[lease._asdict() for lease in leases])]
+
+    def complete(self, lease: Lease, news: Optional[News], error: str = '') -> bool:
+        return bool(self._post('complete', lease=lease._asdict(), news=asdict(news) if news is not None else None,
+                               error=error))
+
+    def finished(self, cycle: str) -> bool:
+        return bool(self._post('finished', cycle=cycle))
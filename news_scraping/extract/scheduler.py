@@ -0,0 +1,126 @@
+"""Schedule the crawl of different sites concurrently"""
+import asyncio
+import logging
+
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from urllib.parse import urlparse
+from typing import Dict, Callable, Awaitable, AsyncIterator, Optional, TypeVar, Iterable, List
+
+from news_scraping.extract.frontier import SeenIndex
+
+logger = logging.getLogger(__name__)
+
+S = TypeVar('S')   # site
+T = TypeVar('T')   # crawl result
+
+# loop time when the crawl of the current site times out, set for every site task
+_site_deadline: 'ContextVar[Optional[float]]' = ContextVar('site_deadline', default=None)
+
+
+class AdaptiveLimit:
+    """
+    Requests in flight allowed for a host, following how the host answers (AIMD):
+    halved on every error and increased by one after 'limit' successes in a row, between 1 and max_limit
+    """
+    def __init__(self, max_limit: int):
+        """Needs to be created inside a running event loop"""
+        self.max_limit: int = max_limit
+        self.limit: int = max_limit
+        self.in_flight: int = 0
+        self._successes: int = 0
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self) -> None:
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def success(self) -> None:
+        self._successes += 1
+        if self._successes >= self.limit and self.limit < self.max_limit:
+            # waiting requests are woken up by the next release
+            self.limit += 1
+            self._successes = 0
+
+    def error(self) -> None:
+        self.limit = max(self.limit // 2, 1)
+        self._successes = 0
+
+
+class CrawlScheduler:
+    """
+    Run the crawl of several sites at the same time
+
+    Every http request must be done inside a slot, this keeps a global concurrency budget
+    and a per host limit, so no single site gets too many requests at once.
+    The per host limit adapts (see AdaptiveLimit) when requests report their result with feedback,
+    so a host answering errors (or asking to slow down) gets fewer requests at once.
+    Article links already in the seen index are not scheduled
+    """
+    def __init__(self, max_concurrency: int = 20, max_per_host: int = 5, site_timeout: Optional[float] = None,
+                 seen: Optional[SeenIndex] = None):
+        """Needs to be created inside a running event loop"""
+        self.max_concurrency: int = max_concurrency
+        self.max_per_host: int = max_per_host
+        self.site_timeout: Optional[float] = site_timeout
+        self.seen: SeenIndex = seen if seen is not None else SeenIndex()
+        self._global = asyncio.Semaphore(max_concurrency)
+        self._per_host: Dict[str, AdaptiveLimit] = dict()
+
+    def _host_limit(self, url: str) -> AdaptiveLimit:
+        """Get (or create) the limit for url host"""
+        host: str = urlparse(url).netloc
+        if host not in self._per_host:
+            self._per_host[host] = AdaptiveLimit(self.max_per_host)
+        return self._per_host[host]
+
+    def unseen(self, urls: Iterable[str]) -> List[str]:
+        """Get the urls that need to be requested"""
+        return self.seen.unseen(urls)
+
+    @asynccontextmanager
+    async def slot(self, url: str) -> AsyncIterator[None]:
+        """Wait until there is budget available to request url"""
+        async with self._host_limit(url), self._global:
+            yield
+
+    def deadline(self) -> Optional[float]:
+        """Loop time when the crawl of the current site times out, None without site_timeout"""
+        return _site_deadline.get()
+
+    def feedback(self, url: str, ok: bool) -> None:
+        """Result of a request to url, ok: False for errors worth slowing down for (timeouts, 429, 5xx)"""
+        limit: AdaptiveLimit = self._host_limit(url)
+        if ok:
+            limit.success()
+            return
+        previous: int = limit.limit
+        limit.error()
+        if limit.limit < previous:
+            logger.info(f'Requests at once to {urlparse(url).netloc} reduced to {limit.limit}')
+
+    async def _run_site(self, site_name: str, site: S,
+                        crawl: Callable[[str, S], Awaitable[T]]) -> Optional[T]:
+        """Crawl a single site, errors are logged so they do not affect other sites"""
+        if self.site_timeout is not None:
+            # every site runs in a task of its own, the value is seen by its requests only
+            _site_deadline.set(asyncio.get_running_loop().time() + self.site_timeout)
+        try:
+            return await asyncio.wait_for(crawl(site_name, site), timeout=self.site_timeout)
+        except asyncio.TimeoutError:
+            logger.error(f'Timeout while crawling {site_name} after {self.site_timeout} s')
+        except Exception as e:
+            logger.exception(f'Failed to crawl {site_name}: {e}')
+        return None
+
+    async def run_sites(self, sites: Dict[str, S],
+                        crawl: Callable[[str, S], Awaitable[T]]) -> Dict[str, Optional[T]]:
+        """Crawl all sites concurrently and return the result per site (None if it failed)"""
+        results = await asyncio.gather(*(self._run_site(name, site, crawl) for name, site in sites.items()))
+        return dict(zip(sites.keys(), results))
@@ -0,0 +1,234 @@
+"""
+Work queue shared by the coordinator and the extract workers of a distributed crawl
+
+Article urls are queued once per cycle, workers lease them, fetch and parse them and send the news back.
+Workers renew (extend) their leases while they work, leases expire when they stop doing it, so the urls
+of a crashed (or hung) worker are leased again by other workers, but never while they are leased.
+Backed by a sqlite file, used directly by the processes of its machine. sqlite locking is not reliable on
+network filesystems, workers on other machines use the coordinator queue over http (see queue_server)
+"""
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import datetime
+import threading
+
+from dataclasses import asdict
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from typing_extensions import Protocol
+
+from news_scraping.news import News
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cycles (
+    cycle TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    open INTEGER NOT NULL DEFAULT 1     -- urls are still being queued
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    cycle TEXT NOT NULL,
+    url TEXT NOT NULL,
+    site TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',      -- pending, leased, done or failed
+    worker TEXT,
+    token TEXT,                                 -- identifies the current lease
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    news TEXT,                                  -- json, once done
+    error TEXT,
+    PRIMARY KEY (cycle, url)
+);
+CREATE INDEX IF NOT EXISTS tasks_state ON tasks (cycle, state);
+"""
+
+
+class Lease(NamedTuple):
+    """Url leased by a worker until 'until' (unix time)"""
+    cycle: str
+    url: str
+    site: str
+    token: str
+    until: float
+
+
+class WorkerQueue(Protocol):
+    """Queue methods used by workers: WorkQueue, or RemoteWorkQueue on other machines"""
+    path: str
+
+    @property
+    def lease_seconds(self) -> float: ...
+
+    def close(self) -> None: ...
+
+    def current_cycle(self) -> Optional[str]: ...
+
+    def claim(self, cycle: str, worker: str, limit: int = 10) -> List[Lease]: ...
+
+    def extend(self, leases: Iterable[Lease]) -> List[Lease]: ...
+
+    def complete(self, lease: Lease, news: Optional[News], error: str = '') -> bool: ...
+
+    def finished(self, cycle: str) -> bool: ...
+
+
+class WorkQueue:
+    """
+    Lease based queue of article urls
+
+    lease_seconds: time a lease lasts without being extended, then the url can be leased again
+    max_attempts: leases of a url before giving it up (its workers keep failing or crashing)
+
+    Methods block while other processes write (up to 30 s), call them from an executor in async code.
+    A queue can be used from several threads
+    """
+    def __init__(self, path: str, lease_seconds: float = 300, max_attempts: int = 3):
+        """Open (or create) the queue at path"""
+        self.path: str = path
+        self.lease_seconds: float = lease_seconds
+        self.max_attempts: int = max_attempts
+        # transactions are started explicitly, BEGIN IMMEDIATE so leases are taken by a single worker.
+        # default (rollback) journal: wal needs shared memory and brings nothing to a few small writes
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _transaction(self) -> sqlite3.Cursor:
+        return self._conn.execute('BEGIN IMMEDIATE')
+
+    def open_cycle(self, cycle: Optional[str] = None) -> str:
+        """Start a new cycle (named after the current time if no name is given) and return its name"""
+        cycle = cycle or datetime.datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        with self._lock:
+            self._conn.execute('INSERT OR IGNORE INTO cycles (cycle, created) VALUES (?, ?)', (cycle, time.time()))
+        logger.info(f'Opened cycle {cycle} in work queue: {self.path}')
+        return cycle
+
+    def close_cycle(self, cycle: str) -> None:
+        """Every url of the cycle was queued, workers can finish once they are done"""
+        with self._lock:
+            self._conn.execute('UPDATE cycles SET open = 0 WHERE cycle = ?', (cycle,))
+
+    def current_cycle(self) -> Optional[str]:
+        """Last cycle opened, None if there is none"""
+        with self._lock:
+            row = self._conn.execute('SELECT cycle FROM cycles ORDER BY created DESC LIMIT 1').fetchone()
+        return str(row[0]) if row is not None else None
+
+    def put(self, cycle: str, site: str, urls: Iterable[str]) -> int:
+        """Queue urls of site, urls already in the cycle are ignored. Return the urls queued"""
+        with self._lock:
+            self._transaction()
+            try:
+                before: int = self._conn.total_changes
+                self._conn.executemany('INSERT OR IGNORE INTO tasks (cycle, url, site) VALUES (?, ?, ?)',
+                                       ((cycle, url, site) for url in urls))
+                queued: int = self._conn.total_changes - before
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+        return queued
+
+    def _expire(self, cycle: str, now: float) -> None:
+        """Expired leases are pending again, or failed after max_attempts (inside a transaction)"""
+        self._conn.execute("""UPDATE tasks SET state = 'failed', error = 'lease expired', token = NULL
+                              WHERE cycle = ? AND state = 'leased' AND lease_until < ? AND attempts >= ?""",
+                           (cycle, now, self.max_attempts))
+        expired = self._conn.execute("""UPDATE tasks SET state = 'pending', worker = NULL, token = NULL
+                                        WHERE cycle = ? AND state = 'leased' AND lease_until < ?""", (cycle, now))
+        if expired.rowcount:
+            logger.warning(f'{expired.rowcount} expired leases queued again')
+
+    def claim(self, cycle: str, worker: str, limit: int = 10) -> List[Lease]:
+        """Lease up to limit pending urls of cycle for worker"""
+        now: float = time.time()
+        until: float = now + self.lease_seconds
+        with self._lock:
+            self._transaction()
+            try:
+                self._expire(cycle, now)
+                rows: List[Tuple[str, str]] = self._conn.execute(
+                    "SELECT url, site FROM tasks WHERE cycle = ? AND state = 'pending' ORDER BY rowid LIMIT ?",
+                    (cycle, limit)).fetchall()
+                leases: List[Lease] = [Lease(cycle, url, site, uuid.uuid4().hex, until) for url, site in rows]
+                self._conn.executemany("""UPDATE tasks SET state = 'leased', worker = ?, token = ?, lease_until = ?,
+                                          attempts = attempts + 1 WHERE cycle = ? AND url = ?""",
+                                       ((worker, lease.token, until, cycle, lease.url) for lease in leases))
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+        return leases
+
+    def extend(self, leases: Iterable[Lease]) -> List[Lease]:
+        """Renew leases for lease_seconds more, return them with their new expiration (lost leases are left out)"""
+        until: float = time.time() + self.lease_seconds
+        held: List[Lease] = list()
+        with self._lock:
+            self._transaction()
+            try:
+                for lease in leases:
+                    updated = self._conn.execute("""UPDATE tasks SET lease_until = ?
+                                                    WHERE cycle = ? AND url = ? AND token = ? AND state = 'leased'""",
+                                                 (until, lease.cycle, lease.url, lease.token))
+                    if updated.rowcount:
+                        held.append(lease._replace(until=until))
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+        return held
+
+    def complete(self, lease: Lease, news: Optional[News], error: str = '') -> bool:
+        """
+        Store the news of a leased url (None if it could not be fetched or parsed)
+
+        Return False if the lease was lost (it expired and the url was leased again), nothing is stored then
+        """
+        state: str = 'done' if news is not None else 'failed'
+        data: Optional[str] = json.dumps(asdict(news)) if news is not None else None
+        with self._lock:
+            updated = self._conn.execute("""UPDATE tasks SET state = ?, news = ?, error = ?, token = NULL
+                                            WHERE cycle = ? AND url = ? AND token = ? AND state = 'leased'""",
+                                         (state, data, error or None, lease.cycle, lease.url, lease.token))
+        if not updated.rowcount:
+            logger.warning(f'Lease lost, result ignored: {lease.url}')
+        return bool(updated.rowcount)
+
+    def counts(self, cycle: str) -> Dict[str, int]:
+        """Urls of cycle per state"""
+        with self._lock:
+            return {state: count for state, count in
+                    self._conn.execute('SELECT state, count(*) FROM tasks WHERE cycle = ? GROUP BY state', (cycle,))}
+
+    def finished(self, cycle: str) -> bool:
+        """Whether every url of cycle was queued and is done or failed"""
+        with self._lock:
+            row = self._conn.execute('SELECT open FROM cycles WHERE cycle = ?', (cycle,)).fetchone()
+        if row is None or row[0]:
+            return False
+        counts: Dict[str, int] = self.counts(cycle)
+        return not counts.get('pending') and not counts.get('leased')
+
+    def results(self, cycle: str) -> Iterator[Tuple[str, News]]:
+        """(site, news) of every url done in cycle"""
+        with self._lock:
+            rows: List[Tuple[str, str]] = self._conn.execute(
+                "SELECT site, news FROM tasks WHERE cycle = ? AND state = 'done' ORDER BY rowid", (cycle,)).fetchall()
+        for site, data in rows:
+            yield site, News(**json.loads(data))
+
+    def failed(self, cycle: str) -> List[Tuple[str, str]]:
+        """(url, error) of every url given up in cycle"""
+        with self._lock:
+            return [(url, error or '') for url, error in
+                    self._conn.execute("SELECT url, error FROM tasks WHERE cycle = ? AND state = 'failed' ORDER BY rowid",
+                                       (cycle,))]
@@ -0,0 +1,40 @@
+"""Parse news pages in worker processes, so the event loop only waits for network"""
+import logging
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+from news_scraping.news import News
+from news_scraping.extract.backends import Document, decode, get_backend
+
+logger = logging.getLogger(__name__)
+
+
+def _first_text(news_page: Document, query: str, default: str) -> str:
+    """Get the text of the first match, default if nothing matches"""
+    for result in news_page.select(query):
+        return str(result.text.strip())
+    return default
+
+
+def parse_news_page(markup: bytes, charset: Optional[str], news_url: str, backend_name: str,
+                    queries: Dict[str, str]) -> News:
+    """
+    Parse news page and apply site queries, same results as NewsParser.get_news_details
+
+    Top level function so it can be sent to a worker process
+    """
+    article_queries: List[str] = [queries['news_title'], queries['news_summary'], queries['news_body']]
+    news_page: Document = get_backend(backend_name).parse(decode(markup, charset), article_queries)
+    title: str = _first_text(news_page, queries['news_title'], 'No title found')
+    summary: str = _first_text(news_page, queries['news_summary'], 'No summary found')
+    body: str = '\n'.join(result.text.strip() for result in news_page.select(queries['news_body']))
+    return News(title, summary, body, news_url)
+
+
+def create_parse_pool(workers: int = 0) -> Optional[ProcessPoolExecutor]:
+    """Pool of processes for parsing, None (parse in event loop) if workers is 0"""
+    if workers <= 0:
+        return None
+    logger.info(f'Parsing news pages with {workers} worker processes')
+    return ProcessPoolExecutor(max_workers=workers)
@@ -0,0 +1,159 @@
+"""
+File formats used to pass news between stages
+
+csv and pickle need nothing else, parquet and arrow (ipc / feather v2) are compressed,
+columnar formats that need pyarrow: only the requested columns are read, and the files are
+memory mapped instead of copied into memory before converting them to pandas
+"""
+from __future__ import annotations      # pandas hints without importing it
+
+import os
+import logging
+
+from abc import ABC, abstractmethod
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, TypeVar, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# folder (in output folder) with the partitions written by transform and read by load
+PARTITIONS_FOLDER = 'transform'
+
+T = TypeVar('T')
+
+
+def _projection(names: Sequence[str], columns: Optional[Sequence[str]]) -> Optional[List[str]]:
+    """Requested columns available in the file, None for all of them"""
+    if columns is None:
+        return None
+    return [name for name in names if name in columns]
+
+
+class NewsFormat(ABC):
+    """Read and write news dataframes"""
+    name: str
+    suffix: str
+
+    @abstractmethod
+    def read(self, path: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """Read dataframe from path, only columns (the ones available) if provided"""
+
+    @abstractmethod
+    def write(self, df: pd.DataFrame, path: str) -> None:
+        """Write dataframe (without its index) to path"""
+
+
+class CsvFormat(NewsFormat):
+    """Plain text csv"""
+    name = 'csv'
+    suffix = '.csv'
+
+    def read(self, path: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        import pandas as pd
+        logger.info(f'Reading data from: {path}')
+        return pd.read_csv(path, usecols=None if columns is None else lambda name: name in columns)
+
+    def write(self, df: pd.DataFrame, path: str) -> None:
+        df.to_csv(path, index=False)
+
+
+class PickleFormat(NewsFormat):
+    """Pickled dataframe, the whole file is read before selecting the columns"""
+    name = 'pickle'
+    suffix = '.pkl'
+
+    def read(self, path: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        import pandas as pd
+        logger.info(f'Reading data from: {path}')
+        df: pd.DataFrame = pd.read_pickle(path)
+        selected: Optional[List[str]] = _projection(list(df.columns), columns)
+        return df if selected is None else df[selected]
+
+    def write(self, df: pd.DataFrame, path: str) -> None:
+        df.to_pickle(path)
+
+
+class ParquetFormat(NewsFormat):
+    """Parquet, compressed with zstd. Needs pyarrow"""
+    name = 'parquet'
+    suffix = '.parquet'
+
+    def read(self, path: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        import pyarrow.parquet as pq
+        logger.info(f'Reading data from: {path}')
+        selected: Optional[List[str]] = _projection(pq.read_schema(path, memory_map=True).names, columns)
+        return pq.read_table(path, columns=selected, memory_map=True).to_pandas()
+
+    def write(self, df: pd.DataFrame, path: str) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), path, compression='zstd')
+
+
+class ArrowFormat(NewsFormat):
+    """Arrow ipc file (feather v2), compressed with zstd. Needs pyarrow"""
+    name = 'arrow'
+    suffix = '.arrow'
+
+    def read(self, path: str, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        import pyarrow as pa
+        import pyarrow.feather as feather
+        logger.info(f'Reading data from: {path}')
+        with pa.memory_map(path) as source:
+            names: List[str] = pa.ipc.open_file(source).schema.names
+        return feather.read_table(path, columns=_projection(names, columns), memory_map=True).to_pandas()
+
+    def write(self, df: pd.DataFrame, path: str) -> None:
+        import pyarrow as pa
+        import pyarrow.feather as feather
+        feather.write_feather(pa.Table.from_pandas(df, preserve_index=False), path, compression='zstd')
+
+
+FORMATS: Dict[str, NewsFormat] = {news_format.name: news_format() for news_format in    # type: ignore
+                                  (CsvFormat, PickleFormat, ParquetFormat, ArrowFormat)}
+
+
+def read_files(read: Callable[[str], T], files: Iterable[str], max_workers: int = 8) -> Iterator[T]:
+    """
+    Read every file with max_workers threads, results in the order of files
+
+    Only max_workers * 2 files are read ahead of the caller, the next file is submitted when a result
+    is consumed (pool.map would submit all of them and keep their dataframes until they are consumed)
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending: Deque[Future[T]] = deque()
+        for file in files:
+            pending.append(pool.submit(read, file))
+            if len(pending) >= max_workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def get_format(format_name: str) -> NewsFormat:
+    """map format name to NewsFormat"""
+    return FORMATS[format_name.lower()]
+
+
+def save_partitions(df: pd.DataFrame, folder: str, news_format: NewsFormat, name: str) -> List[str]:
+    """
+    Save news in a file per site and date (hive style): folder/site=[site]/date=[%Y-%m-%d]/[name][suffix]
+
+    Return the paths written
+    """
+    import pandas as pd
+    paths: List[str] = list()
+    for (site, date), partition in df.groupby(['site', 'date'], dropna=False, sort=False):
+        day: str = date.strftime('%Y-%m-%d') if isinstance(date, datetime) and pd.notna(date) else 'unknown'
+        partition_folder: str = os.path.join(folder, f'site={site}', f'date={day}')
+        os.makedirs(partition_folder, exist_ok=True)
+        path: str = os.path.join(partition_folder, f'{name}{news_format.suffix}')
+        logger.info(f'Saving data to: {path}')
+        news_format.write(partition, path)
+        paths.append(path)
+    return paths
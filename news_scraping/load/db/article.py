@@ -1,32 +1,123 @@
 """Handle database connections and interactions"""
 import os
 
+from typing import Any, Dict, List, Optional, Set
+
 from sqlalchemy import Column, String, Integer, DateTime
-from sqlalchemy.sql import exists
+from sqlalchemy.dialects.sqlite import insert
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, inspect
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from news_scraping.output import create_output_folder
 
 
-def record_exists(session, column, value) -> bool:
-    """Whether value exists in session column"""
-    return bool(session.query(exists().where(column == value)).scalar())
+# full text index of articles (external content: the text is only stored in articles),
+# kept up to date by triggers so every insert of the loader is indexed in the same transaction
+SEARCH_TABLE = 'articles_fts'
+SEARCH_INDEX: List[str] = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        title, summary, body, content='articles', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2')""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_insert AFTER INSERT ON articles BEGIN
+        INSERT INTO {SEARCH_TABLE}(rowid, title, summary, body) VALUES (new.rowid, new.title, new.summary, new.body);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_delete AFTER DELETE ON articles BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, title, summary, body)
+        VALUES ('delete', old.rowid, old.title, old.summary, old.body);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_update AFTER UPDATE ON articles BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, title, summary, body)
+        VALUES ('delete', old.rowid, old.title, old.summary, old.body);
+        INSERT INTO {SEARCH_TABLE}(rowid, title, summary, body) VALUES (new.rowid, new.title, new.summary, new.body);
+    END""",
+]
+
+
+def insert_articles(connection, rows: List[Dict[str, Any]]) -> int:
+    """
+    Insert rows (column: value) into articles with a single executemany,
+    rows whose uid already exists are ignored. Return the number of inserted rows
+    """
+    if not rows:
+        return 0
+    statement = insert(Article.__table__).on_conflict_do_nothing(index_elements=['uid'])
+    return int(connection.execute(statement, rows).rowcount)
 
 
 class DataBaseConnection:
-    """Configure database connection"""
+    """
+    Configure database connection
+
+    Every connection uses write ahead log (readers do not block the loader and the other way around)
+    and waits up to busy_timeout seconds for locks instead of failing with 'database is locked'.
+    A read_only connection needs an existing database and never writes to it
+    """
     Base = declarative_base()
 
-    def __init__(self, folder: str, database_name: str = 'newspaper.db'):
-        """Create database connection"""
+    def __init__(self, folder: str, database_name: str = 'newspaper.db', journal_mode: str = 'wal',
+                 synchronous: str = 'normal', cache_size: int = -65536, mmap_size: int = 268435456,
+                 busy_timeout: float = 30, read_only: bool = False):
+        """
+        Create database connection
+
+        cache_size: pages, or KiB if negative (sqlite pragma)
+        mmap_size: bytes of the database file memory mapped
+        Raise FileNotFoundError if read_only and the database does not exist
+        """
         self.database_path: str = os.path.join(folder, database_name)
-        create_output_folder(folder)
-        self.engine = create_engine(f'sqlite:///{self.database_path}')
+        self.pragmas: Dict[str, Any] = dict(journal_mode=journal_mode, synchronous=synchronous,
+                                            cache_size=cache_size, mmap_size=mmap_size)
+        if read_only:
+            if not os.path.isfile(self.database_path):
+                raise FileNotFoundError(f'No database at {self.database_path}')
+            # the journal mode is stored in the database, it can not be changed without writing
+            del self.pragmas['journal_mode']
+            self.engine = create_engine(f'sqlite:///file:{self.database_path}?mode=ro&uri=true',
+                                        connect_args=dict(timeout=busy_timeout))
+        else:
+            create_output_folder(folder)
+            self.engine = create_engine(f'sqlite:///{self.database_path}', connect_args=dict(timeout=busy_timeout))
+        event.listen(self.engine, 'connect', self._set_pragmas)
         self.Session = sessionmaker(bind=self.engine)
 
+    def _set_pragmas(self, dbapi_connection, connection_record) -> None:
+        """Apply pragmas to every new connection"""
+        cursor = dbapi_connection.cursor()
+        for pragma, value in self.pragmas.items():
+            cursor.execute(f'PRAGMA {pragma}={value}')
+        cursor.close()
+
+    def create_all(self) -> None:
+        """Create tables and indexes not available yet (columns and indexes are also added to existing tables)"""
+        self.Base.metadata.create_all(self.engine)
+        self._add_new_columns()
+        for table in self.Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(self.engine, checkfirst=True)
+        new_search_index: bool = not inspect(self.engine).has_table(SEARCH_TABLE)
+        with self.engine.begin() as connection:
+            for statement in SEARCH_INDEX:
+                connection.exec_driver_sql(statement)
+        if new_search_index:
+            # articles loaded before the index existed
+            self.rebuild_search_index()
+
+    def _add_new_columns(self) -> None:
+        """Add the columns of the model missing in tables created by an earlier version (they are NULL)"""
+        for table in self.Base.metadata.sorted_tables:
+            existing: Set[str] = {column['name'] for column in inspect(self.engine).get_columns(table.name)}
+            with self.engine.begin() as connection:
+                for column in table.columns:
+                    if column.name not in existing:
+                        connection.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {column.name} '
+                                                   f'{column.type.compile(self.engine.dialect)}')
+
+    def rebuild_search_index(self) -> None:
+        """Index every article again, needed if rowids change (e.g. after VACUUM)"""
+        with self.engine.begin() as connection:
+            connection.exec_driver_sql(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')")
+
 
 class Article(DataBaseConnection.Base):     # type: ignore
     __tablename__ = 'articles'
@@ -36,15 +127,17 @@ class Article(DataBaseConnection.Base):     # type: ignore
     summary = Column(String)
     body = Column(String)
     url = Column(String)
-    date = Column(DateTime)
-    site = Column(String)
-    host = Column(String)
+    date = Column(DateTime, index=True)
+    site = Column(String, index=True)
+    host = Column(String, index=True)
     n_tokens_title = Column(Integer)
     n_tokens_body = Column(Integer)
+    # uid of the earlier news with (almost) the same body, NULL if none or not checked
+    duplicate_of = Column(String)
 
     def __init__(self, uid, title: str, summary: str,
                  body: str, url: str, date: str, site: str,
-                 host: str, n_tokens_title: int, n_tokens_body: int):
+                 host: str, n_tokens_title: int, n_tokens_body: int, duplicate_of: Optional[str] = None):
         self.uid = uid
         self.title = title
         self.summary = summary
@@ -55,3 +148,4 @@ class Article(DataBaseConnection.Base):     # type: ignore
         self.host = host
         self.n_tokens_title = n_tokens_title
         self.n_tokens_body = n_tokens_body
+        self.duplicate_of = duplicate_of
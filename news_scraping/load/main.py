@@ -1,50 +1,124 @@
 """
 Load data into a database
 """
+from __future__ import annotations      # pandas hints without importing it
 
+import os
 import argparse
 import logging
-import pandas as pd
 import dataclasses
-from sqlalchemy.exc import IntegrityError
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, TYPE_CHECKING
 
-from news_scraping.load.utils import read_news_from_pickles
-from news_scraping.news import NewsList
-from news_scraping.load.db.article import DataBaseConnection, Article, record_exists
+from news_scraping.load.utils import iter_news_from_partitions, find_partition_files
+from news_scraping.news import News, NEWS_FIELDS, iter_records
+from news_scraping.formats import NewsFormat, get_format, FORMATS, PARTITIONS_FOLDER
+from news_scraping.load.db.article import DataBaseConnection, insert_articles
+from news_scraping.transform.manifest import Manifest
+from news_scraping.metrics import metrics
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 logging.basicConfig(level=logging.INFO)
 
 logger = logging.getLogger(__name__)
 
+MANIFEST_NAME = 'load_manifest.json'
+# columns of transform partitions stored with the news when available (empty values as NULL)
+OPTIONAL_COLUMNS: Tuple[str, ...] = ('duplicate_of',)
+
+
+class LoadCount(NamedTuple):
+    """Result of loading news into database"""
+    inserted: int
+    skipped: int
+
+
+def _batches(rows: Iterable[Dict[str, Any]], batch_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Split rows in lists of batch_size"""
+    iterator = iter(rows)
+    batch: List[Dict[str, Any]] = list(islice(iterator, batch_size))
+    while batch:
+        yield batch
+        batch = list(islice(iterator, batch_size))
+
+
+def load_rows(conn: DataBaseConnection, rows: Iterable[Dict[str, Any]], batch_size: int = 1000) -> LoadCount:
+    """Insert rows (column: value) in batches, in a single transaction. Existing uids are skipped"""
+    inserted: int = 0
+    total: int = 0
+    with metrics.timer('load.insert'), conn.engine.begin() as connection:
+        for batch in _batches(rows, batch_size):
+            inserted += insert_articles(connection, batch)
+            total += len(batch)
+    metrics.add('load.rows', total)
+    metrics.add('load.inserted', inserted)
+    return LoadCount(inserted, total - inserted)
+
+
+def partition_rows(news: pd.DataFrame) -> Iterator[Dict[str, Any]]:
+    """Rows of a transform partition for the articles table: News attributes and the optional columns available"""
+    optional: Dict[str, List[Optional[str]]] = {
+        column: [value if isinstance(value, str) and value else None for value in news[column].tolist()]
+        for column in OPTIONAL_COLUMNS if column in news}
+    records: Iterator[Dict[str, Any]] = iter_records(news)
+    if not optional:
+        return records
+    names: List[str] = list(optional)
+    return (dict(record, **dict(zip(names, values))) for record, values in zip(records, zip(*optional.values())))
+
+
+def load_news(conn: DataBaseConnection, news: Iterable[News], batch_size: int = 1000) -> LoadCount:
+    """Save news into database, ignoring the ones already stored"""
+    return load_rows(conn, (dataclasses.asdict(art) for art in news), batch_size)
+
+
+def run(input_path: str, batch_size: int = 1000, database: Optional[Dict[str, Any]] = None,
+        file_format: Optional[str] = None, incremental: bool = True) -> None:
+    """
+    Save data into a database, batch_size news are inserted at once
 
-def run(input_path: str) -> None:
-    """Save data into a database"""
+    Only the partitions not loaded yet (see load_manifest.json) are read unless incremental is False
+    database: DataBaseConnection options (sqlite pragmas)
+    file_format: format of transform partitions (see formats), pickle if not provided
+    """
+    news_format: NewsFormat = get_format(file_format or 'pickle')
+    manifest = Manifest(os.path.join(input_path, MANIFEST_NAME))
+    if not incremental:
+        manifest.clear()
+    partitions_folder: str = os.path.join(input_path, PARTITIONS_FOLDER)
+    files: List[str] = manifest.pending(find_partition_files(partitions_folder, news_format))
+    if not files:
+        logger.info('No new partitions to load')
+        return
     # configure database
-    conn = DataBaseConnection(input_path)
-    conn.Base.metadata.create_all(conn.engine)
-    # Read data
-    news: pd.DataFrame = read_news_from_pickles(input_path)
-    news_list = NewsList()
-    news_list.read_from_df(news)
-    # save data to database
-    with conn.Session.begin() as session:
-        for art in news_list.get_news():
-            if record_exists(session, Article.uid, art.uid):
-                logger.info(f'Duplicated id: {art.uid}. Ignore')
-                continue
-            logger.info(f'Loading article uid {art.uid} into DB')
-            article = Article(**dataclasses.asdict(art))
-            try:
-                session.add(article)
-            except IntegrityError as e:
-                logger.error(f'Error: {e}')
+    conn = DataBaseConnection(input_path, **(database or dict()))
+    conn.create_all()
+    # Read data and save it to database, one file at a time
+    inserted: int = 0
+    skipped: int = 0
+    try:
+        for file, news in zip(files, iter_news_from_partitions(partitions_folder, news_format,
+                                                               NEWS_FIELDS + OPTIONAL_COLUMNS, files=files)):
+            count: LoadCount = load_rows(conn, partition_rows(news), batch_size)
+            inserted += count.inserted
+            skipped += count.skipped
+            manifest.mark([file])
+    finally:
+        # partitions loaded so far are not read again, even if a later one fails
+        manifest.save()
+    logger.info(f'Inserted {inserted} news into {conn.database_path}, skipped {skipped} already stored')
 
 
 if __name__ == '__main__':
     # load the configuration file
     args_parser = argparse.ArgumentParser()
     args_parser.add_argument('--inputs', help='Path to input folder', required=True)
+    args_parser.add_argument('--batch_size', help='news inserted at once', type=int, default=1000)
+    args_parser.add_argument('--format', help='format of transform partitions', choices=list(FORMATS), required=False)
+    args_parser.add_argument('--full', help='load every partition again, not only the new ones', action='store_true')
     args = args_parser.parse_args()
     input_f: str = args.inputs
     logger.info(f'Reading inputs from: {input_f}')
-    run(input_f)
+    run(input_f, batch_size=args.batch_size, file_format=args.format, incremental=not args.full)
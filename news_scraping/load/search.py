@@ -0,0 +1,116 @@
+"""
+Full text search over the loaded news
+
+Queries use sqlite fts5 syntax: words (all of them must appear), "exact phrases", OR, NOT, prefix*
+and column filters (title: word). Results are ranked with bm25, matches in title and summary
+weigh more than matches in body
+"""
+
+import sys
+import argparse
+import datetime
+import logging
+
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from news_scraping.load.db.article import DataBaseConnection, SEARCH_TABLE
+
+logger = logging.getLogger(__name__)
+
+# bm25 weights of title, summary and body
+RANK_WEIGHTS = (10.0, 5.0, 1.0)
+# start of the sqlite errors caused by the query itself
+QUERY_ERRORS = ('fts5: syntax error', 'unterminated string', 'no such column')
+
+
+class InvalidQuery(ValueError):
+    """Query that is not valid fts5 syntax"""
+
+
+class SearchResult(NamedTuple):
+    """Article matching a query, lower rank is better"""
+    uid: str
+    title: str
+    url: str
+    site: str
+    date: str
+    rank: float
+    snippet: str
+
+
+def _day(day: datetime.date) -> str:
+    """Date as stored in articles, to compare it with the date column"""
+    return datetime.datetime.combine(day, datetime.time()).isoformat(' ')
+
+
+def search(conn: DataBaseConnection, query: str, site: Optional[str] = None,
+           since: Optional[datetime.date] = None, until: Optional[datetime.date] = None,
+           limit: int = 20) -> List[SearchResult]:
+    """
+    Get the articles matching query, best ranked first
+
+    site: only articles from this site
+    since, until: only articles published between these days (both included)
+    Raise InvalidQuery if query is not valid fts5 syntax
+    """
+    conditions: List[str] = [f'{SEARCH_TABLE} MATCH :query']
+    params: Dict[str, Any] = dict(query=query, limit=limit)
+    if site is not None:
+        conditions.append('articles.site = :site')
+        params['site'] = site
+    if since is not None:
+        conditions.append('articles.date >= :since')
+        params['since'] = _day(since)
+    if until is not None:
+        conditions.append('articles.date < :until')
+        params['until'] = _day(until + datetime.timedelta(days=1))
+    weights: str = ', '.join(str(weight) for weight in RANK_WEIGHTS)
+    statement: str = f"""
+        SELECT articles.uid, articles.title, articles.url, articles.site, articles.date,
+               bm25({SEARCH_TABLE}, {weights}) AS rank,
+               snippet({SEARCH_TABLE}, 2, '[', ']', '...', 16)
+        FROM {SEARCH_TABLE} JOIN articles ON articles.rowid = {SEARCH_TABLE}.rowid
+        WHERE {' AND '.join(conditions)}
+        ORDER BY rank
+        LIMIT :limit"""
+    try:
+        with conn.engine.connect() as connection:
+            return [SearchResult(*row) for row in connection.execute(text(statement), params)]
+    except OperationalError as e:
+        if str(e.orig).startswith(QUERY_ERRORS):
+            raise InvalidQuery(f'{e.orig}') from None
+        raise
+
+
+if __name__ == '__main__':
+    args_parser = argparse.ArgumentParser(description='Search the loaded news')
+    args_parser.add_argument('query', help='fts5 query, e.g. economía "banco central" NOT deportes')
+    args_parser.add_argument('--inputs', help='Path to input folder (with the database)', required=True)
+    args_parser.add_argument('--site', help='only news from this site', required=False)
+    args_parser.add_argument('--since', help='only news from this day on (YYYY-MM-DD)', type=datetime.date.fromisoformat)
+    args_parser.add_argument('--until', help='only news until this day (YYYY-MM-DD)', type=datetime.date.fromisoformat)
+    args_parser.add_argument('--limit', help='results shown', type=int, default=20)
+    args_parser.add_argument('--rebuild', help='index every article again before searching', action='store_true')
+    args = args_parser.parse_args()
+    try:
+        # searching never changes the database, only --rebuild writes to it
+        db = DataBaseConnection(args.inputs, read_only=True)
+    except FileNotFoundError as error:
+        sys.exit(f'{error}, load news into {args.inputs} first')
+    if args.rebuild:
+        writer = DataBaseConnection(args.inputs)
+        writer.create_all()
+        writer.rebuild_search_index()
+    try:
+        results: List[SearchResult] = search(db, args.query, args.site, args.since, args.until, args.limit)
+    except InvalidQuery as error:
+        sys.exit(f'Invalid query {args.query!r}: {error}')
+    except OperationalError as error:
+        if 'no such table' not in str(error.orig):
+            raise
+        sys.exit(f'No news indexed in {db.database_path}, load news first: {error.orig}')
+    for result in results:
+        print(f'{(result.date or "")[:10]} [{result.site}] {result.title}\n    {result.url}\n    {result.snippet}')
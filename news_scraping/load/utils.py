@@ -3,20 +3,57 @@ import os
 
 import logging
 
+from typing import List, Iterator, Optional, Sequence
+
+from news_scraping.formats import NewsFormat, read_files
+
 logger = logging.getLogger(__name__)
 
 
-def read_news_from_pickles(folder: str, suffix: str = '.pkl') -> pd.DataFrame:
+def _read_pickle(file: str) -> pd.DataFrame:
+    """Read a single pickle file"""
+    logger.info(f'Reading data from: {file}')
+    return pd.read_pickle(file)
+
+
+def iter_news_from_pickles(folder: str, suffix: str = '.pkl', max_workers: int = 8) -> Iterator[pd.DataFrame]:
+    """
+    Read news from 'suffix' files in folder, one dataframe per file
+
+    max_workers: files read at the same time (twice as many are read ahead at most)
+    """
+    files: List[str] = [os.path.join(root, file)
+                        for root, dirs, files in os.walk(folder)
+                        for file in files if file.endswith(suffix)]
+    yield from read_files(_read_pickle, files, max_workers)
+
+
+def find_partition_files(folder: str, news_format: NewsFormat) -> List[str]:
+    """Get the path of every news_format file in folder"""
+    return [os.path.join(root, file)
+            for root, dirs, files in os.walk(folder)
+            for file in files if file.endswith(news_format.suffix)]
+
+
+def iter_news_from_partitions(folder: str, news_format: NewsFormat, columns: Optional[Sequence[str]] = None,
+                              max_workers: int = 8, files: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+    """
+    Read news from news_format files in folder (or only files), one dataframe per file in the same order
+
+    columns: only read these columns (when available in the file)
+    max_workers: files read at the same time (twice as many are read ahead at most)
+    """
+    if files is None:
+        files = find_partition_files(folder, news_format)
+    yield from read_files(lambda file: news_format.read(file, columns), files, max_workers)
+
+
+def read_news_from_pickles(folder: str, suffix: str = '.pkl', max_workers: int = 8) -> pd.DataFrame:
     """
     Read news from 'suffix' files in folder and return a dataframe with all the data
     """
-    # store all the data in a single dataframe
-    news_df = pd.DataFrame()
-    for root, dirs, files in os.walk(folder):
-        for file in files:
-            if file.endswith(suffix):
-                f: str = os.path.join(root, file)
-                logger.info(f'Reading data from: {f}')
-                news: pd.DataFrame = pd.read_pickle(f)
-                news_df = news_df.append(news)
-    return news_df
+    # store all the data in a single dataframe, concatenated once
+    frames: List[pd.DataFrame] = list(iter_news_from_pickles(folder, suffix, max_workers))
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames)
@@ -0,0 +1,334 @@
+"""
+Run metrics: where the time (and memory) of a pipeline run goes
+
+Stages, steps, requests and queues report to the module 'metrics' object (as they do to their
+loggers), the run report is saved as json and, optionally, as a prometheus text file
+"""
+from __future__ import annotations      # aiohttp hints without importing it
+
+import os
+import sys
+import json
+import time
+import datetime
+import threading
+import contextlib
+
+from collections import defaultdict
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Iterator, List, Optional, TYPE_CHECKING
+from urllib.parse import urlparse
+
+if TYPE_CHECKING:
+    import aiohttp
+
+
+def peak_memory() -> Optional[int]:
+    """Peak resident memory of this process in bytes, None if not available (windows)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak: int = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports KiB, macos bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def current_rss() -> Optional[int]:
+    """Resident memory of this process in bytes, None if not available (only linux)"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class PeakMemory:
+    """
+    Peak resident memory while in the context, sampled every interval seconds by a thread
+
+    Without /proc (not linux) the peak is the one of the whole process so far (peak_memory)
+    """
+    def __init__(self, interval: float = 0.01):
+        self.interval: float = interval
+        self._peak: Optional[int] = None
+        self._done = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, daemon=True)
+
+    def _update(self) -> None:
+        rss: Optional[int] = current_rss()
+        if rss is not None and (self._peak is None or rss > self._peak):
+            self._peak = rss
+
+    def _sample(self) -> None:
+        while not self._done.wait(self.interval):
+            self._update()
+
+    def __enter__(self) -> PeakMemory:
+        self._update()
+        self._sampler.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._done.set()
+        self._sampler.join()
+        self._update()
+
+    @property
+    def peak(self) -> Optional[int]:
+        """Bytes, None if not available"""
+        return self._peak if self._peak is not None else peak_memory()
+
+
+@dataclass
+class RequestMetrics:
+    """
+    Timings (seconds) of a single http request, filled by aiohttp trace hooks
+
+    dns and connect are 0 when a pooled connection (or the dns cache) was used
+    """
+    url: str
+    status: Optional[int] = None
+    attempt: int = 0
+    dns: float = 0.0
+    connect: float = 0.0
+    ttfb: float = 0.0
+    download: float = 0.0
+    total: float = 0.0
+    bytes: int = 0
+    _start: float = 0.0
+    _dns_start: float = 0.0
+    _connect_start: float = 0.0
+
+    @property
+    def host(self) -> str:
+        return str(urlparse(self.url).netloc)
+
+    def finish(self, status: Optional[int], size: int = 0) -> None:
+        """Request done (successfully or not), size: bytes of the body"""
+        end: float = time.perf_counter()
+        self.status = status
+        self.bytes = size
+        self.total = end - self._start if self._start else 0.0
+        self.download = max(self.total - self.ttfb, 0.0) if self.ttfb else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {key: value for key, value in asdict(self).items() if not key.startswith('_')}
+
+
+async def _on_request_start(session: Any, context: Any, params: Any) -> None:
+    if isinstance(context.trace_request_ctx, RequestMetrics):
+        context.trace_request_ctx._start = time.perf_counter()
+
+
+async def _on_dns_resolvehost_start(session: Any, context: Any, params: Any) -> None:
+    if isinstance(context.trace_request_ctx, RequestMetrics):
+        context.trace_request_ctx._dns_start = time.perf_counter()
+
+
+async def _on_dns_resolvehost_end(session: Any, context: Any, params: Any) -> None:
+    request: Any = context.trace_request_ctx
+    if isinstance(request, RequestMetrics):
+        request.dns = time.perf_counter() - request._dns_start
+
+
+async def _on_connection_create_start(session: Any, context: Any, params: Any) -> None:
+    if isinstance(context.trace_request_ctx, RequestMetrics):
+        context.trace_request_ctx._connect_start = time.perf_counter()
+
+
+async def _on_connection_create_end(session: Any, context: Any, params: Any) -> None:
+    request: Any = context.trace_request_ctx
+    if isinstance(request, RequestMetrics):
+        # includes dns resolution and tls handshake
+        request.connect = time.perf_counter() - request._connect_start
+
+
+async def _on_request_end(session: Any, context: Any, params: Any) -> None:
+    request: Any = context.trace_request_ctx
+    if isinstance(request, RequestMetrics):
+        # response headers received
+        request.ttfb = time.perf_counter() - request._start
+
+
+def trace_config() -> aiohttp.TraceConfig:
+    """aiohttp trace hooks filling the RequestMetrics sent as trace_request_ctx"""
+    import aiohttp
+    config = aiohttp.TraceConfig()
+    config.on_request_start.append(_on_request_start)
+    config.on_dns_resolvehost_start.append(_on_dns_resolvehost_start)
+    config.on_dns_resolvehost_end.append(_on_dns_resolvehost_end)
+    config.on_connection_create_start.append(_on_connection_create_start)
+    config.on_connection_create_end.append(_on_connection_create_end)
+    config.on_request_end.append(_on_request_end)
+    return config
+
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    """count, total, mean, p50, p95 and max of values"""
+    ordered: List[float] = sorted(values)
+    if not ordered:
+        return dict(count=0)
+    return dict(count=len(ordered), total=sum(ordered), mean=sum(ordered) / len(ordered),
+                p50=ordered[len(ordered) // 2], p95=ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)],
+                max=ordered[-1])
+
+
+def _metric_name(name: str) -> str:
+    """Valid prometheus name"""
+    return ''.join(c if c.isalnum() else '_' for c in name)
+
+
+class RunMetrics:
+    """Metrics of a pipeline run, safe to use from several threads"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget everything, a new run starts now"""
+        with self._lock:
+            self.started: datetime.datetime = datetime.datetime.now()
+            self._start: float = time.perf_counter()
+            self.stages: Dict[str, Dict[str, Any]] = dict()
+            self.timings: Dict[str, List[float]] = defaultdict(list)
+            self.counters: Dict[str, float] = defaultdict(float)
+            self.queues: Dict[str, Dict[str, int]] = dict()
+            self.requests: List[RequestMetrics] = list()
+            self.dead_letters: List[Dict[str, str]] = list()
+
+    @contextlib.contextmanager
+    def stage(self, name: str, interval: float = 0.01) -> Iterator[None]:
+        """Measure wall time and peak memory of a stage (memory sampled every interval seconds)"""
+        memory = PeakMemory(interval)
+        start: float = time.perf_counter()
+        try:
+            with memory:
+                yield
+        finally:
+            seconds: float = time.perf_counter() - start
+            with self._lock:
+                self.stages[name] = dict(seconds=seconds, peak_memory_bytes=memory.peak)
+
+    @contextlib.contextmanager
+    def timer(self, name: str) -> Iterator[None]:
+        """Measure a step, the same step can be measured many times (e.g. once per news)"""
+        start: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.timings[name].append(seconds)
+
+    def add(self, name: str, value: float = 1) -> None:
+        """Increase counter"""
+        with self._lock:
+            self.counters[name] += value
+
+    def queue_depth(self, name: str, depth: int) -> None:
+        """Current number of items waiting in queue"""
+        with self._lock:
+            queue: Dict[str, int] = self.queues.setdefault(name, dict(last=0, max=0))
+            queue['last'] = depth
+            queue['max'] = max(queue['max'], depth)
+
+    def request(self, request: RequestMetrics) -> None:
+        """Finished http request"""
+        with self._lock:
+            self.requests.append(request)
+
+    def dead_letter(self, url: str, reason: str) -> None:
+        """Url given up (after retrying when it was worth it)"""
+        with self._lock:
+            self.dead_letters.append(dict(url=url, reason=reason))
+
+    def _hosts(self) -> Dict[str, Dict[str, Any]]:
+        """Requests summary per host"""
+        by_host: Dict[str, List[RequestMetrics]] = defaultdict(list)
+        for request in self.requests:
+            by_host[request.host].append(request)
+        return {host: dict(requests=len(requests),
+                           errors=sum(1 for r in requests if r.status is None or r.status >= 400),
+                           bytes=sum(r.bytes for r in requests),
+                           **{step: _summary([getattr(r, step) for r in requests])
+                              for step in ('total', 'dns', 'connect', 'ttfb', 'download')})
+                for host, requests in by_host.items()}
+
+    def report(self) -> Dict[str, Any]:
+        """Everything measured, as a json serializable dict"""
+        with self._lock:
+            stages: Dict[str, Dict[str, Any]] = {name: dict(stage) for name, stage in self.stages.items()}
+            for name, stage in stages.items():
+                rows: Optional[float] = self.counters.get(f'{name}.rows')
+                if rows is not None and stage['seconds']:
+                    stage['rows_per_second'] = rows / stage['seconds']
+            return dict(started=self.started.isoformat(),
+                        seconds=time.perf_counter() - self._start,
+                        peak_memory_bytes=peak_memory(),
+                        stages=stages,
+                        timings={name: _summary(values) for name, values in self.timings.items()},
+                        counters=dict(self.counters),
+                        queues={name: dict(queue) for name, queue in self.queues.items()},
+                        hosts=self._hosts(),
+                        requests=[r.as_dict() for r in self.requests],
+                        dead_letters=[dict(letter) for letter in self.dead_letters])
+
+    def save(self, path: str) -> None:
+        """Write the report as json"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=1)
+
+    def save_prometheus(self, path: str) -> None:
+        """Write the report (without single requests) as a prometheus text file (node exporter textfile format)"""
+        report: Dict[str, Any] = self.report()
+        lines: List[str] = [f'news_run_seconds {report["seconds"]}']
+        if report['peak_memory_bytes'] is not None:
+            lines.append(f'news_run_peak_memory_bytes {report["peak_memory_bytes"]}')
+        for name, stage in report['stages'].items():
+            lines.append(f'news_stage_seconds{{stage="{name}"}} {stage["seconds"]}')
+            if stage['peak_memory_bytes'] is not None:
+                lines.append(f'news_stage_peak_memory_bytes{{stage="{name}"}} {stage["peak_memory_bytes"]}')
+            if 'rows_per_second' in stage:
+                lines.append(f'news_stage_rows_per_second{{stage="{name}"}} {stage["rows_per_second"]}')
+        for name, timing in report['timings'].items():
+            lines.append(f'news_step_seconds_total{{step="{name}"}} {timing["total"]}')
+            lines.append(f'news_step_count{{step="{name}"}} {timing["count"]}')
+        for name, value in report['counters'].items():
+            lines.append(f'news_{_metric_name(name)}_total {value}')
+        for name, queue in report['queues'].items():
+            lines.append(f'news_queue_depth_max{{queue="{name}"}} {queue["max"]}')
+        lines.append(f'news_dead_letters_total {len(report["dead_letters"])}')
+        for host, summary in report['hosts'].items():
+            lines.append(f'news_host_requests_total{{host="{host}"}} {summary["requests"]}')
+            lines.append(f'news_host_errors_total{{host="{host}"}} {summary["errors"]}')
+            lines.append(f'news_host_bytes_total{{host="{host}"}} {summary["bytes"]}')
+            for quantile in ('p50', 'p95'):
+                if quantile in summary['total']:
+                    lines.append(f'news_host_request_seconds{{host="{host}",quantile="0.{quantile[1:]}"}} '
+                                 f'{summary["total"][quantile]}')
+        # write to a temporary file first, collectors could read it at any time
+        with open(f'{path}.tmp', 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(f'{path}.tmp', path)
+
+
+# metrics of the current run
+metrics = RunMetrics()
+
+
+def save_report(output_folder: str, folder: str = 'reports', prometheus: bool = False) -> str:
+    """
+    Save current run metrics as [output_folder]/[folder]/run_[start timestamp].json and return its path
+
+    prometheus: also write [output_folder]/[folder]/metrics.prom (replaced on every run)
+    """
+    reports_folder: str = os.path.join(output_folder, folder)
+    os.makedirs(reports_folder, exist_ok=True)
+    path: str = os.path.join(reports_folder, f'run_{metrics.started.strftime("%Y%m%d_%H%M%S")}.json')
+    metrics.save(path)
+    if prometheus:
+        metrics.save_prometheus(os.path.join(reports_folder, 'metrics.prom'))
+    return path
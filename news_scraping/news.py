@@ -1,10 +1,24 @@
 """Simple notice object"""
+from __future__ import annotations      # pandas hints without importing it
 
-from dataclasses import dataclass, field
-from typing import Dict, List, Union
-import pandas as pd
+from dataclasses import dataclass, field, fields
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Tuple, Union, TYPE_CHECKING
 
+if TYPE_CHECKING:
+    import pandas as pd
 
+
+def _add_slots(cls: Any) -> Any:
+    """Recreate a dataclass with __slots__ instead of a __dict__ per instance (slots=True needs python 3.10)"""
+    attrs: Dict[str, Any] = dict(cls.__dict__)
+    attrs['__slots__'] = tuple(f.name for f in fields(cls))
+    for name in ('__dict__', '__weakref__', *attrs['__slots__']):
+        attrs.pop(name, None)
+    return type(cls)(cls.__name__, cls.__bases__, attrs)
+
+
+@_add_slots
 @dataclass
 class News:
     """Simple structure to store news from a site"""
@@ -12,7 +26,7 @@ class News:
     summary: str
     body: str
     url: str
-    date: str = field(default_factory=str)
+    date: Union[str, datetime] = field(default_factory=str)
     site: str = field(default_factory=str)
     host: str = field(default_factory=str)
     uid: str = field(default_factory=str)
@@ -20,21 +34,74 @@ class News:
     n_tokens_body: int = field(default_factory=int)
 
 
+# News attributes, in constructor order
+NEWS_FIELDS: Tuple[str, ...] = tuple(f.name for f in fields(News))
+
+
 class NewsList:
-    """Provide methods to interact with News"""
-    def __init__(self):
+    """
+    Provide methods to interact with News
+
+    A columnar list keeps one list per attribute instead of News objects, it needs less memory
+    and is turned into a dataframe without going through every news again
+    """
+    def __init__(self, columnar: bool = False):
+        self.columnar: bool = columnar
         self._news: List[News] = list()
+        self._columns: Dict[str, List[Any]] = {attr: list() for attr in NEWS_FIELDS} if columnar else dict()
+
+    def __len__(self) -> int:
+        return len(self._columns[NEWS_FIELDS[0]]) if self.columnar else len(self._news)
+
+    def __iter__(self) -> Iterator[News]:
+        if self.columnar:
+            return (News(*values) for values in zip(*self._columns.values()))
+        return iter(self._news)
 
     def get_news(self) -> List[News]:
         """Get news articles"""
-        return self._news
+        return list(self) if self.columnar else self._news
 
     def append(self, article: News) -> None:
         """Add a new article to news"""
-        self._news.append(article)
+        if self.columnar:
+            for attr, column in self._columns.items():
+                column.append(getattr(article, attr))
+        else:
+            self._news.append(article)
+
+    def extend(self, articles: Iterable[News]) -> None:
+        """Add several articles to news"""
+        for article in articles:
+            self.append(article)
 
     def read_from_df(self, df: pd.DataFrame) -> None:
         """Read news from pandas dataframe"""
-        for _, row in df.iterrows():
-            attrs: Dict[str, Union[str, int]] = {attr: row[attr] for attr in News.__annotations__}
-            self.append(News(**attrs))  # type: ignore
+        if self.columnar:
+            for attr, column in _news_columns(df).items():
+                self._columns[attr].extend(column)
+        else:
+            self._news.extend(News(*values) for values in zip(*_news_columns(df).values()))
+
+    def columns(self) -> Dict[str, List[Any]]:
+        """Get news as one list per attribute"""
+        if self.columnar:
+            return self._columns
+        return {attr: [getattr(n, attr) for n in self._news] for attr in NEWS_FIELDS}
+
+    def to_df(self) -> pd.DataFrame:
+        """Get news as a pandas dataframe, one column per attribute"""
+        import pandas as pd
+        return pd.DataFrame(self.columns(), columns=list(NEWS_FIELDS))
+
+
+def _news_columns(df: pd.DataFrame) -> Dict[str, List[Any]]:
+    """Get every News attribute column as a list of python values (one conversion per column, not per row)"""
+    return {attr: df[attr].tolist() for attr in NEWS_FIELDS}
+
+
+def iter_records(df: pd.DataFrame) -> Iterator[Dict[str, Any]]:
+    """News attributes of every row in dataframe as dicts, without creating News objects"""
+    columns: Dict[str, List[Any]] = _news_columns(df)
+    names: List[str] = list(columns)
+    return (dict(zip(names, values)) for values in zip(*columns.values()))
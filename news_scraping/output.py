@@ -1,13 +1,17 @@
 """methods to save results"""
+from __future__ import annotations      # pandas hints without importing it
 
 import os
 import datetime
 import logging
-import pandas as pd
 from pathvalidate import sanitize_filepath
 
-from typing import List, Union, Dict
-from news_scraping.news import News
+from typing import List, Union, Dict, TYPE_CHECKING
+from news_scraping.news import News, NewsList
+from news_scraping.formats import NewsFormat, get_format
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 logger = logging.getLogger(__name__)
 
@@ -54,6 +58,7 @@ def read_news_from_txt(txt_file) -> pd.DataFrame:
     second line: summary
     third line: body
     """
+    import pandas as pd
     attrs: List[str] = [attr for attr in News.__annotations__]
     data: Dict[str, List[str]] = {attr: [] for attr in attrs}
 
@@ -63,22 +68,37 @@ def read_news_from_txt(txt_file) -> pd.DataFrame:
     return pd.DataFrame(data)
 
 
-def save_news_to_csv(news: List[News], output_folder: str, file_name: str = '_consolidated_news.csv') -> None:
+def save_news_to_csv(news: Union[NewsList, List[News]], output_folder: str, file_name: str = '_consolidated_news.csv') -> None:
     """Save results to one, unique, csv file_name.csv"""
     output_file_name: str = format_output_name(output_folder=output_folder, title=file_name)
     logger.info(f'Saving results to: {output_file_name}')
-    # Create a column per attribute (not special)
-    cols: List[str] = [attr for attr in News.__annotations__]
-    data_dict: Dict[str, List[str]] = {col: [] for col in cols}
-    for n in news:
-        for col in cols:
-            data_dict[col].append(getattr(n, col))
-    data_df = pd.DataFrame(data_dict)
-    data_df.to_csv(output_file_name, index=False)
+    # a column per attribute, columnar lists already have them
+    if not isinstance(news, NewsList):
+        news_list = NewsList(columnar=True)
+        news_list.extend(news)
+        news = news_list
+    news.to_df().to_csv(output_file_name, index=False)
+
+
+def save_news(news: NewsList, output_folder: str, file_format: str = 'csv', file_name: str = '_consolidated_news') -> None:
+    """
+    Save results to one, unique, file_name file in file_format (see formats)
+
+    Files of earlier runs (in the same day folder) are kept, a numbered file is written instead
+    """
+    news_format: NewsFormat = get_format(file_format)
+    output_file_name: str = format_output_name(output_folder=output_folder, title=f'{file_name}{news_format.suffix}')
+    run: int = 1
+    while os.path.exists(output_file_name):
+        output_file_name = format_output_name(output_folder, f'{file_name}{news_format.suffix}', run)
+        run += 1
+    logger.info(f'Saving results to: {output_file_name}')
+    news_format.write(news.to_df(), output_file_name)
 
 
 def read_news_from_csv(csv_file: str) -> pd.DataFrame:
     """Read data from csv file and return a dataframe"""
+    import pandas as pd
     logger.info(f'Reading data from: {csv_file}')
     return pd.read_csv(csv_file)
 
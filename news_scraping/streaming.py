@@ -0,0 +1,181 @@
+"""
+---
+Streaming pipeline
+---
+
+Every news goes through transform and load as soon as it is parsed, instead of waiting for the whole
+extract to finish. Stages are connected by bounded queues, so a slow stage slows down the previous
+ones (backpressure) instead of piling up data in memory
+"""
+from __future__ import annotations      # generic queue hints
+
+import asyncio
+import dataclasses
+import datetime
+import functools
+import logging
+import os
+
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple, Any
+
+import news_scraping.extract.main as extract
+from news_scraping.news import News, NewsList
+from news_scraping.common import Site
+from news_scraping.output import create_output_folder_from_site, save_news
+from news_scraping.transform.cleaning import host_from_url, uid_from_url
+from news_scraping.transform.enrichment import count_tokens
+from news_scraping.transform.dedup import NearDuplicateIndex, NEAR_DUPLICATES_NAME
+from news_scraping.load.db.article import DataBaseConnection
+from news_scraping.load.main import load_news, LoadCount
+from news_scraping.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+SiteNews = Tuple[str, News]
+
+
+class StreamPipeline:
+    """
+    extract -> parsed queue -> transform -> transformed queue -> load (in batches)
+
+    Needs to be created inside a running event loop
+    """
+    def __init__(self, output_folder: str, queue_size: int = 100, batch_size: int = 50,
+                 flush_interval: float = 1.0, save_csv: bool = False, database: Optional[Dict[str, Any]] = None,
+                 file_format: str = 'csv', near_duplicates: Optional[Dict[str, Any]] = None):
+        """
+        queue_size: news waiting between two stages
+        batch_size: news loaded into the database in a single transaction
+        flush_interval: seconds without new news before loading an incomplete batch
+        save_csv: also save the extracted news in file_format (as extract does)
+        database: DataBaseConnection options (sqlite pragmas), as in load
+        near_duplicates: NearDuplicateIndex options and drop, as in transform (the same index is used)
+        """
+        self.output_folder: str = output_folder
+        self.batch_size: int = batch_size
+        self.flush_interval: float = flush_interval
+        self.save_csv: bool = save_csv
+        self.file_format: str = file_format
+        self.parsed: asyncio.Queue[Optional[SiteNews]] = asyncio.Queue(queue_size)
+        self.transformed: asyncio.Queue[Optional[News]] = asyncio.Queue(queue_size)
+        self.date: datetime.datetime = datetime.datetime.combine(datetime.date.today(), datetime.time())
+        self.conn = DataBaseConnection(output_folder, **(database or dict()))
+        self.conn.create_all()
+        self.loaded: int = 0
+        self.skipped: int = 0
+        self._titles: Set[str] = set()
+        self.index: Optional[NearDuplicateIndex] = None
+        self.drop_duplicates: bool = False
+        if near_duplicates is not None:
+            index_options: Dict[str, Any] = dict(near_duplicates)
+            self.drop_duplicates = index_options.pop('drop', False)
+            self.index = NearDuplicateIndex(os.path.join(output_folder, NEAR_DUPLICATES_NAME), **index_options)
+        self._extracted: Dict[str, NewsList] = defaultdict(functools.partial(NewsList, columnar=True))
+
+    async def put(self, site_name: str, news: News) -> None:
+        """Receive a parsed news, wait if transform is behind"""
+        await self.parsed.put((site_name, news))
+        metrics.queue_depth('stream.parsed', self.parsed.qsize())
+
+    def clean(self, site_name: str, news: News) -> Optional[News]:
+        """Same as transform cleaning (and near duplicates) for a single news, None if it has to be dropped"""
+        if not news.title or news.title in self._titles:
+            logger.info(f'Missing or duplicated title, ignore: {news.url}')
+            return None
+        self._titles.add(news.title)
+        uid: str = uid_from_url(news.url)
+        if self.index is not None:
+            duplicate_of: str = self.index.add(uid, news.body)
+            if duplicate_of:
+                metrics.add('stream.near_duplicates')
+                logger.info(f'Near duplicate of {duplicate_of}{", ignore" if self.drop_duplicates else ""}: {news.url}')
+                if self.drop_duplicates:
+                    return None
+        return dataclasses.replace(news, site=site_name, date=self.date, host=host_from_url(news.url), uid=uid)
+
+    @staticmethod
+    def enrich(news: News) -> News:
+        """Same as transform enrichment for a single news"""
+        news.n_tokens_title = count_tokens(news.title)
+        news.n_tokens_body = count_tokens(news.body)
+        return news
+
+    async def _transform(self) -> None:
+        """Clean and tokenize every parsed news"""
+        loop = asyncio.get_running_loop()
+        while True:
+            item: Optional[SiteNews] = await self.parsed.get()
+            if item is None:
+                await self.transformed.put(None)
+                return
+            site_name, news = item
+            if self.save_csv:
+                self._extracted[site_name].append(news)
+            cleaned: Optional[News] = self.clean(site_name, news)
+            if cleaned is not None:
+                # tokenization is the expensive part, keep the loop free meanwhile
+                with metrics.timer('stream.transform'):
+                    enriched: News = await loop.run_in_executor(None, self.enrich, cleaned)
+                await self.transformed.put(enriched)
+                metrics.queue_depth('stream.transformed', self.transformed.qsize())
+
+    async def _load(self) -> None:
+        """
+        Load transformed news in batch_size batches, an incomplete batch is loaded at the end of the stream
+        or when no news arrives for flush_interval seconds
+        """
+        loop = asyncio.get_running_loop()
+        batch: List[News] = list()
+        finished: bool = False
+        while not finished:
+            idle: bool = False
+            try:
+                item: Optional[News] = await asyncio.wait_for(self.transformed.get(), self.flush_interval)
+                if item is None:
+                    finished = True
+                else:
+                    batch.append(item)
+            except asyncio.TimeoutError:
+                idle = True
+            if batch and (finished or idle or len(batch) >= self.batch_size):
+                count: LoadCount = await loop.run_in_executor(None, load_news, self.conn, batch, self.batch_size)
+                self.loaded += count.inserted
+                self.skipped += count.skipped
+                logger.info(f'Loaded {self.loaded} news into: {self.conn.database_path} ({self.skipped} skipped)')
+                batch = list()
+
+    async def _extract(self, sites: Dict[str, Site], extract_options: Dict[str, Any]) -> None:
+        """Run extract sending the news to the pipeline, mark the end of the stream when done"""
+        try:
+            await extract.run(sites, self.output_folder, sink=self.put, **extract_options)
+        finally:
+            await self.parsed.put(None)
+
+    async def run(self, sites: Dict[str, Site], **extract_options: Any) -> None:
+        """Run all the stages at the same time, if one fails the others are cancelled"""
+        tasks = [asyncio.create_task(self._extract(sites, extract_options)),
+                 asyncio.create_task(self._transform()),
+                 asyncio.create_task(self._load())]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        # only index news once they are loaded
+        if self.index is not None:
+            self.index.save()
+        for site_name, site_news in self._extracted.items():
+            save_news(site_news, create_output_folder_from_site(self.output_folder, site_name), self.file_format)
+
+
+async def run(sites: Dict[str, Site], output_folder: str, queue_size: int = 100, batch_size: int = 50,
+              flush_interval: float = 1.0, save_csv: bool = False, database: Optional[Dict[str, Any]] = None,
+              file_format: Optional[str] = None, near_duplicates: Optional[Dict[str, Any]] = None,
+              **extract_options: Any) -> None:
+    """Extract, transform and load the news for today, every news as soon as it is parsed"""
+    pipeline = StreamPipeline(output_folder, queue_size, batch_size, flush_interval, save_csv, database,
+                              file_format or 'csv', near_duplicates)
+    await pipeline.run(sites, **extract_options)
+    logger.info(f'Finished streaming, loaded {pipeline.loaded} news')
@@ -1,32 +1,72 @@
 """Functions to clean data from news dataframe"""
+from __future__ import annotations      # pandas hints without importing it
 
 import hashlib
 import logging
-import pandas as pd
 from urllib.parse import urlparse
-from typing import List, Optional
+from typing import List, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 logger = logging.getLogger(__name__)
 
+# scheme (anything before the first '/', '?' or '#') and '//netloc': the part of a url urlparse needs to find its host
+HOST_PREFIX = r'^([^/?#]*(?://[^/?#]*)?)'
+
+
+def host_from_url(url: str) -> str:
+    """Get host from a single url"""
+    return str(urlparse(url).netloc)
+
 
 def get_host(url_col: pd.Series) -> pd.Series:
-    """Get host from url col"""
+    """Get host from url col, urlparse runs once per different scheme and host ('' for missing urls)"""
+    import numpy as np
+    import pandas as pd
     logger.info('Getting host name')
-    return url_col.apply(lambda url: urlparse(url).netloc)
+    # empty files are read back without a string column
+    prefixes: pd.Series = url_col.astype(object).str.extract(HOST_PREFIX, expand=False)
+    codes, uniques = pd.factorize(prefixes)
+    # missing urls have code -1, the last host
+    hosts: np.ndarray = np.array([host_from_url(prefix) for prefix in uniques] + [''], dtype=object)
+    return pd.Series(hosts[codes], index=url_col.index, dtype=object)
 
 
 def sanity_check(news_df: pd.DataFrame, subset: Optional[List[str]] = None) -> pd.DataFrame:
-    """Handle missing and duplicated titles on subset if provided"""
+    """Handle missing and duplicated titles on subset if provided, the rows kept are numbered again from 0"""
+    import numpy as np
+    import pandas as pd
     logger.info('Performing sanity check')
-    news_df = news_df.drop_duplicates(subset=subset).reset_index()
-    news_df = news_df.dropna(subset=subset)
+    columns: pd.DataFrame = news_df[subset] if subset is not None else news_df
+    keep: np.ndarray = (~news_df.duplicated(subset=subset) & columns.notna().all(axis=1)).to_numpy()
+    news_df = news_df.take(np.flatnonzero(keep))
+    news_df.index = pd.RangeIndex(len(news_df))
     return news_df
 
 
+def uid_from_url(item: object) -> str:
+    """Hash a single value using hashlib, uid of the article with that url"""
+    return hashlib.md5(bytes(str(item).encode())).hexdigest()
+
+
 def hash_uid(column: pd.Series) -> pd.Series:
-    """Hash column using hashlib"""
+    """Hash column using hashlib, same uids as uid_from_url"""
+    import pandas as pd
     logger.info('Creating hash uid')
-    uid: pd.Series = (column
-                      .apply(lambda item: hashlib.md5(bytes(str(item).encode())))
-                      .apply(lambda hash_object: hash_object.hexdigest()))
-    return uid
+    md5 = hashlib.md5
+    uids: List[str] = [md5(item.encode() if isinstance(item, str) else str(item).encode()).hexdigest()
+                       for item in column.tolist()]
+    return pd.Series(uids, index=column.index, dtype=object)
+
+
+def clean_news(news_df: pd.DataFrame, subset: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Remove missing and duplicated news (see sanity_check) and add their host and uid (from url)
+
+    Rows are removed first, so hosts and uids are only computed for the news kept
+    """
+    news_df = sanity_check(news_df, subset=subset)
+    news_df['host'] = get_host(url_col=news_df['url'])
+    news_df['uid'] = hash_uid(column=news_df['url'])
+    return news_df
@@ -0,0 +1,178 @@
+"""
+Near duplicate detection: the same story published under different urls (or slightly edited)
+
+Every body is split in word shingles summarized by a MinHash signature. Signatures are split in
+bands and indexed by band (LSH), so a news is only compared with the news sharing at least one band
+with it, instead of all of them. The index is kept on disk and used by every transform run
+"""
+from __future__ import annotations      # pandas hints without importing it
+
+import os
+import re
+import zlib
+import logging
+
+import numpy as np
+
+from typing import Dict, List, Optional, Set, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# index file, in the output folder
+NEAR_DUPLICATES_NAME = 'near_duplicates.npz'
+WORDS = re.compile(r'\w+')
+# permutations: (a * hash + b) mod prime, hashes and coefficients have 32 bits so there is no overflow
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+MAX_HASH = 1 << 32
+FNV_PRIME = np.uint64(1099511628211)
+
+
+def shingles(text: object, size: int = 5) -> Set[int]:
+    """32 bits hashes of every 'size' consecutive words in text, empty for missing texts"""
+    if not isinstance(text, str):
+        return set()
+    words: List[str] = WORDS.findall(text.lower())
+    return {zlib.crc32(' '.join(words[i:i + size]).encode()) for i in range(max(len(words) - size + 1, 1))} if words else set()
+
+
+class MinHasher:
+    """MinHash signatures, the same seed and num_perm always give the same permutations"""
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        random_state = np.random.RandomState(seed)
+        self.a: np.ndarray = random_state.randint(1, MAX_HASH, num_perm, dtype=np.uint64)
+        self.b: np.ndarray = random_state.randint(0, MAX_HASH, num_perm, dtype=np.uint64)
+
+    def signature(self, hashes: Set[int]) -> np.ndarray:
+        """Minimum of every permutation of the hashes (32 bits each)"""
+        values: np.ndarray = np.fromiter(hashes, dtype=np.uint64, count=len(hashes))
+        permuted: np.ndarray = (np.outer(values, self.a) + self.b) % MERSENNE_PRIME
+        signature: np.ndarray = (permuted.min(axis=0) & np.uint64(MAX_HASH - 1)).astype(np.uint32)
+        return signature
+
+
+class NearDuplicateIndex:
+    """
+    LSH index of MinHash signatures, stored as a compressed numpy file
+
+    Only the first news of every group of near duplicates is indexed, the rest point to it.
+    Estimated similarity (share of equal signature values) >= threshold makes two news near duplicates
+    """
+    def __init__(self, path: str, threshold: float = 0.8, num_perm: int = 64, bands: int = 16,
+                 shingle_size: int = 5, seed: int = 1):
+        """Load index from path, empty if it does not exist (or was built with other settings)"""
+        if num_perm % bands:
+            raise ValueError(f'num_perm ({num_perm}) must be a multiple of bands ({bands})')
+        self.path: str = path
+        self.threshold: float = threshold
+        self.bands: int = bands
+        self.rows: int = num_perm // bands
+        self.shingle_size: int = shingle_size
+        self.settings: np.ndarray = np.array([num_perm, bands, shingle_size, seed])
+        self._hasher = MinHasher(num_perm, seed)
+        self._uids: List[str] = list()
+        self._signatures: np.ndarray = np.empty((0, num_perm), dtype=np.uint32)
+        # stored news: band keys sorted (for binary search) and the row of each key
+        self._sorted_keys: np.ndarray = np.empty((bands, 0), dtype=np.uint64)
+        self._sorted_rows: np.ndarray = np.empty((bands, 0), dtype=np.int64)
+        # news indexed since loaded
+        self._new_uids: List[str] = list()
+        self._new_signatures: List[np.ndarray] = list()
+        self._new_buckets: List[Dict[int, int]] = [dict() for _ in range(bands)]
+        self._rows: Dict[str, int] = dict()
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._uids) + len(self._new_uids)
+
+    def _load(self) -> None:
+        if not os.path.isfile(self.path):
+            return
+        with np.load(self.path, allow_pickle=False) as data:
+            if not np.array_equal(data['settings'], self.settings):
+                logger.warning(f'Near duplicates index built with other settings, starting a new one: {self.path}')
+                return
+            self._uids = data['uids'].tolist()
+            self._signatures = data['signatures']
+        self._rows = {uid: row for row, uid in enumerate(self._uids)}
+        self._sort_keys()
+
+    def _sort_keys(self) -> None:
+        """Sort stored band keys, keeping the first row of equal keys first"""
+        keys: np.ndarray = self._band_keys(self._signatures).T
+        order: np.ndarray = np.argsort(keys, axis=1, kind='stable')
+        self._sorted_keys = np.take_along_axis(keys, order, axis=1)
+        self._sorted_rows = order
+
+    def _band_keys(self, signatures: np.ndarray) -> np.ndarray:
+        """Hash (FNV) the values of every band of signatures: (news, num_perm) -> (news, bands)"""
+        values: np.ndarray = signatures.reshape(len(signatures), self.bands, self.rows).astype(np.uint64)
+        keys: np.ndarray = np.zeros((len(signatures), self.bands), dtype=np.uint64)
+        for row in range(self.rows):
+            keys = (keys * FNV_PRIME) ^ values[:, :, row]
+        return keys
+
+    def _signature_at(self, row: int) -> np.ndarray:
+        return self._signatures[row] if row < len(self._uids) else self._new_signatures[row - len(self._uids)]
+
+    def _uid_at(self, row: int) -> str:
+        return self._uids[row] if row < len(self._uids) else self._new_uids[row - len(self._uids)]
+
+    def _candidates(self, keys: np.ndarray) -> Set[int]:
+        """Rows sharing at least a band with keys"""
+        rows: Set[int] = set()
+        for band, key in enumerate(keys):
+            sorted_keys: np.ndarray = self._sorted_keys[band]
+            position: int = int(np.searchsorted(sorted_keys, key))
+            if position < len(sorted_keys) and sorted_keys[position] == key:
+                rows.add(int(self._sorted_rows[band][position]))
+            new_row: Optional[int] = self._new_buckets[band].get(int(key))
+            if new_row is not None:
+                rows.add(new_row)
+        return rows
+
+    def add(self, uid: str, text: object) -> str:
+        """Index a news, return the uid of an indexed near duplicate ('' if there is none)"""
+        if uid in self._rows:
+            # already indexed, e.g. transformed again
+            return ''
+        hashes: Set[int] = shingles(text, self.shingle_size)
+        if not hashes:
+            return ''
+        signature: np.ndarray = self._hasher.signature(hashes)
+        keys: np.ndarray = self._band_keys(signature[np.newaxis])[0]
+        best: Tuple[float, int] = max(((float(np.mean(self._signature_at(row) == signature)), row)
+                                       for row in self._candidates(keys)), default=(0.0, -1))
+        if best[0] >= self.threshold:
+            return self._uid_at(best[1])
+        row: int = len(self)
+        self._new_uids.append(uid)
+        self._new_signatures.append(signature)
+        for band, key in enumerate(keys):
+            self._new_buckets[band].setdefault(int(key), row)
+        self._rows[uid] = row
+        return ''
+
+    def save(self) -> None:
+        """Write index to disk, including the news indexed since loaded"""
+        if self._new_uids:
+            self._uids += self._new_uids
+            self._signatures = np.vstack([self._signatures, *self._new_signatures])
+            self._new_uids, self._new_signatures = list(), list()
+            self._new_buckets = [dict() for _ in range(self.bands)]
+            self._sort_keys()
+        with open(f'{self.path}.tmp', 'wb') as f:
+            np.savez_compressed(f, settings=self.settings, uids=np.array(self._uids, dtype=str),
+                                signatures=self._signatures)
+        os.replace(f'{self.path}.tmp', self.path)
+        logger.info(f'Saved {len(self)} news into near duplicates index: {self.path}')
+
+
+def find_near_duplicates(index: NearDuplicateIndex, uids: pd.Series, texts: pd.Series) -> pd.Series:
+    """uid of an earlier near duplicate of every news ('' if there is none), news are added to index"""
+    import pandas as pd
+    logger.info('Looking for near duplicates')
+    duplicate_of: List[str] = [index.add(uid, text) for uid, text in zip(uids.tolist(), texts.tolist())]
+    return pd.Series(duplicate_of, index=uids.index, dtype=object)
@@ -1,28 +1,99 @@
-"""Add data to news dataframe"""
-import pandas as pd
-from nltk.corpus import stopwords
-import nltk
+"""
+Add data to news dataframe
+
+nltk resources are looked up the first time they are needed (nothing is downloaded), if they are
+not available the bundled stopwords list and a tokenizer without sentence splitting are used
+"""
+from __future__ import annotations      # pandas hints without importing it
+
+import os
+import functools
 import logging
 
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Callable, FrozenSet, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
+
 logger = logging.getLogger(__name__)
 
-# Download data needed for nltk analysis
-nltk.download('punkt')
-nltk.download('stopwords')
+# Same words as nltk 'stopwords' corpus (snowball list)
+BUNDLED_STOPWORDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', '{language}_stopwords.txt')
+NLTK_RESOURCES = ('punkt', 'punkt_tab', 'stopwords')
+
+
+def use_nltk_data(data_dir: str) -> None:
+    """Look for nltk resources in data_dir first (also in worker processes started later)"""
+    import nltk
+    if data_dir not in nltk.data.path:
+        nltk.data.path.insert(0, data_dir)
+    os.environ['NLTK_DATA'] = os.pathsep.join(filter(None, (data_dir, os.environ.get('NLTK_DATA'))))
+    get_stopwords.cache_clear()
+    get_tokenizer.cache_clear()
+
+
+def download_nltk_data(data_dir: Optional[str] = None) -> None:
+    """Download the nltk resources used for enrichment, meant to be run once when setting up a node"""
+    import nltk
+    for resource in NLTK_RESOURCES:
+        nltk.download(resource, download_dir=data_dir)
+
+
+@functools.lru_cache(maxsize=None)
+def get_stopwords(language: str = 'spanish') -> FrozenSet[str]:
+    """Get stopwords from nltk data, or the bundled list if they are not available"""
+    from nltk.corpus import stopwords
+    try:
+        return frozenset(stopwords.words(language))
+    except LookupError:
+        logger.warning(f'nltk stopwords not available, using bundled {language} list')
+    with open(BUNDLED_STOPWORDS.format(language=language), 'r', encoding='utf-8') as f:
+        return frozenset(line.strip() for line in f if line.strip())
+
+
+@functools.lru_cache(maxsize=None)
+def get_tokenizer() -> Callable[[str], List[str]]:
+    """Get nltk word tokenizer, without sentence splitting if punkt is not available"""
+    import nltk
+    try:
+        nltk.word_tokenize('Prueba.')
+        return nltk.word_tokenize     # type: ignore
+    except LookupError:
+        logger.warning('nltk punkt not available, tokenizing without sentence splitting')
+        return functools.partial(nltk.word_tokenize, preserve_line=True)
+
+
+def count_tokens(text: str) -> int:
+    """Number of alphabetic, not stopword, tokens in text"""
+    stopwords: FrozenSet[str] = get_stopwords()
+    return sum(1 for token in get_tokenizer()(text)
+               if token.isalpha() and token.lower() not in stopwords)
+
+
+def count_tokens_batch(texts: List[str]) -> List[int]:
+    """count_tokens for every text, a whole chunk is sent to a worker process at once"""
+    return [count_tokens(text) for text in texts]
 
-SPANISH_STOPWORDS = set(stopwords.words('spanish'))
 
+def tokenize_column(news_df: pd.DataFrame, column_name: str, workers: int = 1, chunk_size: int = 500) -> pd.Series:
+    """
+    Tokenize column using natural language toolkit, return the number of valid tokens per row
 
-def tokenize_column(news_df: pd.DataFrame, column_name: str) -> pd.Series:
-    """Tokenize column using natural language toolkit"""
+    Texts are split in chunks of chunk_size processed by 'workers' processes (if more than one)
+    """
+    import pandas as pd
     try:
-        s: pd.Series = (news_df
-                        .dropna()
-                        .apply(lambda row: nltk.word_tokenize(row[column_name]), axis=1)
-                        .apply(lambda tokens: list(filter(lambda token: token.isalpha(), tokens)))
-                        .apply(lambda tokens: list(map(lambda token: token.lower(), tokens)))  # type: ignore
-                        .apply(lambda word_list: list(filter(lambda word: word not in SPANISH_STOPWORDS, word_list)))
-                        .apply(lambda valid_word_list: len(valid_word_list)))
+        valid_df: pd.DataFrame = news_df.dropna()
+        texts: List[str] = valid_df[column_name].tolist()
+        counts: List[int]
+        if workers > 1 and len(texts) > chunk_size:
+            chunks: List[List[str]] = [texts[i:i + chunk_size] for i in range(0, len(texts), chunk_size)]
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                counts = [count for chunk_counts in pool.map(count_tokens_batch, chunks) for count in chunk_counts]
+        else:
+            counts = count_tokens_batch(texts)
+        s: pd.Series = pd.Series(counts, index=valid_df.index, dtype='int64')
     except Exception as e:
         logger.error(e)
         s = pd.Series(len(news_df))
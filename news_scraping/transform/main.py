@@ -2,30 +2,95 @@
 Transform data to have more information regarding the news
 """
 
+import os
 import argparse
 import logging
 import pandas as pd
 
-from news_scraping.transform.utils import read_news_from_directory
-from news_scraping.transform.cleaning import get_host, sanity_check, hash_uid
-from news_scraping.transform.enrichment import tokenize_column
-from news_scraping.output import save_data_to_pickle
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from news_scraping.transform.utils import read_news_from_directory, find_news_files
+from news_scraping.transform.manifest import Manifest
+from news_scraping.transform.cleaning import clean_news
+from news_scraping.transform.enrichment import tokenize_column, use_nltk_data, download_nltk_data
+from news_scraping.transform.dedup import NearDuplicateIndex, find_near_duplicates, NEAR_DUPLICATES_NAME
+from news_scraping.formats import NewsFormat, get_format, save_partitions, FORMATS, PARTITIONS_FOLDER
+from news_scraping.metrics import metrics
 
 logging.basicConfig(level=logging.INFO)
 
 logger = logging.getLogger(__name__)
 
+MANIFEST_NAME = 'transform_manifest.json'
+# columns of extract files used, the rest are computed here
+EXTRACT_COLUMNS = ['title', 'summary', 'body', 'url']
+
+
+def run(input_path: str, incremental: bool = True, workers: int = 1, chunk_size: int = 500,
+        nltk_data: Optional[str] = None, file_format: Optional[str] = None,
+        near_duplicates: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Perform Data wrangling and enrichment
 
-def run(input_path: str) -> None:
-    """Perform Data wrangling and enrichment"""
-    news_df: pd.DataFrame = read_news_from_directory(input_path, suffix='.csv')
+    Only the extract files not processed yet (or changed) are read unless incremental is False,
+    results are saved as new partitions: [input_path]/transform/site=[site]/date=[date]/transform_[timestamp][suffix]
+    workers, chunk_size: processes used for tokenization and news sent to them at once
+    nltk_data: folder with nltk resources (checked before nltk default folders)
+    file_format: format of extract files and partitions (see formats), csv files and pickle partitions if not provided
+    near_duplicates: options for NearDuplicateIndex (threshold, num_perm, bands, shingle_size) and drop: remove
+                     near duplicates of earlier news instead of keeping them with their uid in 'duplicate_of'
+                     (loaded into the articles table)
+    """
+    input_format: NewsFormat = get_format(file_format or 'csv')
+    output_format: NewsFormat = get_format(file_format or 'pickle')
+    partitions_folder: str = os.path.join(input_path, PARTITIONS_FOLDER)
+    if nltk_data is not None:
+        use_nltk_data(nltk_data)
+    manifest = Manifest(os.path.join(input_path, MANIFEST_NAME))
+    if not incremental:
+        manifest.clear()
+    # partitions could have the same suffix as extract files
+    files: List[str] = manifest.pending([file for file in find_news_files(input_path, suffix=input_format.suffix)
+                                         if not file.startswith(partitions_folder + os.sep)])
+    if not files:
+        logger.info('No new files to transform')
+        return
+    logger.info(f'Transforming {len(files)} new files')
+    with metrics.timer('transform.read'):
+        news_df: pd.DataFrame = read_news_from_directory(input_path, suffix=input_format.suffix, files=files,
+                                                         columns=EXTRACT_COLUMNS)
+    if news_df.empty:
+        # e.g. extract runs without new news
+        logger.info('No news in the new files')
+        manifest.mark(files)
+        manifest.save()
+        return
     # Data wrangling
-    news_df['host'] = get_host(url_col=news_df['url'])
-    news_df['uid'] = hash_uid(column=news_df['url'])
-    news_df = sanity_check(news_df, subset=['title'])
-    news_df['n_tokens_title'] = tokenize_column(news_df, column_name='title')
-    news_df['n_tokens_body'] = tokenize_column(news_df, column_name='body')
-    save_data_to_pickle(news_df, input_path)
+    with metrics.timer('transform.clean'):
+        news_df = clean_news(news_df, subset=['title'])
+    index: Optional[NearDuplicateIndex] = None
+    if near_duplicates is not None:
+        with metrics.timer('transform.near_duplicates'):
+            index_options: Dict[str, Any] = dict(near_duplicates)
+            drop: bool = index_options.pop('drop', False)
+            index = NearDuplicateIndex(os.path.join(input_path, NEAR_DUPLICATES_NAME), **index_options)
+            news_df['duplicate_of'] = find_near_duplicates(index, news_df['uid'], news_df['body'])
+            logger.info(f'Found {(news_df["duplicate_of"] != "").sum()} near duplicates')
+            if drop:
+                news_df = news_df[news_df['duplicate_of'] == ''].drop(columns='duplicate_of')
+    with metrics.timer('transform.tokenize'):
+        news_df['n_tokens_title'] = tokenize_column(news_df, column_name='title', workers=workers, chunk_size=chunk_size)
+        news_df['n_tokens_body'] = tokenize_column(news_df, column_name='body', workers=workers, chunk_size=chunk_size)
+    partition: str = f'transform_{datetime.now().strftime("%Y%m%d_%H%M%S_%f")}'
+    with metrics.timer('transform.save'):
+        save_partitions(news_df, partitions_folder, output_format, name=partition)
+    metrics.add('transform.rows', len(news_df))
+    # only mark files (and index news) once their results are saved
+    if index is not None:
+        index.save()
+    manifest.mark(files)
+    manifest.save()
 
 
 if __name__ == '__main__':
@@ -33,7 +98,15 @@ if __name__ == '__main__':
     args_parser = argparse.ArgumentParser()
     # if no input path provided it will take the path from config
     args_parser.add_argument('--inputs', help='Path to input folder', required=False)
+    args_parser.add_argument('--full', help='transform every file again, not only the new ones', action='store_true')
+    args_parser.add_argument('--workers', help='processes used for tokenization', type=int, default=1)
+    args_parser.add_argument('--nltk_data', help='folder with nltk resources', required=False)
+    args_parser.add_argument('--download_nltk', help='download nltk resources into --nltk_data and exit', action='store_true')
+    args_parser.add_argument('--format', help='format of extract files and partitions', choices=list(FORMATS), required=False)
     args = args_parser.parse_args()
-    input_f: str = args.inputs
-    logger.info(f'Reading inputs from: {input_f}')
-    run(input_f)
+    if args.download_nltk:
+        download_nltk_data(args.nltk_data)
+    else:
+        input_f: str = args.inputs
+        logger.info(f'Reading inputs from: {input_f}')
+        run(input_f, incremental=not args.full, workers=args.workers, nltk_data=args.nltk_data, file_format=args.format)
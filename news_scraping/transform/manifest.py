@@ -0,0 +1,57 @@
+"""Keep track of the input files already transformed"""
+import os
+import json
+import logging
+
+from typing import Dict, List, Iterable
+
+logger = logging.getLogger(__name__)
+
+FileState = Dict[str, float]
+
+
+class Manifest:
+    """
+    Size and modification time of every processed file, stored as json
+
+    Paths are stored relative to the manifest folder, so the output folder can be moved
+    """
+    def __init__(self, path: str):
+        """Load manifest from path, empty if it does not exist"""
+        self.path: str = path
+        self.folder: str = os.path.dirname(os.path.abspath(path))
+        self._files: Dict[str, FileState] = dict()
+        if os.path.isfile(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self._files = json.load(f)
+
+    def _key(self, file: str) -> str:
+        return os.path.relpath(os.path.abspath(file), self.folder).replace(os.sep, '/')
+
+    @staticmethod
+    def _state(file: str) -> FileState:
+        stat = os.stat(file)
+        return dict(size=stat.st_size, mtime=stat.st_mtime)
+
+    def is_processed(self, file: str) -> bool:
+        """Whether file was processed and has not changed since then"""
+        return self._files.get(self._key(file)) == self._state(file)
+
+    def pending(self, files: Iterable[str]) -> List[str]:
+        """Get the files new or changed since they were processed"""
+        return [file for file in files if not self.is_processed(file)]
+
+    def mark(self, files: Iterable[str]) -> None:
+        """Mark files as processed"""
+        for file in files:
+            self._files[self._key(file)] = self._state(file)
+
+    def clear(self) -> None:
+        """Forget every processed file"""
+        self._files = dict()
+
+    def save(self) -> None:
+        """Write manifest to disk"""
+        with open(f'{self.path}.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self._files, f, indent=1, sort_keys=True)
+        os.replace(f'{self.path}.tmp', self.path)
@@ -2,16 +2,19 @@
 
 import pandas as pd
 import os
+import re
+import functools
 
-from typing import List, Dict, Callable, Union
+from typing import List, Dict, Callable, Union, Optional, Iterator, Sequence
 from datetime import datetime
 
-from news_scraping.output import read_news_from_txt, read_news_from_csv
+from news_scraping.output import read_news_from_txt
+from news_scraping.formats import FORMATS, read_files
 
 
 def get_date_time_from_string(path: str, pattern='%d-%m-%Y') -> Union[datetime, None]:
     """Get date time from str"""
-    for candidate in path.split('\\')[::-1]:
+    for candidate in re.split(r'[\\/]', path)[::-1]:
         try:
             date: datetime = datetime.strptime(candidate, pattern)
             return date
@@ -21,31 +24,56 @@ def get_date_time_from_string(path: str, pattern='%d-%m-%Y') -> Union[datetime,
     return None
 
 
-def read_news_from_directory(folder: str, suffix: str = '.csv') -> pd.DataFrame:
+def find_news_files(folder: str, suffix: str = '.csv') -> List[str]:
+    """Get the path of every 'suffix' file in folder"""
+    return [os.path.join(root, file)
+            for root, dirs, files in os.walk(folder)
+            for file in files if file.endswith(suffix)]
+
+
+def iter_news_from_directory(folder: str, suffix: str = '.csv', files: Optional[List[str]] = None,
+                             max_workers: int = 8, columns: Optional[Sequence[str]] = None) -> Iterator[pd.DataFrame]:
     """
-    Read news from 'suffix' files in folder and return a dataframe with all the data
+    Read news from 'suffix' files in folder, one dataframe per file (in files order)
 
     store the directories in folder as new columns in dataframe
+    files: only read these files (from folder), all the 'suffix' files if not provided
+    max_workers: files read at the same time (twice as many are read ahead at most)
+    columns: only read these columns (when available in the file), ignored for txt files
 
     Expecting:
     folder/site_name/date/files
     """
     # map a file type to a function to read data
     suffix_map: Dict[str, Callable[[str], pd.DataFrame]] = {
-        '.csv': read_news_from_csv,
-        '.txt': read_news_from_txt
+        news_format.suffix: functools.partial(news_format.read, columns=columns) for news_format in FORMATS.values()
     }
+    suffix_map['.txt'] = read_news_from_txt
     get_news: Callable[[str], pd.DataFrame] = suffix_map[suffix]
     sites: List[str] = [d for d in os.listdir(folder)
                         if os.path.isdir(os.path.join(folder, d))]
-    # store all the data in a single dataframe
-    news_df = pd.DataFrame()
-    for root, dirs, files in os.walk(folder):
-        for file in files:
-            if file.endswith(suffix):
-                news: pd.DataFrame = get_news(os.path.join(root, file))
-                # add directories as column values
-                news['date'] = get_date_time_from_string(root)
-                news['site'] = [s for s in sites if s in root][0]
-                news_df = news_df.append(news)
-    return news_df
+    if files is None:
+        files = find_news_files(folder, suffix)
+
+    def read_file(file: str) -> pd.DataFrame:
+        root: str = os.path.dirname(file)
+        news: pd.DataFrame = get_news(file)
+        # add directories as column values
+        news['date'] = get_date_time_from_string(root)
+        news['site'] = [s for s in sites if s in root][0]
+        return news
+
+    yield from read_files(read_file, files, max_workers)
+
+
+def read_news_from_directory(folder: str, suffix: str = '.csv', files: Optional[List[str]] = None,
+                             max_workers: int = 8, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """
+    Read news from 'suffix' files in folder and return a dataframe with all the data
+
+    see iter_news_from_directory, all the files are concatenated once at the end
+    """
+    frames: List[pd.DataFrame] = list(iter_news_from_directory(folder, suffix, files, max_workers, columns))
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames)
@@ -5,34 +5,63 @@ import logging
 import asyncio
 
 from typing import Dict
-import news_scraping.extract.main as extract
-import news_scraping.transform.main as transform
-import news_scraping.load.main as load
 
 from news_scraping.common import Config, Site
+from news_scraping.metrics import metrics, save_report
 
 logging.basicConfig(filename="news_pipeline.log", level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def run(config: Config):
-    """Run all the steps"""
+def run(config: Config, stream: bool = False, distributed: bool = False):
+    """
+    Run all the steps, one after the other or (stream) all at the same time
+
+    distributed: extract as coordinator of the workers sharing the work queue
+    """
     sites: Dict[str, Site] = config.sites
     o_folder: str = config.output_folder
+    metrics.reset()
 
-    # Run all the steps
-    asyncio.run(extract.run(sites, output_folder=o_folder))
-    transform.run(o_folder)
-    load.run(o_folder)
-    logger.info('Finished with processing')
+    # stages (and their heavy dependencies) are imported when they run
+    if stream:
+        with metrics.stage('stream'):
+            import news_scraping.streaming as streaming
+            asyncio.run(streaming.run(sites, o_folder, database=config.load_options.get('database'),
+                                      file_format=config.file_format,
+                                      near_duplicates=config.transform_options.get('near_duplicates'),
+                                      **config.stream_options, **config.extract_options))
+    else:
+        # Run all the steps
+        with metrics.stage('extract'):
+            if distributed:
+                import news_scraping.extract.distributed as distributed_extract
+                asyncio.run(distributed_extract.run(sites, o_folder, config.extract_options, config.distributed_options,
+                                                    config.file_format))
+            else:
+                import news_scraping.extract.main as extract
+                asyncio.run(extract.run(sites, output_folder=o_folder, file_format=config.file_format,
+                                        **config.extract_options))
+        with metrics.stage('transform'):
+            import news_scraping.transform.main as transform
+            transform.run(o_folder, file_format=config.file_format, **config.transform_options)
+        with metrics.stage('load'):
+            import news_scraping.load.main as load
+            load.run(o_folder, file_format=config.file_format, **config.load_options)
+    report: str = save_report(o_folder, **config.metrics_options)
+    logger.info(f'Finished with processing, run report: {report}')
 
 
 if __name__ == '__main__':
     # load the configuration file
     args_parser = argparse.ArgumentParser()
     args_parser.add_argument('--config_file', help='path to yaml config', default='config.yaml')
+    args_parser.add_argument('--stream', help='transform and load every news as soon as it is parsed',
+                             action='store_true')
+    args_parser.add_argument('--distributed', help='extract with the workers of the work queue (see distributed config)',
+                             action='store_true')
     args = args_parser.parse_args()
 
     # get the configuration from file
     cfg = Config(args.config_file)
-    run(cfg)
+    run(cfg, stream=args.stream, distributed=args.distributed)
@@ -0,0 +1,37 @@
+import pytest
+
+from news_scraping.extract.backends import get_backend
+
+
+@pytest.fixture
+def page():
+    """utf-8 encoded page with a link, a nested title and a body split in paragraphs"""
+    return ('<html><body><h1 class="title big">Título <b>uno</b></h1><p class="sum">resumen</p>'
+            '<div class="note-text">uno</div><div class="note-text">dos</div>'
+            '<a class="title" href="/news/1">link</a></body></html>').encode('utf-8')
+
+
+@pytest.mark.parametrize('backend_name', ['bs4', 'strainer', 'lxml', 'selectolax'])
+def test_backends_give_same_results(page, backend_name):
+    """Every backend returns the same text and attributes as beautiful soup"""
+    if backend_name == 'lxml':
+        pytest.importorskip('lxml.cssselect')
+    if backend_name == 'selectolax':
+        pytest.importorskip('selectolax.lexbor')
+    document = get_backend(backend_name).parse(page, ['.title ', '.sum ', '.note-text '])
+    titles = document.select('.title ')
+    assert [t.text.strip() for t in titles] == ['Título uno', 'link']
+    assert [t['href'] for t in titles if t.has_attr('href')] == ['/news/1']
+    assert [s.text for s in document.select('.sum ')] == ['resumen']
+    assert [b.text for b in document.select('.note-text ')] == ['uno', 'dos']
+
+
+@pytest.mark.parametrize('markup', [b'', b'  ', b'<!-- nothing -->'])
+def test_lxml_empty_pages(markup):
+    """Pages without elements give an empty document, parsed at once or fed"""
+    pytest.importorskip('lxml.cssselect')
+    backend = get_backend('lxml')
+    assert backend.parse(markup, ['.title']).select('.title') == []
+    feeder = backend.feeder()
+    feeder.feed(markup.decode())
+    assert feeder.close().select('.title') == []
@@ -0,0 +1,17 @@
+from benchmarks.server import SiteOptions, article_page
+from benchmarks.run import compare
+
+
+def test_article_page_is_deterministic():
+    """Same options and index give the same page, with the elements the default queries look for"""
+    options = SiteOptions(paragraphs=3)
+    page = article_page(options, 1)
+    assert page == article_page(options, 1) != article_page(options, 2)
+    assert page.count('class="note-text"') == 3 and 'class="title"' in page and 'class="sum"' in page
+
+
+def test_compare_finds_regressions():
+    """Only stages slower (or bigger) than tolerance are reported"""
+    baseline = {'stages': {'extract': {'seconds': 1.0, 'peak_rss_bytes': 100}}}
+    results = {'stages': {'extract': {'seconds': 1.1, 'peak_rss_bytes': 150}, 'load': {'seconds': 1, 'peak_rss_bytes': 1}}}
+    assert compare(results, baseline, tolerance=0.2) == ['extract peak_rss_bytes: 100 -> 150 (+50%)']
@@ -0,0 +1,43 @@
+import pytest
+
+import os
+import time
+from news_scraping.extract.cache import HttpCache, CacheEntry
+
+
+@pytest.fixture
+def cache(tmp_path):
+    """Empty cache in a temporary folder"""
+    return HttpCache(str(tmp_path / 'cache'), max_size_mb=1, max_age_days=1)
+
+
+def test_cache_round_trip(cache):
+    """Entries with validators are stored and sent back as conditional headers"""
+    cache.put(CacheEntry('https://site.com/a', b'<html></html>', etag='"abc"', last_modified='Mon, 01 Jan 2024'))
+    entry = cache.get('https://site.com/a')
+    assert entry.body == b'<html></html>'
+    assert entry.validators == {'If-None-Match': '"abc"', 'If-Modified-Since': 'Mon, 01 Jan 2024'}
+    assert cache.get('https://site.com/b') is None
+
+
+def test_cache_ignores_entries_without_validators(cache):
+    """A response without ETag or Last-Modified can not be revalidated, so it is not stored"""
+    cache.put(CacheEntry('https://site.com/a', b'body'))
+    assert cache.get('https://site.com/a') is None
+
+
+def test_evict_old_and_least_recently_used(cache):
+    """Old entries are removed, then the least recently used ones until the cache fits"""
+    half_mb = b'x' * (512 * 1024)
+    for name in ('old', 'lru', 'recent', 'newest'):
+        cache.put(CacheEntry(f'https://site.com/{name}', half_mb, etag=name))
+    now = time.time()
+    for age, name in ((2 * 24 * 3600, 'old'), (30, 'lru'), (20, 'recent'), (10, 'newest')):
+        body_path, _ = cache._paths(f'https://site.com/{name}')
+        os.utime(body_path, (now - age, now - age))
+
+    assert cache.evict() == 2
+    assert cache.get('https://site.com/old') is None
+    assert cache.get('https://site.com/lru') is None
+    assert cache.get('https://site.com/recent') is not None
+    assert cache.get('https://site.com/newest') is not None
@@ -0,0 +1,30 @@
+import pytest
+
+from news_scraping.transform.dedup import NearDuplicateIndex, shingles
+
+
+@pytest.fixture
+def story():
+    """Body long enough to have a few shingles"""
+    return ' '.join(f'palabra{i}' for i in range(100))
+
+
+def test_shingles():
+    """Consecutive words hashed, short texts are a single shingle and missing texts have none"""
+    assert len(shingles('a b c d e f', size=5)) == 2
+    assert len(shingles('a b', size=5)) == 1
+    assert shingles(float('nan')) == set()
+
+
+def test_near_duplicates_are_found_across_runs(tmp_path, story):
+    """Slightly edited copies point to the first news, also after loading the saved index"""
+    path = str(tmp_path / 'index.npz')
+    index = NearDuplicateIndex(path)
+    assert index.add('original', story) == ''
+    assert index.add('edited', story.replace('palabra50', 'otra')) == 'original'
+    assert index.add('other', ' '.join(f'otra{i}' for i in range(100))) == ''
+    index.save()
+    index = NearDuplicateIndex(path)
+    assert len(index) == 2
+    assert index.add('original', story) == ''
+    assert index.add('copy', story) == 'original'
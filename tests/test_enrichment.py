@@ -0,0 +1,27 @@
+import pytest
+
+import pandas as pd
+from news_scraping.transform.enrichment import count_tokens, get_stopwords, tokenize_column
+
+
+@pytest.fixture
+def news_df():
+    """News with a missing summary, rows with any missing value are not tokenized"""
+    body = ['El perro corre en la casa', 'Los niños juegan con el balón 3 veces', 'Sin resumen']
+    return pd.DataFrame(dict(title=['a', 'b', 'c'], summary=['s', 's', None], body=body))
+
+
+def test_count_tokens_ignores_stopwords_and_numbers():
+    """Only alphabetic tokens that are not spanish stopwords are counted"""
+    assert 'el' in get_stopwords()
+    assert count_tokens('El perro corre en la casa') == 3
+
+
+def test_tokenize_column_with_workers(news_df):
+    """Worker processes give the same counts, rows with missing values get no count"""
+    single = tokenize_column(news_df, 'body')
+    multi = tokenize_column(news_df, 'body', workers=2, chunk_size=1)
+    assert list(single) == [3, 4]
+    assert single.equals(multi)
+    news_df['n_tokens_body'] = multi
+    assert news_df['n_tokens_body'].isna().tolist() == [False, False, True]
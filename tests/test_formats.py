@@ -0,0 +1,50 @@
+import pytest
+
+import pandas as pd
+from datetime import datetime
+from news_scraping.formats import get_format, read_files, save_partitions
+
+
+@pytest.fixture
+def news_df():
+    """Three news from two sites and two dates"""
+    return pd.DataFrame({'title': ['a', 'b', 'c'],
+                         'body': ['body a', 'body b', 'body c'],
+                         'site': ['one', 'one', 'two'],
+                         'date': [datetime(2022, 1, 1), datetime(2022, 1, 2), datetime(2022, 1, 1)]})
+
+
+@pytest.mark.parametrize('format_name', ['csv', 'pickle', 'parquet', 'arrow'])
+def test_read_projected_columns(tmp_path, news_df, format_name):
+    """Only the requested columns available in the file are read"""
+    if format_name in ('parquet', 'arrow'):
+        pytest.importorskip('pyarrow')
+    news_format = get_format(format_name)
+    path = str(tmp_path / f'news{news_format.suffix}')
+    news_format.write(news_df, path)
+    assert news_format.read(path).shape == (3, 4)
+    assert news_format.read(path, columns=['title', 'missing']).to_dict('list') == {'title': ['a', 'b', 'c']}
+
+
+def test_save_partitions_by_site_and_date(tmp_path, news_df):
+    """A file per site and date"""
+    paths = save_partitions(news_df, str(tmp_path), get_format('pickle'), name='part')
+    assert sorted(p[len(str(tmp_path)) + 1:].replace('\\', '/') for p in paths) == [
+        'site=one/date=2022-01-01/part.pkl',
+        'site=one/date=2022-01-02/part.pkl',
+        'site=two/date=2022-01-01/part.pkl']
+
+
+def test_read_files_reads_ahead_a_window():
+    """Files are read in order, no more than max_workers * 2 ahead of the consumer"""
+    started = list()
+
+    def read(file):
+        started.append(file)
+        return file * 2
+
+    results = read_files(read, range(10), max_workers=2)
+    assert [next(results) for _ in range(3)] == [0, 2, 4]
+    assert len(started) <= 3 + 4
+    assert list(results) == [i * 2 for i in range(3, 10)]
+    assert sorted(started) == list(range(10))
@@ -0,0 +1,32 @@
+import pytest
+
+from news_scraping.extract.frontier import SeenIndex
+from news_scraping.load.db.article import DataBaseConnection, Article
+from news_scraping.transform.cleaning import uid_from_url
+
+
+@pytest.fixture
+def database_folder(tmp_path):
+    """Folder with a database containing a single article"""
+    conn = DataBaseConnection(str(tmp_path))
+    conn.create_all()
+    url = 'https://site.com/known'
+    with conn.Session.begin() as session:
+        session.add(Article(uid_from_url(url), 'title', 'summary', 'body', url, None, 'site', 'site.com', 1, 1))
+    return str(tmp_path)
+
+
+def test_seen_index_from_database(database_folder):
+    """Articles in database are known, new urls are returned only once"""
+    index = SeenIndex.from_database(database_folder)
+    assert 'https://site.com/known' in index
+    urls = ['https://site.com/known', 'https://site.com/new', 'https://site.com/new']
+    assert index.unseen(urls) == ['https://site.com/new']
+    assert index.unseen(urls) == []
+
+
+def test_seen_index_without_database(tmp_path):
+    """Without database every url is new"""
+    index = SeenIndex.from_database(str(tmp_path))
+    assert len(index) == 0
+    assert index.unseen(['https://site.com/a']) == ['https://site.com/a']
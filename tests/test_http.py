@@ -0,0 +1,166 @@
+import pytest
+
+import time
+import asyncio
+import datetime
+import email.utils
+from aiohttp import web
+
+from news_scraping.extract.backends import get_backend
+from news_scraping.extract.http import BodyReader, BodyTooLarge, HttpClient, backoff_delay, parse_retry_after
+from news_scraping.extract.scheduler import CrawlScheduler
+from news_scraping.metrics import metrics
+
+
+def test_parse_retry_after():
+    """Seconds or http date, None when it can not be read"""
+    later = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=120)
+    assert parse_retry_after('3') == 3.0
+    assert 100 < parse_retry_after(email.utils.format_datetime(later)) <= 120
+    assert parse_retry_after('soon') is None
+    assert parse_retry_after(None) is None
+
+
+def test_backoff_delay():
+    """Random up to backoff * 2 ** attempt and max_backoff, at least Retry-After"""
+    delays = [backoff_delay(2, 1.0, 30) for _ in range(100)]
+    assert all(0 <= delay <= 4 for delay in delays) and len(set(delays)) > 1
+    assert backoff_delay(10, 1.0, 30) <= 30
+    assert backoff_delay(0, 1.0, 30, retry_after=5) == 5
+    assert backoff_delay(0, 1.0, 30, retry_after=600) == 600
+
+
+@pytest.fixture
+def calls():
+    """Requests received per path"""
+    return {'busy': 0, 'later': 0, 'wait': 0}
+
+
+@pytest.fixture
+def flaky_app(calls):
+    """
+    /busy answers 429 (Retry-After: 0) once, /missing 404, /down always 503, /later 503 (Retry-After: 120)
+    and /wait 503 (Retry-After: 1) once
+    """
+
+    async def busy(request):
+        calls['busy'] += 1
+        if calls['busy'] == 1:
+            return web.Response(status=429, headers={'Retry-After': '0'})
+        return web.Response(text='news')
+
+    async def missing(request):
+        return web.Response(status=404)
+
+    async def down(request):
+        return web.Response(status=503)
+
+    async def later(request):
+        calls['later'] += 1
+        return web.Response(status=503, headers={'Retry-After': '120'})
+
+    async def wait(request):
+        calls['wait'] += 1
+        if calls['wait'] == 1:
+            return web.Response(status=503, headers={'Retry-After': '1'})
+        return web.Response(text='news')
+
+    app = web.Application()
+    app.router.add_get('/busy', busy)
+    app.router.add_get('/missing', missing)
+    app.router.add_get('/down', down)
+    app.router.add_get('/later', later)
+    app.router.add_get('/wait', wait)
+    return app
+
+
+def test_fetch_retries_and_dead_letters(flaky_app, calls):
+    """Errors worth it are tried again, urls given up are kept as dead letters"""
+    async def main():
+        runner = web.AppRunner(flaky_app)
+        await runner.setup()
+        await web.TCPSite(runner, '127.0.0.1', 0).start()
+        url = f'http://127.0.0.1:{runner.addresses[0][1]}/'
+        client = HttpClient(retries=2, backoff=0.01, max_backoff=30)
+        scheduler = CrawlScheduler(max_per_host=4, site_timeout=10)
+
+        async def crawl(site_name, paths):
+            return [await client.fetch(f'{url}{path}', scheduler) for path in paths]
+        try:
+            bodies = await scheduler.run_sites({'site': ('busy', 'missing', 'down', 'later')}, crawl)
+            return url, bodies['site'], scheduler._host_limit(url).limit
+        finally:
+            await client.close()
+            await runner.cleanup()
+
+    metrics.reset()
+    url, bodies, limit = asyncio.run(main())
+    assert [page.body if page is not None else None for page in bodies] == [b'news', None, None, None]
+    assert limit < 4
+    assert calls['later'] == 1
+    report = metrics.report()
+    assert report['counters']['http.retries'] == 3
+    assert report['dead_letters'] == [{'url': f'{url}missing', 'reason': 'status 404'},
+                                      {'url': f'{url}down', 'reason': 'status 503'},
+                                      {'url': f'{url}later', 'reason': 'status 503, retry after 120 s'}]
+
+
+def test_fetch_waits_retry_after_longer_than_max_backoff(flaky_app, calls):
+    """Retry-After is honored beyond max_backoff when the site timeout is not reached before"""
+    async def main():
+        runner = web.AppRunner(flaky_app)
+        await runner.setup()
+        await web.TCPSite(runner, '127.0.0.1', 0).start()
+        client = HttpClient(retries=1, backoff=0.01, max_backoff=0.1)
+        try:
+            return await client.fetch(f'http://127.0.0.1:{runner.addresses[0][1]}/wait', CrawlScheduler())
+        finally:
+            await client.close()
+            await runner.cleanup()
+
+    started = time.monotonic()
+    page = asyncio.run(main())
+    assert page is not None and page.body == b'news'
+    assert calls['wait'] == 2
+    assert time.monotonic() - started >= 1
+
+
+@pytest.fixture
+def latin_page():
+    """windows-1252 page declaring its charset in a meta tag, with a non ascii title"""
+    return ('<html><head><meta http-equiv="Content-Type" content="text/html; charset=ISO-8859-1"></head>'
+            '<body><h1 class="title">Economía “hoy”</h1>' + '<p>texto</p>' * 1000 + '</body></html>').encode('cp1252')
+
+
+def read(body, charset=None, feeder=None, max_size=1 << 20, chunk_size=100):
+    reader = BodyReader(max_size, charset, feeder)
+    for i in range(0, len(body), chunk_size):
+        reader.feed(body[i:i + chunk_size])
+    return reader.close()
+
+
+def test_body_reader_detects_charset(latin_page):
+    """Charset from headers wins over meta tags, pages without any are guessed"""
+    assert read(latin_page).charset == 'cp1252'
+    assert 'Economía “hoy”' in read(latin_page).text
+    assert read('<p>año</p>'.encode('utf-8'), charset='utf-8').text == '<p>año</p>'
+    unknown = read('<p>La economía del país</p>'.encode('cp1252'))
+    assert unknown.charset is None and 'economía' in unknown.text
+
+
+def test_body_reader_feeds_parser(latin_page):
+    """Backends that can parse incrementally get the same document as parse"""
+    pytest.importorskip('lxml.cssselect')
+    backend = get_backend('lxml')
+    page = read(latin_page, feeder=backend.feeder())
+    assert page.document is not None
+    assert [e.text for e in page.document.select('.title')] == ['Economía “hoy”']
+    # without known charset the page is parsed at the end
+    assert read('<p>año</p>'.encode('cp1252'), feeder=backend.feeder()).document is None
+    assert get_backend('bs4').feeder() is None
+
+
+def test_body_reader_limits_size(latin_page):
+    """Reading stops once the body is bigger than max_size"""
+    with pytest.raises(BodyTooLarge):
+        read(latin_page, max_size=1000)
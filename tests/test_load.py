@@ -0,0 +1,99 @@
+import pytest
+
+import dataclasses
+import pandas as pd
+from datetime import datetime
+from news_scraping.news import News, NewsList, iter_records
+from news_scraping.load.main import load_news, run, LoadCount
+from news_scraping.load.db.article import DataBaseConnection
+
+
+@pytest.fixture
+def conn(tmp_path):
+    """Connection to an empty database"""
+    connection = DataBaseConnection(str(tmp_path))
+    connection.create_all()
+    return connection
+
+
+@pytest.fixture
+def news():
+    """Three news, two of them with the same uid"""
+    return [News('title', 'summary', 'body', f'https://site.com/{i}', datetime(2022, 1, 1), 'site', 'site.com',
+                 uid, 1, 2)
+            for i, uid in enumerate(['uid_1', 'uid_2', 'uid_1'])]
+
+
+def test_load_news_skips_existing_uids(conn, news):
+    """Duplicated uids (in the same batch, other batches or the database) are skipped"""
+    assert load_news(conn, news, batch_size=2) == (2, 1)
+    assert load_news(conn, news) == (0, 3)
+    with conn.engine.connect() as connection:
+        assert connection.execute('SELECT uid, url FROM articles ORDER BY uid').fetchall() == [
+            ('uid_1', 'https://site.com/0'), ('uid_2', 'https://site.com/1')]
+
+
+def test_run_loads_pickles(tmp_path, news):
+    """Transform partitions are read and loaded"""
+    (tmp_path / 'transform').mkdir()
+    pd.DataFrame([dataclasses.asdict(n) for n in news]).to_pickle(tmp_path / 'transform' / 'transform_1.pkl')
+    run(str(tmp_path))
+    with DataBaseConnection(str(tmp_path)).engine.connect() as connection:
+        assert connection.execute('SELECT COUNT(*) FROM articles').scalar() == 2
+
+
+def test_database_settings(conn, news):
+    """Connections use write ahead log and the filter columns are indexed"""
+    load_news(conn, news)
+    with conn.engine.connect() as connection:
+        assert connection.execute('PRAGMA journal_mode').scalar() == 'wal'
+        indexes = {row[1] for row in connection.execute("PRAGMA index_list('articles')")}
+    assert {'ix_articles_site', 'ix_articles_date', 'ix_articles_host'} <= indexes
+
+
+def test_iter_records_matches_read_from_df(news):
+    """Records built from column arrays have the same values as the News read from the dataframe"""
+    df = pd.DataFrame([dataclasses.asdict(n) for n in news]).assign(index=0)
+    news_list = NewsList()
+    news_list.read_from_df(df)
+    assert list(iter_records(df)) == [dataclasses.asdict(n) for n in news_list.get_news()]
+    assert news_list.get_news()[0] == news[0]
+
+
+def test_run_only_loads_new_partitions(tmp_path, news, monkeypatch):
+    """Partitions already loaded are not read again, unless the run is not incremental"""
+    (tmp_path / 'transform').mkdir()
+    pd.DataFrame([dataclasses.asdict(n) for n in news]).to_pickle(tmp_path / 'transform' / 'transform_1.pkl')
+    run(str(tmp_path))
+    pd.DataFrame([dataclasses.asdict(news[1])]).to_pickle(tmp_path / 'transform' / 'transform_2.pkl')
+    loaded = list()
+    monkeypatch.setattr('news_scraping.load.main.load_rows',
+                        lambda conn, rows, batch_size: loaded.append(len(list(rows))) or LoadCount(0, 0))
+    run(str(tmp_path))
+    assert loaded == [1]
+    run(str(tmp_path))
+    assert loaded == [1]
+    run(str(tmp_path), incremental=False)
+    assert sorted(loaded) == [1, 1, 3]
+
+
+def test_run_loads_duplicate_of(tmp_path, news):
+    """Near duplicates kept by transform are loaded with the uid of their original, other news with NULL"""
+    (tmp_path / 'transform').mkdir()
+    df = pd.DataFrame([dataclasses.asdict(n) for n in news[:2]]).assign(duplicate_of=['', 'uid_1'])
+    df.to_pickle(tmp_path / 'transform' / 'transform_1.pkl')
+    run(str(tmp_path))
+    with DataBaseConnection(str(tmp_path)).engine.connect() as connection:
+        assert connection.execute('SELECT uid, duplicate_of FROM articles ORDER BY uid').fetchall() == [
+            ('uid_1', None), ('uid_2', 'uid_1')]
+
+
+def test_create_all_adds_new_columns(tmp_path, news):
+    """Databases created before a column was added to the model get it"""
+    conn = DataBaseConnection(str(tmp_path))
+    with conn.engine.begin() as connection:
+        connection.exec_driver_sql('CREATE TABLE articles (uid VARCHAR PRIMARY KEY, title VARCHAR)')
+    conn.create_all()
+    with conn.engine.connect() as connection:
+        columns = {row[1] for row in connection.execute("PRAGMA table_info('articles')")}
+    assert {'duplicate_of', 'n_tokens_body'} <= columns
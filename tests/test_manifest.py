@@ -0,0 +1,33 @@
+import pytest
+
+import os
+from news_scraping.transform.manifest import Manifest
+
+
+@pytest.fixture
+def news_files(tmp_path):
+    """Two csv files inside site/date folders"""
+    files = list()
+    for day in ('01-01-2022', '02-01-2022'):
+        folder = tmp_path / 'site' / day
+        folder.mkdir(parents=True)
+        file = folder / '_consolidated_news.csv'
+        file.write_text('title\nnews\n')
+        files.append(str(file))
+    return files
+
+
+def test_manifest_only_returns_new_or_changed_files(tmp_path, news_files):
+    """Processed files are skipped, even after reloading the manifest, until they change"""
+    path = str(tmp_path / 'manifest.json')
+    manifest = Manifest(path)
+    assert manifest.pending(news_files) == news_files
+    manifest.mark(news_files[:1])
+    manifest.save()
+
+    reloaded = Manifest(path)
+    assert reloaded.pending(news_files) == news_files[1:]
+    with open(news_files[0], 'a') as f:
+        f.write('more news\n')
+    assert reloaded.pending(news_files) == news_files
+    assert os.path.isfile(path)
@@ -0,0 +1,57 @@
+import pytest
+
+import json
+import time
+from news_scraping.metrics import RunMetrics, RequestMetrics, current_rss
+
+
+@pytest.fixture
+def run_metrics():
+    """Metrics of a run with a stage, a step, a queue and two requests"""
+    run = RunMetrics()
+    with run.stage('load'):
+        with run.timer('load.insert'):
+            run.add('load.rows', 10)
+    run.queue_depth('parsed', 3)
+    run.queue_depth('parsed', 1)
+    for status, size in [(200, 100), (None, 0)]:
+        request = RequestMetrics('https://site.com/news')
+        request.finish(status, size)
+        run.request(request)
+    return run
+
+
+def test_report(run_metrics):
+    """Stages, steps, queues and requests per host are summarized"""
+    report = json.loads(json.dumps(run_metrics.report()))
+    assert report['timings']['load.insert']['count'] == 1
+    assert 'rows_per_second' in report['stages']['load']
+    assert report['queues'] == {'parsed': {'last': 1, 'max': 3}}
+    assert report['hosts']['site.com']['requests'] == 2
+    assert report['hosts']['site.com']['errors'] == 1
+    assert report['hosts']['site.com']['bytes'] == 100
+
+
+def test_save_prometheus(tmp_path, run_metrics):
+    """One metric per line, labeled by stage, step, queue or host"""
+    path = tmp_path / 'metrics.prom'
+    run_metrics.save_prometheus(str(path))
+    lines = path.read_text().splitlines()
+    assert 'news_load_rows_total 10.0' in lines
+    assert 'news_host_requests_total{host="site.com"} 2' in lines
+    assert 'news_queue_depth_max{queue="parsed"} 3' in lines
+
+
+@pytest.mark.skipif(current_rss() is None, reason='needs /proc')
+def test_stage_peak_memory():
+    """Peak memory is the one of every stage, not of the process so far"""
+    run = RunMetrics()
+    with run.stage('big'):
+        # written (not only allocated) and kept for a few samples
+        data = b'x' * (200 * 2 ** 20)
+        time.sleep(0.1)
+        del data
+    with run.stage('small'):
+        pass
+    stages = run.report()['stages']
+    assert stages['big']['peak_memory_bytes'] - stages['small']['peak_memory_bytes'] > 100 * 2 ** 20
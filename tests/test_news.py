@@ -0,0 +1,28 @@
+import pytest
+
+from news_scraping.news import News, NewsList, NEWS_FIELDS
+
+
+@pytest.fixture
+def news():
+    """Two news with different urls"""
+    return [News('title', 'summary', 'body', f'https://site.com/{i}', uid=f'uid_{i}') for i in range(2)]
+
+
+def test_news_has_no_instance_dict(news):
+    """News attributes are stored in slots"""
+    assert not hasattr(news[0], '__dict__')
+
+
+@pytest.mark.parametrize('columnar', [False, True])
+def test_news_list_to_df(news, columnar):
+    """Both kinds of NewsList keep the news and export one column per attribute"""
+    news_list = NewsList(columnar=columnar)
+    news_list.extend(news)
+    df = news_list.to_df()
+    assert len(news_list) == 2 and news_list.get_news() == news
+    assert list(df.columns) == list(NEWS_FIELDS)
+    assert df['uid'].tolist() == ['uid_0', 'uid_1']
+    other = NewsList(columnar=columnar)
+    other.read_from_df(df)
+    assert other.get_news() == news
@@ -0,0 +1,66 @@
+import pytest
+
+import asyncio
+from aiohttp import web
+
+from news_scraping.common import Site, get_parser
+from news_scraping.extract.backends import LxmlBackend
+from news_scraping.extract.http import HttpClient
+from news_scraping.extract.scheduler import CrawlScheduler
+from news_scraping.metrics import metrics
+
+
+class FragileBackend(LxmlBackend):
+    """lxml failing on pages saying 'broken'"""
+    def parse(self, markup, queries=()):
+        if 'broken' in markup:
+            raise ValueError('broken page')
+        return super().parse(markup, queries)
+
+    def feeder(self, queries=()):
+        return None
+
+
+@pytest.fixture
+def pages():
+    """Article bodies: a news, an empty page and a broken one"""
+    return {'1': '<html><h1 class="title">Noticia</h1><p class="sum">resumen</p><p class="note-text">cuerpo</p></html>',
+            '2': '',
+            '3': '<html><p>broken</p></html>'}
+
+
+async def serve(pages):
+    """Serve home (linking every page) on a free port, return runner and home url"""
+    async def home(request):
+        links = ''.join(f'<a class="title" href="{request.url.origin()}/news/{key}">{key}</a>' for key in pages)
+        return web.Response(text=f'<html><body>{links}</body></html>', content_type='text/html')
+
+    async def article(request):
+        return web.Response(text=pages[request.match_info['key']], content_type='text/html')
+
+    app = web.Application()
+    app.router.add_get('/', home)
+    app.router.add_get('/news/{key}', article)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', 0).start()
+    return runner, f'http://127.0.0.1:{runner.addresses[0][1]}/'
+
+
+def test_broken_pages_do_not_lose_the_site(pages):
+    """Empty and broken articles are skipped (broken ones as dead letters), the rest of the site is kept"""
+    async def main():
+        runner, url = await serve(pages)
+        queries = dict(homepage_article_links='.title', news_title='.title', news_summary='.sum', news_body='.note-text')
+        site = Site('s', url, queries, get_parser('ElUniversalParser'), FragileBackend())
+        try:
+            async with HttpClient() as client:
+                await site.parser(site, CrawlScheduler(), client)
+                return await site.parser.parse_news()
+        finally:
+            await runner.cleanup()
+
+    metrics.reset()
+    news = asyncio.run(main())
+    assert sorted(news.columns()['title']) == ['No title found', 'Noticia']
+    assert [letter['url'][-7:] for letter in metrics.report()['dead_letters']] == ['/news/3']
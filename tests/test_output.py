@@ -0,0 +1,19 @@
+from news_scraping.news import News, NewsList
+from news_scraping.output import save_news
+
+
+def make_news_list(*titles):
+    news_list = NewsList(columnar=True)
+    for title in titles:
+        news_list.append(News(title, 'summary', 'body', f'https://site.com/{title}'))
+    return news_list
+
+
+def test_save_news_keeps_earlier_runs(tmp_path):
+    """A second run of the same day writes a numbered file instead of overwriting the first one"""
+    save_news(make_news_list('a', 'b'), str(tmp_path))
+    save_news(make_news_list('c'), str(tmp_path))
+    save_news(make_news_list('d'), str(tmp_path))
+    names = sorted(path.name for path in tmp_path.iterdir())
+    assert names == ['1__consolidated_news.csv', '2__consolidated_news.csv', '__consolidated_news.csv']
+    assert (tmp_path / '__consolidated_news.csv').read_text().count('https://site.com/') == 2
@@ -0,0 +1,34 @@
+import pytest
+
+import pandas as pd
+from datetime import datetime
+from news_scraping.transform.utils import read_news_from_directory
+from news_scraping.load.utils import read_news_from_pickles
+
+
+@pytest.fixture
+def output_folder(tmp_path):
+    """Output folder with two days of csv files for one site and a pickle"""
+    for day, titles in (('01-01-2022', ['a', 'b']), ('02-01-2022', ['c'])):
+        folder = tmp_path / 'site' / day
+        folder.mkdir(parents=True)
+        pd.DataFrame(dict(title=titles, url=titles)).to_csv(folder / '_consolidated_news.csv', index=False)
+    (tmp_path / 'transform').mkdir()
+    pd.DataFrame(dict(title=['a', 'b'])).to_pickle(tmp_path / 'transform' / 'transform_1.pkl')
+    pd.DataFrame(dict(title=['c'])).to_pickle(tmp_path / 'transform' / 'transform_2.pkl')
+    return str(tmp_path)
+
+
+def test_read_news_from_directory(output_folder):
+    """Every csv is read with its site and date from the folder names"""
+    news = read_news_from_directory(output_folder, suffix='.csv').sort_values('title')
+    assert list(news['title']) == ['a', 'b', 'c']
+    assert list(news['site']) == ['site'] * 3
+    assert list(news['date']) == [datetime(2022, 1, 1)] * 2 + [datetime(2022, 1, 2)]
+
+
+def test_read_news_from_pickles(output_folder):
+    """Every pickle is read and concatenated"""
+    news = read_news_from_pickles(output_folder)
+    assert sorted(news['title']) == ['a', 'b', 'c']
+    assert read_news_from_pickles(output_folder, suffix='.missing').empty
@@ -0,0 +1,64 @@
+import pytest
+
+import asyncio
+from news_scraping.extract.scheduler import CrawlScheduler
+
+
+@pytest.fixture
+def sites():
+    """site names mapped to a dummy site object"""
+    return {'ok': object(), 'broken': object(), 'slow': object()}
+
+
+async def crawl(site_name, _site):
+    """Dummy crawl: fails or hangs depending on site name"""
+    if site_name == 'broken':
+        raise ValueError('broken site')
+    if site_name == 'slow':
+        await asyncio.sleep(10)
+    return site_name
+
+
+def test_run_sites_isolates_failures(sites):
+    """A broken or slow site must not affect the rest"""
+    async def main():
+        scheduler = CrawlScheduler(site_timeout=0.1)
+        return await scheduler.run_sites(sites, crawl)
+
+    results = asyncio.run(main())
+    assert results == {'ok': 'ok', 'broken': None, 'slow': None}
+
+
+def test_slot_limits_requests_per_host():
+    """No more than max_per_host requests are in flight for the same host"""
+    in_flight = {'a.com': 0, 'b.com': 0}
+    peak = {'a.com': 0, 'b.com': 0}
+
+    async def request(scheduler, host):
+        async with scheduler.slot(f'https://{host}/news'):
+            in_flight[host] += 1
+            peak[host] = max(peak[host], in_flight[host])
+            await asyncio.sleep(0.01)
+            in_flight[host] -= 1
+
+    async def main():
+        scheduler = CrawlScheduler(max_concurrency=10, max_per_host=2)
+        await asyncio.gather(*(request(scheduler, host) for host in ['a.com', 'b.com'] * 5))
+
+    asyncio.run(main())
+    assert peak == {'a.com': 2, 'b.com': 2}
+
+
+def test_host_limit_adapts_to_errors():
+    """Errors halve the requests allowed for a host, successes bring them back"""
+    async def main():
+        scheduler = CrawlScheduler(max_concurrency=10, max_per_host=8)
+        url = 'https://a.com/news'
+        for _ in range(2):
+            scheduler.feedback(url, ok=False)
+        shrunk = scheduler._host_limit(url).limit
+        for _ in range(100):
+            scheduler.feedback(url, ok=True)
+        return shrunk, scheduler._host_limit(url).limit, scheduler._host_limit('https://b.com/').limit
+
+    assert asyncio.run(main()) == (2, 8, 8)
@@ -0,0 +1,58 @@
+import pytest
+
+from datetime import date, datetime
+from news_scraping.news import News
+from news_scraping.load.main import load_news
+from news_scraping.load.search import search, InvalidQuery
+from news_scraping.load.db.article import DataBaseConnection
+
+
+@pytest.fixture
+def conn(tmp_path):
+    """Database with three news from two sites and days"""
+    connection = DataBaseConnection(str(tmp_path))
+    connection.create_all()
+    news = [News('Sube el precio del petróleo', 'resumen', 'El barril de petróleo sube', 'https://a.com/1',
+                 datetime(2022, 1, 1), 'a', 'a.com', 'uid_1'),
+            News('Resultados del fútbol', 'resumen', 'El equipo ganó, el petróleo no importa', 'https://a.com/2',
+                 datetime(2022, 1, 2), 'a', 'a.com', 'uid_2'),
+            News('Petroleo en caída', 'resumen', 'Baja el barril', 'https://b.com/1',
+                 datetime(2022, 1, 2), 'b', 'b.com', 'uid_3')]
+    load_news(connection, news)
+    return connection
+
+
+def test_search_ranks_title_matches_first(conn):
+    """Matches in title rank better than matches in body, accents are ignored"""
+    results = search(conn, 'petroleo')
+    assert sorted(r.uid for r in results[:2]) == ['uid_1', 'uid_3'] and results[2].uid == 'uid_2'
+
+
+def test_search_filters(conn):
+    """Only news from site and days requested"""
+    assert [r.uid for r in search(conn, 'petroleo', site='a')] == ['uid_1', 'uid_2']
+    assert [r.uid for r in search(conn, 'petroleo', since=date(2022, 1, 2), until=date(2022, 1, 2))] == ['uid_3', 'uid_2']
+
+
+def test_search_index_built_for_existing_articles(tmp_path, conn):
+    """Articles loaded before the index existed are indexed when it is created"""
+    with conn.engine.begin() as connection:
+        connection.exec_driver_sql('DROP TABLE articles_fts')
+        connection.exec_driver_sql('DROP TRIGGER articles_fts_insert')
+    DataBaseConnection(str(tmp_path)).create_all()
+    assert len(search(conn, 'barril')) == 2
+
+
+@pytest.mark.parametrize('query', ['"petroleo', 'petroleo AND', 'autor: petroleo'])
+def test_search_invalid_query(conn, query):
+    """Queries that are not valid fts5 syntax raise InvalidQuery"""
+    with pytest.raises(InvalidQuery):
+        search(conn, query)
+
+
+def test_search_read_only(tmp_path, conn):
+    """Read only connections search existing databases and fail for missing ones"""
+    assert len(search(DataBaseConnection(str(tmp_path), read_only=True), 'barril')) == 2
+    with pytest.raises(FileNotFoundError):
+        DataBaseConnection(str(tmp_path / 'missing'), read_only=True)
+    assert not (tmp_path / 'missing').exists()
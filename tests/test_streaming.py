@@ -0,0 +1,82 @@
+import pytest
+
+import asyncio
+from news_scraping import streaming
+from news_scraping.news import News
+from news_scraping.load.db.article import DataBaseConnection
+
+
+def make_news(i):
+    return News(f'title {i}', 'summary', 'el perro corre en la casa', f'https://site.com/news/{i}')
+
+
+@pytest.fixture
+def batches(monkeypatch):
+    """Sizes of the batches loaded by the pipeline"""
+    sizes = list()
+    load_news = streaming.load_news
+
+    def recording_load_news(conn, news, batch_size=1000):
+        sizes.append(len(news))
+        return load_news(conn, news, batch_size)
+
+    monkeypatch.setattr(streaming, 'load_news', recording_load_news)
+    return sizes
+
+
+def fake_extract(monkeypatch, *groups, pause=0.0):
+    """extract sending every group of news to the pipeline, waiting pause seconds after each group"""
+    async def run(sites, output_folder, sink, **options):
+        for group in groups:
+            for i in group:
+                await sink('site', make_news(i))
+            await asyncio.sleep(pause)
+
+    monkeypatch.setattr(streaming.extract, 'run', run)
+
+
+def loaded_urls(folder, database_name='newspaper.db'):
+    with DataBaseConnection(folder, database_name).engine.connect() as connection:
+        return [row[0] for row in connection.execute('SELECT url FROM articles ORDER BY url')]
+
+
+def test_stream_loads_full_batches(tmp_path, monkeypatch, batches):
+    """News are loaded batch_size at a time, the incomplete batch at the end of the stream"""
+    fake_extract(monkeypatch, [0, 1, 2, 3, 4, 2])
+    asyncio.run(streaming.run(dict(), str(tmp_path), batch_size=2, flush_interval=10))
+    assert batches == [2, 2, 1]
+    assert loaded_urls(str(tmp_path)) == [f'https://site.com/news/{i}' for i in range(5)]
+
+
+def test_stream_flushes_after_interval(tmp_path, monkeypatch, batches):
+    """An incomplete batch is loaded when no news arrives for flush_interval"""
+    fake_extract(monkeypatch, [0], [1, 2], pause=0.5)
+    asyncio.run(streaming.run(dict(), str(tmp_path), batch_size=2, flush_interval=0.1))
+    assert batches == [1, 2]
+    assert len(loaded_urls(str(tmp_path))) == 3
+
+
+def test_stream_uses_database_options(tmp_path, monkeypatch, batches):
+    """Database options of load are applied to the streaming connection"""
+    fake_extract(monkeypatch, [0])
+    asyncio.run(streaming.run(dict(), str(tmp_path), database=dict(database_name='stream.db')))
+    assert not (tmp_path / 'newspaper.db').exists()
+    assert len(loaded_urls(str(tmp_path), 'stream.db')) == 1
+
+
+def test_stream_saves_extract_in_file_format(tmp_path, monkeypatch, batches):
+    """save_csv keeps the extracted news of every site in file_format"""
+    fake_extract(monkeypatch, [0, 1])
+    asyncio.run(streaming.run(dict(), str(tmp_path), save_csv=True, file_format='parquet'))
+    assert [path.suffix for path in tmp_path.glob('site/*/*')] == ['.parquet']
+
+
+def test_stream_drops_near_duplicates(tmp_path, monkeypatch, batches):
+    """News with the body of a news indexed (in this or an earlier run) are not loaded"""
+    fake_extract(monkeypatch, [0, 1])
+    asyncio.run(streaming.run(dict(), str(tmp_path), near_duplicates=dict(drop=True)))
+    assert loaded_urls(str(tmp_path)) == ['https://site.com/news/0']
+    assert (tmp_path / 'near_duplicates.npz').exists()
+    fake_extract(monkeypatch, [2])
+    asyncio.run(streaming.run(dict(), str(tmp_path), near_duplicates=dict(drop=True)))
+    assert loaded_urls(str(tmp_path)) == ['https://site.com/news/0']
@@ -0,0 +1,32 @@
+import pytest
+
+from news_scraping.news import News, NewsList
+from news_scraping.output import create_output_folder_from_site, save_news
+from news_scraping.transform.main import run, MANIFEST_NAME
+from news_scraping.transform.manifest import Manifest
+
+
+def save_site_news(folder, site, news):
+    news_list = NewsList(columnar=True)
+    for item in news:
+        news_list.append(item)
+    save_news(news_list, create_output_folder_from_site(str(folder), site), 'parquet')
+
+
+def test_run_with_empty_extract_file(tmp_path):
+    """Extract files without news (e.g. nothing new since the last run) are skipped, not transformed"""
+    pytest.importorskip('pyarrow')
+    save_site_news(tmp_path, 'nothing', [])
+    run(str(tmp_path), file_format='parquet')
+    assert not (tmp_path / 'transform').exists()
+    files = [str(path) for path in tmp_path.glob('nothing/*/*')]
+    assert files and not Manifest(str(tmp_path / MANIFEST_NAME)).pending(files)
+
+
+def test_run_with_empty_and_new_extract_files(tmp_path):
+    """News of other files are transformed as usual"""
+    pytest.importorskip('pyarrow')
+    save_site_news(tmp_path, 'nothing', [])
+    save_site_news(tmp_path, 'eluniversal', [News('title', 'summary', 'el perro corre', 'https://site.com/1')])
+    run(str(tmp_path), file_format='parquet')
+    assert [path.parent.parent.name for path in tmp_path.glob('transform/*/*/*.parquet')] == ['site=eluniversal']
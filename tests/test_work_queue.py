@@ -0,0 +1,160 @@
+import pytest
+
+import time
+import asyncio
+from aiohttp import web
+
+from news_scraping.common import Site, get_parser
+from news_scraping.news import News
+from news_scraping.extract.distributed import run_coordinator, run_worker
+from news_scraping.extract.work_queue import WorkQueue
+from news_scraping.extract.queue_server import RemoteWorkQueue, serve_queue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    """Queue with an open cycle"""
+    work_queue = WorkQueue(str(tmp_path / 'queue.db'), lease_seconds=60, max_attempts=2)
+    yield work_queue
+    work_queue.close()
+
+
+def test_urls_are_queued_and_leased_once(queue):
+    """The same url is only queued once per cycle, and leased by a single worker"""
+    cycle = queue.open_cycle('c1')
+    assert queue.put(cycle, 'site', ['u1', 'u2', 'u1']) == 2
+    assert queue.put(cycle, 'other', ['u2', 'u3']) == 1
+    first = queue.claim(cycle, 'w1', limit=2)
+    second = queue.claim(cycle, 'w2', limit=2)
+    assert [lease.url for lease in first] == ['u1', 'u2']
+    assert [lease.url for lease in second] == ['u3']
+    assert queue.claim(cycle, 'w3') == []
+    # a new cycle queues the urls again
+    assert queue.put(queue.open_cycle('c2'), 'site', ['u1']) == 1
+
+
+def test_results_and_finished_cycle(queue):
+    """News sent back are kept until the coordinator saves them, failed urls are listed"""
+    cycle = queue.open_cycle('c1')
+    queue.put(cycle, 'site', ['u1', 'u2'])
+    queue.close_cycle(cycle)
+    ok, broken = queue.claim(cycle, 'w1')
+    assert not queue.finished(cycle)
+    assert queue.complete(ok, News('title', 'summary', 'body', 'u1'))
+    assert queue.complete(broken, None, 'fetch failed')
+    assert queue.finished(cycle)
+    assert list(queue.results(cycle)) == [('site', News('title', 'summary', 'body', 'u1'))]
+    assert queue.failed(cycle) == [('u2', 'fetch failed')]
+
+
+def test_expired_leases_are_queued_again(queue):
+    """Urls of a crashed worker are leased again, its late results are ignored, up to max_attempts"""
+    queue.lease_seconds = 0.01
+    cycle = queue.open_cycle('c1')
+    queue.put(cycle, 'site', ['u1'])
+    crashed, = queue.claim(cycle, 'w1')
+    time.sleep(0.05)
+    retried, = queue.claim(cycle, 'w2')
+    assert retried.url == 'u1' and retried.token != crashed.token
+    assert not queue.complete(crashed, News('late', '', '', 'u1'))
+    time.sleep(0.05)
+    assert queue.claim(cycle, 'w3') == []
+    assert queue.failed(cycle) == [('u1', 'lease expired')]
+
+
+def test_coordinator_with_local_worker(tmp_path, queue):
+    """Articles linked from home are queued, fetched once and saved per site"""
+    requested = list()
+    results = asyncio.run(crawl(tmp_path, queue, requested))
+    assert sorted(requested) == ['1', '2', '3']
+    assert sorted(results['local'].columns()['title']) == ['Noticia 1', 'Noticia 2', 'Noticia 3']
+    assert list(tmp_path.glob('local/*/*.csv'))
+
+
+def test_slow_workers_keep_their_urls(tmp_path, queue):
+    """Articles slower than a lease are not requested again by another worker"""
+    # renewed every third of a lease, the margin left absorbs slow queue commits on a busy machine.
+    # one worker is left without urls, it would lease the expired ones again
+    queue.lease_seconds = 0.4
+    requested = list()
+    results = asyncio.run(crawl(tmp_path, queue, requested, latency=1.0, workers=3))
+    assert sorted(requested) == ['1', '2', '3']
+    assert len(results['local']) == 3
+
+
+def test_remote_workers(tmp_path, queue):
+    """Workers on other machines lease the urls through the queue served by the coordinator"""
+    requested = list()
+    results = asyncio.run(crawl(tmp_path, queue, requested, workers=3, remote=True))
+    assert sorted(requested) == ['1', '2', '3']
+    assert sorted(results['local'].columns()['title']) == ['Noticia 1', 'Noticia 2', 'Noticia 3']
+
+
+def test_remote_queue_needs_token(queue):
+    """Requests without the token are refused"""
+    async def main():
+        async with serve_queue(queue, '127.0.0.1:0', token='secret') as url:
+            loop = asyncio.get_running_loop()
+            assert await loop.run_in_executor(None, RemoteWorkQueue(url, 'secret').current_cycle) == 'c1'
+            with pytest.raises(OSError):
+                await loop.run_in_executor(None, RemoteWorkQueue(url, 'wrong').current_cycle)
+
+    queue.open_cycle('c1')
+    asyncio.run(main())
+
+
+async def crawl(tmp_path, queue, requested, latency=0.0, workers=1, remote=False):
+    """
+    Run coordinator (and workers - 1 more workers) against a local site, requested article indexes are added to requested
+
+    remote: the other workers use the queue served by the coordinator, which does not work itself
+    """
+    async def home(request):
+        links = ''.join(f'<a class="title" href="{request.url.origin()}/news/{i}">{i}</a>' for i in (1, 2, 2, 3))
+        return web.Response(text=f'<html><body>{links}</body></html>', content_type='text/html')
+
+    async def article(request):
+        index = request.match_info['index']
+        requested.append(index)
+        await asyncio.sleep(latency)
+        return web.Response(text=f'<html><h1 class="title">Noticia {index}</h1><p class="sum">resumen</p>'
+                                 f'<p class="note-text">cuerpo</p></html>', content_type='text/html')
+
+    app = web.Application()
+    app.router.add_get('/', home)
+    app.router.add_get('/news/{index}', article)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', 0).start()
+    queries = dict(homepage_article_links='.title', news_title='.title', news_summary='.sum', news_body='.note-text')
+    sites = {'local': Site('local', f'http://127.0.0.1:{runner.addresses[0][1]}/', queries, get_parser('ElUniversalParser'))}
+    try:
+        async with serve_queue(queue, '127.0.0.1:0', token='secret') as url:
+            coordinator = asyncio.ensure_future(run_coordinator(sites, str(tmp_path), queue, poll_interval=0.01,
+                                                                cycle_timeout=30, local_worker=not remote,
+                                                                worker_options=dict(batch_size=2)))
+            worker_queue = RemoteWorkQueue(url, 'secret') if remote else queue
+
+            async def other(name):
+                while queue.current_cycle() is None:
+                    await asyncio.sleep(0.01)
+                return await run_worker(sites, worker_queue, name, batch_size=2, poll_interval=0.01, once=True)
+            results, *_ = await asyncio.gather(coordinator, *(other(f'w{i}') for i in range(workers - 1)))
+        return results
+    finally:
+        await runner.cleanup()
+
+
+def test_extend_keeps_leases(queue):
+    """Extended leases do not expire, lost ones can not be extended"""
+    queue.lease_seconds = 0.05
+    cycle = queue.open_cycle('c1')
+    queue.put(cycle, 'site', ['u1', 'u2'])
+    kept, dropped = queue.claim(cycle, 'w1')
+    time.sleep(0.03)
+    kept, = queue.extend([kept])
+    time.sleep(0.03)
+    retried, = queue.claim(cycle, 'w2')
+    assert retried.url == 'u2'
+    assert [lease.url for lease in queue.extend([kept, dropped])] == ['u1']
+    assert queue.complete(kept, News('title', '', '', 'u1'))
@@ -0,0 +1,20 @@
+import pytest
+
+from concurrent.futures import ProcessPoolExecutor
+from news_scraping.news import News
+from news_scraping.extract.workers import parse_news_page
+
+
+@pytest.fixture
+def queries():
+    """Site queries as in config.yaml"""
+    return {'homepage_article_links': '.title ', 'news_title': '.title ',
+            'news_summary': '.sum ', 'news_body': '.note-text '}
+
+
+def test_parse_news_page_in_worker_process(queries):
+    """The page is parsed in another process and the News fields come back"""
+    page = '<h1 class="title">Título</h1><div class="note-text">uno</div><div class="note-text">dos</div>'
+    with ProcessPoolExecutor(max_workers=1) as pool:
+        news = pool.submit(parse_news_page, page.encode('utf-8'), None, 'https://site.com/1', 'bs4', queries).result()
+    assert news == News('Título', 'No summary found', 'uno\ndos', 'https://site.com/1')